@@ -0,0 +1,27 @@
+import asyncio
+import logging
+
+from app.metrics import detached_context
+
+logger = logging.getLogger(__name__)
+
+# strong references to fire-and-forget tasks so they are not collected early
+_tasks = set()
+
+
+def spawn(coro) -> asyncio.Task:
+    """
+    Run `coro` after the current request without awaiting it; failures are
+    logged, never raised into the handler that scheduled it.
+    """
+    # not charged to the request's upstream stats: it finishes whenever
+    task = asyncio.get_running_loop().create_task(coro, context=detached_context())
+    _tasks.add(task)
+    task.add_done_callback(_finished)
+    return task
+
+
+def _finished(task: asyncio.Task) -> None:
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("background task failed: %r", task.exception())
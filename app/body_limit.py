@@ -0,0 +1,51 @@
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+
+# Request bodies are capped before the app reads them. Starlette spools a
+# whole multipart body to memory/disk before a handler runs, so a limit
+# checked while reading an UploadFile comes too late to bound either.
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413, detail=f"Request body larger than {max_bytes // (1024 * 1024)} MB")
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware refusing bodies over `max_bytes` with a 413: up front
+    from Content-Length, and for chunked bodies as soon as the bytes
+    received pass the limit.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and (not length.isdigit() or int(length) > self.max_bytes):
+            error = _too_large(self.max_bytes) if length.isdigit() else HTTPException(
+                status_code=400, detail="Invalid Content-Length")
+            response = ORJSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # raised inside the handler's body parsing, so the app's
+                    # exception handlers turn it into the 413 response
+                    raise _too_large(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Optional
+
+from app.config import CACHE_BACKEND, CACHE_SHARED_DIR
+
+
+class TTLCache:
+    """
+    In-process LRU cache with a per-entry expiry.
+
+    Bounded both by number of entries and by an approximate byte budget
+    (callers pass the size of what they store). Entries can carry tags so
+    a write can drop every entry derived from the rows it touched.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: Optional[int] = None, ttl: float = 60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # key -> (value, expires_at, size, tags)
+        self._tags = {}  # tag -> set of keys
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # bumped by every invalidation; see `stamp`
+        self._invalidations = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at, _, _ = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def stamp(self) -> int:
+        """
+        The invalidation count; pass it to `set` to skip storing a value
+        built while any tag was invalidated.
+        """
+        return self._invalidations
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        expires_at: Optional[float] = None,
+        size: int = 0,
+        tags: Iterable[str] = (),
+        stamp: Optional[int] = None,
+    ) -> None:
+        """
+        Store a value. The entry lives for `ttl` seconds (default: the cache
+        ttl) but never past `expires_at` when that is given.
+        """
+        deadline = time.time() + (self.ttl if ttl is None else ttl)
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        if deadline <= time.time():
+            return
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        with self._lock:
+            if stamp is not None and stamp != self._invalidations:
+                return
+            if key in self._entries:
+                self._remove(key)
+
+            tags = tuple(tags)
+            self._entries[key] = (value, deadline, size, tags)
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            self._evict()
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """
+        Drop every entry stored under any of `tags`; returns how many went.
+        """
+        removed = 0
+        with self._lock:
+            self._invalidations += 1
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        removed += 1
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size, tags = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+
+def make_cache(name: str, max_entries: int = 1024, max_bytes: Optional[int] = None, ttl: float = 60):
+    """
+    A TTLCache, or with CACHE_BACKEND=shared one shared by every worker
+    process on the node (see app/shared_cache.py). `name` picks the file.
+    """
+    if CACHE_BACKEND == "shared":
+        from app.shared_cache import SharedCache
+        return SharedCache(name, max_entries=max_entries, max_bytes=max_bytes, ttl=ttl, directory=CACHE_SHARED_DIR)
+    if CACHE_BACKEND != "memory":
+        raise RuntimeError(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}, use 'memory' or 'shared'")
+    return TTLCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
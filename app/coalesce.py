@@ -0,0 +1,52 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class ToggleCoalescer:
+    """
+    Collapses rapid on/off toggles of the same (user, target) pair.
+
+    Callers submit the state they want. While a write for that key is in
+    flight, later submissions only record the newest wanted state; the
+    running writer re-applies until the stored state matches it, so a burst
+    of taps costs one upstream call (two when it ends on the other state).
+    """
+
+    def __init__(self):
+        self._wanted: Dict[Hashable, bool] = {}
+        self._running: Dict[Hashable, asyncio.Future] = {}
+
+    async def submit(
+        self,
+        key: Hashable,
+        wanted: bool,
+        apply: Callable[[bool], Awaitable[None]],
+    ) -> bool:
+        """
+        Ask for `key` to end up in state `wanted`; returns the state that
+        was finally written.
+        """
+        self._wanted[key] = wanted
+
+        task = self._running.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._drive(key, apply))
+            self._running[key] = task
+
+        return await asyncio.shield(task)
+
+    async def _drive(self, key, apply) -> bool:
+        written = None
+        try:
+            while self._wanted[key] != written:
+                state = self._wanted[key]
+                await apply(state)
+                written = state
+            return written
+        finally:
+            self._running.pop(key, None)
+            self._wanted.pop(key, None)
+
+
+# shared by the like, bookmark and follow toggles
+toggles = ToggleCoalescer()
@@ -1,7 +1,12 @@
 import os
-# from supabase_py_async import AsyncClient, create_client
+import httpx
 from dotenv import load_dotenv
-from supabase import create_client, AsyncClient
+from postgrest import AsyncPostgrestClient
+from storage3 import AsyncStorageClient
+from supabase import AsyncClient
+from supabase._async.auth_client import AsyncSupabaseAuthClient
+
+from app.metrics import InstrumentedTransport
 
 load_dotenv()
 
@@ -9,8 +14,193 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_ROLE_KEY = os.getenv("SUPABASE_ROLE_KEY")
 
-db: AsyncClient = create_client(SUPABASE_URL, SUPABASE_KEY)
-db_admin: AsyncClient = create_client(SUPABASE_URL, SUPABASE_ROLE_KEY)
+# where posts, profiles and engagement live: "supabase" (PostgREST) or
+# "sqlite" (embedded, single node; auth and storage stay on Supabase)
+DATA_BACKEND = os.getenv("DATA_BACKEND", "supabase")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "wblog.db")
+
+# upstream HTTP pool, shared by every Supabase client in this process
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "50"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+# requests making more upstream calls than this are logged (0 disables)
+UPSTREAM_CALL_WARN_THRESHOLD = int(os.getenv("UPSTREAM_CALL_WARN_THRESHOLD", "10"))
+
+# list endpoints (feeds, comments, follower lists)
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "20"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+
+# teaser stored with every post for list views
+EXCERPT_LENGTH = int(os.getenv("EXCERPT_LENGTH", "280"))
+READING_WORDS_PER_MINUTE = int(os.getenv("READING_WORDS_PER_MINUTE", "200"))
+
+# live post events (SSE): events kept per post for Last-Event-ID resume,
+# posts with a channel, open streams per process, seconds between heartbeats
+EVENTS_HISTORY = int(os.getenv("EVENTS_HISTORY", "256"))
+EVENTS_MAX_CHANNELS = int(os.getenv("EVENTS_MAX_CHANNELS", "10000"))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "5000"))
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+
+# profiles resolved for `?shape=normalized` list responses
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "10"))
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "20000"))
+
+# GET /profiles/{id}/summary: recent posts shown by default, and seconds
+# the public part is cached (follows by others only show up after expiry)
+PROFILE_SUMMARY_POSTS = int(os.getenv("PROFILE_SUMMARY_POSTS", "5"))
+PROFILE_SUMMARY_CACHE_TTL = float(os.getenv("PROFILE_SUMMARY_CACHE_TTL", "5"))
+
+# in-process post search index: rows per load query, seconds between full
+# rebuilds (picks up other workers' writes; 0 builds once), the weight of a
+# title word against a body word, and per-query caps on words and on the
+# prefix/typo variants each word expands to
+SEARCH_LOAD_BATCH = int(os.getenv("SEARCH_LOAD_BATCH", "1000"))
+SEARCH_REFRESH_INTERVAL = float(os.getenv("SEARCH_REFRESH_INTERVAL", "600"))
+SEARCH_TITLE_WEIGHT = int(os.getenv("SEARCH_TITLE_WEIGHT", "3"))
+SEARCH_MAX_TERMS = int(os.getenv("SEARCH_MAX_TERMS", "8"))
+SEARCH_MAX_EXPANSIONS = int(os.getenv("SEARCH_MAX_EXPANSIONS", "50"))
+
+# in-process trending ranking: likes and comments count for a post with a
+# weight that halves every TRENDING_HALF_LIFE seconds; rebuilds load the
+# last TRENDING_WINDOW seconds of them, TRENDING_LOAD_BATCH rows per query,
+# every TRENDING_REFRESH_INTERVAL seconds (0 builds once)
+TRENDING_HALF_LIFE = float(os.getenv("TRENDING_HALF_LIFE", str(6 * 3600)))
+TRENDING_COMMENT_WEIGHT = float(os.getenv("TRENDING_COMMENT_WEIGHT", "3"))
+TRENDING_WINDOW = float(os.getenv("TRENDING_WINDOW", str(7 * 24 * 3600)))
+TRENDING_LOAD_BATCH = int(os.getenv("TRENDING_LOAD_BATCH", "1000"))
+TRENDING_REFRESH_INTERVAL = float(os.getenv("TRENDING_REFRESH_INTERVAL", "900"))
+
+# "who to follow" from an in-process follow graph: rows per load query,
+# seconds between full rebuilds (0 builds once), accounts following more
+# than RECOMMEND_MAX_FANOUT users are not used as a path (they follow
+# everyone), candidates rescored for category affinity, what a perfect
+# category match is worth against one shared followee, and the likes
+# sampled (and cached, in seconds) for a user's categories
+RECOMMEND_LOAD_BATCH = int(os.getenv("RECOMMEND_LOAD_BATCH", "5000"))
+RECOMMEND_REFRESH_INTERVAL = float(os.getenv("RECOMMEND_REFRESH_INTERVAL", "1800"))
+RECOMMEND_MAX_FANOUT = int(os.getenv("RECOMMEND_MAX_FANOUT", "2000"))
+RECOMMEND_POOL = int(os.getenv("RECOMMEND_POOL", "200"))
+RECOMMEND_CATEGORY_WEIGHT = float(os.getenv("RECOMMEND_CATEGORY_WEIGHT", "2"))
+RECOMMEND_LIKES_SAMPLE = int(os.getenv("RECOMMEND_LIKES_SAMPLE", "200"))
+RECOMMEND_AFFINITY_TTL = float(os.getenv("RECOMMEND_AFFINITY_TTL", "300"))
+
+# where the feed, auth and profile caches live: "memory" (per process) or
+# "shared" (one mmap-backed cache for every worker on the node, in a 0700
+# wblog-<uid> directory under CACHE_SHARED_DIR, /dev/shm by default). With
+# "memory" and several workers, a logout only revokes the token on the
+# worker that handled it (see revoked_tokens in app/dependencies.py)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_SHARED_DIR = os.getenv("CACHE_SHARED_DIR") or None
+
+# cached public feed responses; writes invalidate them, the TTL is a safety net
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "30"))
+FEED_CACHE_MAX_ENTRIES = int(os.getenv("FEED_CACHE_MAX_ENTRIES", "2000"))
+FEED_CACHE_MAX_BYTES = int(os.getenv("FEED_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# ETags of the per-request responses (posts, profiles, timelines), kept so a
+# matching revalidation skips the query; writes drop them, the TTL bounds
+# how long another worker's write can go unnoticed with the memory backend
+ETAG_CACHE_TTL = float(os.getenv("ETAG_CACHE_TTL", "30"))
+ETAG_CACHE_MAX_ENTRIES = int(os.getenv("ETAG_CACHE_MAX_ENTRIES", "100000"))
+
+# write-behind for likes, bookmarks and follows (off by default): toggles
+# are acknowledged once journaled under WRITE_BEHIND_DIR and sent upstream
+# in bulk every WRITE_BEHIND_INTERVAL seconds or WRITE_BEHIND_BATCH rows
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+WRITE_BEHIND_DIR = os.getenv("WRITE_BEHIND_DIR", "journal")
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.02"))
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+
+# seconds between full recounts of the denormalized counters (0 disables)
+COUNTER_RECONCILE_INTERVAL = float(os.getenv("COUNTER_RECONCILE_INTERVAL", "900"))
+
+# home timelines: authors above the fan-out limit are merged in at read time
+TIMELINE_FANOUT_LIMIT = int(os.getenv("TIMELINE_FANOUT_LIMIT", "5000"))
+TIMELINE_FANOUT_BATCH = int(os.getenv("TIMELINE_FANOUT_BATCH", "500"))
+TIMELINE_BACKFILL = int(os.getenv("TIMELINE_BACKFILL", "50"))
+
+# image uploads: size cap, read chunk size and the WebP variants rendered
+# off the request path, as "name:width" pairs
+IMAGE_BUCKET = os.getenv("IMAGE_BUCKET", "images")
+IMAGE_STAGING_FOLDER = os.getenv("IMAGE_STAGING_FOLDER", "staging")
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+IMAGE_CHUNK_SIZE = int(os.getenv("IMAGE_CHUNK_SIZE", str(64 * 1024)))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_VARIANTS = {
+    name: int(width)
+    for name, width in (
+        pair.split(":") for pair in os.getenv("IMAGE_VARIANTS", "thumb:320,medium:960").split(",")
+    )
+}
+
+# whole request bodies, checked before they are read: room for the largest
+# image plus the other form fields
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(IMAGE_MAX_BYTES + 1024 * 1024)))
+
+http_transport = InstrumentedTransport(httpx.AsyncHTTPTransport(
+    http2=True,
+    limits=httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    ),
+))
+
+
+def pooled_http_client() -> httpx.AsyncClient:
+    # postgrest and storage3 set base_url/headers on the client they are
+    # given, so each of them gets its own client over the shared pool
+    return httpx.AsyncClient(
+        transport=http_transport,
+        timeout=HTTP_TIMEOUT,
+        follow_redirects=True,
+    )
+
+
+class PooledAsyncClient(AsyncClient):
+    """
+    Supabase AsyncClient whose auth, PostgREST and storage sub-clients all
+    send requests through `http_transport`.
+    """
+
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, *args, **kwargs):
+        return AsyncPostgrestClient(
+            rest_url,
+            headers=headers,
+            schema=schema,
+            http_client=pooled_http_client(),
+        )
+
+    @staticmethod
+    def _init_storage_client(storage_url, headers, *args, **kwargs):
+        return AsyncStorageClient(
+            url=storage_url,
+            headers=headers,
+            http_client=pooled_http_client(),
+        )
+
+    @staticmethod
+    def _init_supabase_auth_client(auth_url, client_options, verify=True, proxy=None):
+        return AsyncSupabaseAuthClient(
+            url=auth_url,
+            auto_refresh_token=client_options.auto_refresh_token,
+            persist_session=client_options.persist_session,
+            storage=client_options.storage,
+            headers=client_options.headers,
+            flow_type=client_options.flow_type,
+            http_client=pooled_http_client(),
+        )
+
+
+db: AsyncClient = PooledAsyncClient(SUPABASE_URL, SUPABASE_KEY)
+db_admin: AsyncClient = PooledAsyncClient(SUPABASE_URL, SUPABASE_ROLE_KEY)
+
+
+async def close_clients():
+    await http_transport.aclose()
 
 
-# this file is used to load .env variables all over the project!
\ No newline at end of file
+# this file is used to load .env variables all over the project!
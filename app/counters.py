@@ -0,0 +1,55 @@
+import asyncio
+import logging
+
+from app.background import spawn
+from app.config import COUNTER_RECONCILE_INTERVAL
+from app.http_cache import etag_cache, invalidate_etags, post_tag, profile_tag
+from app.repositories import repos
+
+logger = logging.getLogger(__name__)
+
+# denormalized counters on posts and profiles, see
+# supabase/migrations/*_denormalized_counters.sql
+
+
+async def _adjust(adjust, row_id: str, column: str, delta: int, tag: str) -> None:
+    try:
+        await adjust(row_id, column, delta)
+    except Exception as e:
+        # the periodic reconciliation repairs whatever gets lost here
+        logger.warning("counter update %s %s %+d failed: %s", row_id, column, delta, e)
+    else:
+        invalidate_etags(tag)
+
+
+def bump_post(post_id: str, column: str, delta: int) -> None:
+    """
+    Adjust likes_count, comments_count or bookmarks_count of a post.
+    """
+    # counters never hold up the response of the write that moved them
+    spawn(_adjust(repos.posts.adjust_counter, post_id, column, delta, post_tag(post_id)))
+
+
+def bump_profile(profile_id: str, column: str, delta: int) -> None:
+    """
+    Adjust followers_count, following_count or posts_count of a profile.
+    """
+    spawn(_adjust(repos.profiles.adjust_counter, profile_id, column, delta, profile_tag(profile_id)))
+
+
+async def reconcile() -> None:
+    await repos.reconcile_counters()
+    # any post or profile may have been corrected
+    etag_cache.clear()
+
+
+async def reconcile_forever() -> None:
+    """
+    Recompute every counter from the source tables at a fixed interval.
+    """
+    while True:
+        await asyncio.sleep(COUNTER_RECONCILE_INTERVAL)
+        try:
+            await reconcile()
+        except Exception as e:
+            logger.warning("counter reconciliation failed: %s", e)
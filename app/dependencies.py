@@ -1,37 +1,200 @@
-import uuid
 from fastapi import Depends, HTTPException, status, UploadFile, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.config import db, db_admin
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from app.config import db
+from app.cache import make_cache
+from app.images import store_image
+import hashlib
 import jwt
+import logging
 import os
+import time
+
+logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
 JWT_SECRET = os.getenv("JWT_SECRET")
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "authenticated")
+
+# "local" checks the token signature in-process, "remote" asks Supabase Auth every time
+AUTH_VERIFY_MODE = os.getenv("AUTH_VERIFY_MODE", "local" if JWT_SECRET else "remote")
+# tokens expiring within this many seconds are re-checked with Supabase Auth
+AUTH_REMOTE_FALLBACK_WINDOW = int(os.getenv("AUTH_REMOTE_FALLBACK_WINDOW", "30"))
+
+# resolved users, keyed by sha256(token); entries never outlive the token's exp
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CACHE_MAX_BYTES = int(os.getenv("AUTH_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+user_cache = make_cache(
+    "users",
+    max_entries=AUTH_CACHE_MAX_ENTRIES,
+    max_bytes=AUTH_CACHE_MAX_BYTES,
+    ttl=AUTH_CACHE_TTL,
+)
+
+# logged-out tokens, keyed like user_cache, kept until they expire: a token
+# verified locally would otherwise stay valid until its exp. Shared by every
+# worker with CACHE_BACKEND=shared. With the default CACHE_BACKEND=memory
+# the list is per process, so a logged-out token is only refused by the
+# worker that handled the logout; every other worker accepts it (from its
+# user_cache or by checking the signature) until its exp. Run several
+# workers with local verification only on the shared backend; in remote
+# mode Supabase Auth refuses the ended session once the other workers'
+# user_cache entries (AUTH_CACHE_TTL) run out. AUTH_REVOKED_TTL only
+# applies to tokens without a readable exp
+AUTH_REVOKED_TTL = int(os.getenv("AUTH_REVOKED_TTL", str(24 * 3600)))
+AUTH_REVOKED_MAX_ENTRIES = int(os.getenv("AUTH_REVOKED_MAX_ENTRIES", "100000"))
+
+revoked_tokens = make_cache(
+    "revoked",
+    max_entries=AUTH_REVOKED_MAX_ENTRIES,
+    ttl=AUTH_REVOKED_TTL,
+)
+
+
+class TokenUser(BaseModel):
+    """
+    User built from verified JWT claims, exposing the same fields the
+    routes read from a Supabase user (id, email, user_metadata...).
+    """
+    id: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    role: Optional[str] = None
+    aud: Optional[str] = None
+    app_metadata: Dict[str, Any] = {}
+    user_metadata: Dict[str, Any] = {}
 
 
-def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
-
+async def _verify_remote(token: str):
     try:
-        # Verify token with db
-        user = db.auth.get_user(token)
-
-        if user.user is None:
+        user = await db.auth.get_user(token)
+        if user is None or user.user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired token"
             )
         return user.user
 
-    except Exception:
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Could not validate credentials, {e}"
+        )
+
+
+def _verify_local(token: str):
+    try:
+        # only the shared-secret (HS256) tokens can be checked here
+        if jwt.get_unverified_header(token).get("alg") != "HS256":
+            return None
+
+        claims = jwt.decode(
+            token,
+            JWT_SECRET,
+            algorithms=["HS256"],
+            audience=JWT_AUDIENCE,
+            options={"require": ["exp", "sub"]},
+        )
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token"
+        )
+    except jwt.InvalidTokenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Could not validate credentials, {e}"
+        )
+
+    # close to expiry: let Supabase confirm the session is still alive
+    if claims["exp"] - time.time() <= AUTH_REMOTE_FALLBACK_WINDOW:
+        return None
+
+    return TokenUser(
+        id=claims["sub"],
+        email=claims.get("email"),
+        phone=claims.get("phone"),
+        role=claims.get("role"),
+        aud=claims.get("aud"),
+        app_metadata=claims.get("app_metadata") or {},
+        user_metadata=claims.get("user_metadata") or {},
+    )
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _token_expiry(token: str) -> Optional[float]:
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return None
+    return claims.get("exp")
+
+
+def invalidate_token(token: Optional[str]) -> None:
+    """
+    Revoke a token that is being replaced or ended (logout, refresh): it
+    is dropped from the resolved-user cache and refused until it expires,
+    by every worker with CACHE_BACKEND=shared, by this one only otherwise.
+    """
+    if token:
+        key = _token_key(token)
+        user_cache.delete(key)
+        expires_at = _token_expiry(token)
+        revoked_tokens.set(key, True, ttl=expires_at - time.time() if expires_at else None)
+
+
+async def verify_token(token: Optional[str]):
+    """
+    Resolve an access token to a user, locally when possible and through
+    Supabase Auth otherwise.
+    """
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+
+    key = _token_key(token)
+    if revoked_tokens.get(key):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials"
+            detail="Invalid or expired token"
         )
 
+    cached = user_cache.get(key)
+    if cached is not None:
+        return TokenUser.model_validate(cached)
+
+    user = None
+    if AUTH_VERIFY_MODE == "local" and JWT_SECRET:
+        user = _verify_local(token)
+    if user is None:
+        user = await _verify_remote(token)
+
+    expires_at = _token_expiry(token)
+    if expires_at is not None:
+        # plain JSON data, so the shared backend never has to unpickle
+        fields = user.model_dump(mode="json", include=set(TokenUser.model_fields))
+        user_cache.set(
+            key,
+            fields,
+            expires_at=expires_at,
+            size=len(key) + len(user.model_dump_json()),
+        )
+    return user
+
+
+async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await verify_token(credentials.credentials)
 
 
-def get_current_user(request: Request):
+async def get_current_user(request: Request):
     # auth_header = request.headers.get("Authorization")
     # if not auth_header:
     #     raise HTTPException(
@@ -40,26 +203,25 @@ def get_current_user(request: Request):
     #     )
 
     # token = auth_header.split(" ")[1]
-    
+
     token = request.cookies.get("access_token")
+    return await verify_token(token)
 
-    try:
-        user = db.auth.get_user(token)# <-- await here
-        # print(user)
-        if user.user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired token"
-            )
-        return user.user
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Could not validate credentials, {e}"
-        )
+async def get_optional_user(request: Request):
+    """
+    The signed-in user for public routes that show a little more to them;
+    None for anonymous callers and stale cookies alike.
+    """
+    token = request.cookies.get("access_token")
+    if not token:
+        return None
+    try:
+        return await verify_token(token)
+    except HTTPException:
+        return None
 
-def admin_required(user=Depends(get_current_admin)):
+async def admin_required(user=Depends(get_current_admin)):
     if not user.user_metadata.get("is_admin"):
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
@@ -68,46 +230,16 @@ def admin_required(user=Depends(get_current_admin)):
 # converting images to urls
 
 
-async def upload_image(file: UploadFile, folder: str, user_id: str) -> str:
+async def upload_image(file: UploadFile, folder: str, user_id: str) -> dict:
     """
-    Upload an image to Supabase Storage and return its public URL.
+    Upload an image to Supabase Storage and return its public URL together
+    with the URLs of its resized variants.
     """
     try:
-        # 1. Read file content asynchronously
-        file_bytes = await file.read()
-        content_type = file.content_type
-
-        # 2. Determine extension
-        ext_map = {
-            "image/jpeg": ".jpeg",
-            "image/jpg": ".jpg",
-            "image/png": ".png",
-            "image/webp": ".webp",
-        }
-        ext = ext_map.get(content_type, ".jpg")
-
-        # 3. Unique filename
-        filename = f"{uuid.uuid4()}{ext}"
-        file_path = f"{folder}/{user_id}/{filename}"  # folder/user_id/filename
-
-        # 4. Upload synchronously (remove await!)
-        upload_response = db_admin.storage.from_("images").upload(
-            path=file_path,
-            file=file_bytes,
-            file_options={"content-type": content_type}
-        )
-
-        if not upload_response:
-            raise HTTPException(status_code=500, detail="Failed to upload image to Supabase.")
-
-        # 5. Get public URL
-        public_url = db_admin.storage.from_("images").get_public_url(file_path)
-
-        if not public_url:
-            raise HTTPException(status_code=500, detail="Failed to retrieve public URL for uploaded image.")
-        return public_url
+        return await store_image(file, folder, user_id)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error during image upload: {e}")
+        logger.exception("image upload failed")
         raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)}")
-    
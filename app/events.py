@@ -0,0 +1,165 @@
+import asyncio
+import itertools
+import secrets
+from collections import OrderedDict, deque
+from typing import AsyncIterator, List, Optional, Tuple
+
+import orjson
+
+from app.config import EVENTS_HEARTBEAT, EVENTS_HISTORY, EVENTS_MAX_CHANNELS, EVENTS_MAX_SUBSCRIBERS
+
+# per-post live events (comments, like deltas) for Server-Sent Events
+# streams. Fan-out is in-process: a write reaches the subscribers connected
+# to the worker that handled it.
+
+# event ids are "<epoch>:<seq>" with one seq counter for every channel; the
+# epoch changes with every process, so a Last-Event-ID from another worker
+# or an earlier run is never trusted
+EPOCH = secrets.token_hex(4)
+
+# how long a disconnected EventSource waits before reconnecting
+RETRY_MS = 3000
+
+# (seq, event name, JSON data)
+Event = Tuple[int, str, bytes]
+
+
+class _Channel:
+    """
+    One post's recent events in a bounded ring. Subscribers keep their own
+    position in it instead of a queue each: a slow subscriber costs no
+    memory, and one that falls off the end of the ring is told to resync.
+    """
+
+    def __init__(self, seq: int):
+        self.history: deque = deque(maxlen=EVENTS_HISTORY)
+        # last event published here, and the newest one no longer in the
+        # ring (or the channel's creation point); resuming from before
+        # `floor` may have missed events
+        self.seq = seq
+        self.floor = seq
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+
+    def publish(self, seq: int, name: str, data: dict) -> None:
+        if len(self.history) == self.history.maxlen:
+            self.floor = self.history[0][0]
+        self.seq = seq
+        self.history.append((seq, name, orjson.dumps(data)))
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def since(self, seq: int) -> Optional[List[Event]]:
+        """
+        Events after `seq`, or None when some of them already left the ring.
+        """
+        if seq < self.floor:
+            return None
+        if seq >= self.seq:
+            return []
+        return [event for event in self.history if event[0] > seq]
+
+    async def wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class PostEvents:
+    """
+    Channels by post id. Only posts somebody watches (or watched recently,
+    so a reconnect can resume) have one; publishing to others is free.
+    """
+
+    def __init__(self, max_channels: int = EVENTS_MAX_CHANNELS, max_subscribers: int = EVENTS_MAX_SUBSCRIBERS):
+        self.max_channels = max_channels
+        self.max_subscribers = max_subscribers
+        self.subscribers = 0
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+        self._seq = itertools.count(1)
+        self._last = 0
+
+    def publish(self, post_id: str, name: str, data: dict) -> None:
+        channel = self._channels.get(post_id)
+        if channel is not None:
+            self._last = next(self._seq)
+            channel.publish(self._last, name, data)
+
+    def full(self) -> bool:
+        return self.subscribers >= self.max_subscribers
+
+    def _open(self, post_id: str) -> _Channel:
+        channel = self._channels.get(post_id)
+        if channel is None:
+            channel = self._channels[post_id] = _Channel(self._last)
+        self._channels.move_to_end(post_id)
+        channel.subscribers += 1
+        self.subscribers += 1
+        self._evict()
+        return channel
+
+    def _close(self, channel: _Channel) -> None:
+        channel.subscribers -= 1
+        self.subscribers -= 1
+        self._evict()
+
+    def _evict(self) -> None:
+        # drop the least recently opened channels nobody is watching
+        excess = len(self._channels) - self.max_channels
+        if excess <= 0:
+            return
+        for post_id in [pid for pid, c in self._channels.items() if not c.subscribers][:excess]:
+            del self._channels[post_id]
+
+    async def stream(self, post_id: str, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """
+        SSE frames for one subscriber: a replay of what it missed since
+        `last_event_id` when that is still known, then live events, with a
+        comment line as heartbeat while the post is quiet.
+        """
+        channel = self._open(post_id)
+        try:
+            seq = channel.seq
+            yield b"retry: %d\n\n" % RETRY_MS
+
+            if last_event_id:
+                resumed = _resume_seq(last_event_id)
+                missed = channel.since(resumed) if resumed is not None else None
+                if missed is None:
+                    yield _frame((seq, "reset", b"{}"))
+                else:
+                    seq = resumed
+
+            while True:
+                events = channel.since(seq)
+                if events is None:
+                    # fell behind by more than the ring holds
+                    seq = channel.seq
+                    yield _frame((seq, "reset", b"{}"))
+                    continue
+                if events:
+                    seq = events[-1][0]
+                    yield b"".join(_frame(event) for event in events)
+                    continue
+
+                await channel.wait(EVENTS_HEARTBEAT)
+                if channel.seq == seq:
+                    yield b": ping\n\n"
+        finally:
+            self._close(channel)
+
+
+def _resume_seq(last_event_id: str) -> Optional[int]:
+    epoch, _, seq = last_event_id.partition(":")
+    if epoch != EPOCH or not seq.isdigit():
+        return None
+    return int(seq)
+
+
+def _frame(event: Event) -> bytes:
+    seq, name, data = event
+    return b"id: %s:%d\nevent: %s\ndata: %s\n\n" % (EPOCH.encode(), seq, name.encode(), data)
+
+
+post_events = PostEvents()
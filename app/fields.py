@@ -0,0 +1,91 @@
+import math
+import re
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.config import EXCERPT_LENGTH, READING_WORDS_PER_MINUTE
+
+
+# sparse fieldsets: `?fields=title,excerpt,profiles` on post list endpoints,
+# checked against an allowlist and handed to the repositories as names
+
+POST_COLUMNS = {
+    "id", "title", "content", "excerpt", "reading_time",
+    "cover_image_url", "cover_image_variants", "created_at",
+    "author_id", "category_id",
+    "likes_count", "comments_count", "bookmarks_count",
+}
+
+# embedded relations, requested by their response key
+POST_EMBEDS = {
+    "profiles": "profiles(username, image_url)",
+    "categories": "categories(name)",
+}
+
+# what list views get without `fields`: the teaser, never the full body
+LIST_FIELDS = (
+    "id", "title", "excerpt", "reading_time",
+    "cover_image_url", "cover_image_variants", "created_at",
+    "author_id", "category_id",
+    "likes_count", "comments_count", "bookmarks_count",
+    "profiles", "categories",
+)
+
+# a single post: every column plus the embeds
+FULL_FIELDS = ("*", "categories", "profiles")
+
+# keyset pagination needs these on every row
+REQUIRED_FIELDS = ("id", "created_at")
+
+_TAGS = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"\s+")
+
+
+def post_fields(fields: Optional[str], default: Tuple[str, ...] = LIST_FIELDS) -> Tuple[str, ...]:
+    """
+    Validated field names for a `fields` parameter, `default` when absent.
+    Unknown names are a 400, not silently dropped.
+    """
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(default)
+
+    unknown = [n for n in names if n not in POST_COLUMNS and n not in POST_EMBEDS and n != "*"]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    if "*" not in names:
+        for name in reversed(REQUIRED_FIELDS):
+            if name not in names:
+                names.insert(0, name)
+
+    # dedupe, keep the requested order
+    return tuple(dict.fromkeys(names))
+
+
+def post_select(names: Tuple[str, ...]) -> str:
+    """
+    PostgREST select string for validated field names.
+    """
+    return ", ".join(POST_EMBEDS.get(n, n) for n in names)
+
+
+def summarize(content: str) -> Dict[str, object]:
+    """
+    The `excerpt` and `reading_time` (minutes) stored alongside a post body.
+    """
+    text = _SPACE.sub(" ", _TAGS.sub(" ", content or "")).strip()
+    words = len(text.split())
+
+    excerpt = text
+    if len(text) > EXCERPT_LENGTH:
+        cut = text[:EXCERPT_LENGTH]
+        # end on a whole word when there is one to end on
+        if " " in cut:
+            cut = cut.rsplit(" ", 1)[0]
+        excerpt = cut.rstrip(" .,;:") + "…"
+
+    return {
+        "excerpt": excerpt,
+        "reading_time": max(1, math.ceil(words / READING_WORDS_PER_MINUTE)) if words else 0,
+    }
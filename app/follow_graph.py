@@ -0,0 +1,280 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.cache import make_cache
+from app.config import (
+    PROFILE_CACHE_MAX_ENTRIES,
+    RECOMMEND_AFFINITY_TTL,
+    RECOMMEND_CATEGORY_WEIGHT,
+    RECOMMEND_LIKES_SAMPLE,
+    RECOMMEND_LOAD_BATCH,
+    RECOMMEND_MAX_FANOUT,
+    RECOMMEND_POOL,
+    RECOMMEND_REFRESH_INTERVAL,
+)
+from app.repositories import repos
+
+logger = logging.getLogger(__name__)
+
+# in-process follow graph for "who to follow". User ids are interned to
+# small ints and every user's followees kept as a sorted array of them, so
+# the whole graph costs a few bytes per edge and friends-of-friends is a
+# walk over a handful of arrays instead of a query per hop.
+#
+# Candidates are the users followed by the people a user follows, ranked by
+# how many of those follow them, then rescored by how well the categories
+# they post in match the categories of the posts the user likes. Users with
+# no path yet (new accounts) get the most followed ones instead.
+#
+# Follows made through this worker update it as they happen; a periodic
+# rebuild from the follows and posts tables picks up the rest.
+
+# rows handled between yields to the event loop while loading
+LOAD_YIELD_EVERY = 1000
+
+# seconds the most followed users are kept before being recounted
+POPULAR_TTL = 60.0
+
+# user_id -> {category_id: likes} among the user's latest likes
+affinity_cache = make_cache("affinities", max_entries=PROFILE_CACHE_MAX_ENTRIES, ttl=RECOMMEND_AFFINITY_TTL)
+
+# (user_id, mutual followees, score)
+Suggestion = Tuple[str, int, float]
+
+
+def _cosine(a: Dict[str, int], b: Dict[str, int]) -> float:
+    if not a or not b:
+        return 0.0
+    if len(b) < len(a):
+        a, b = b, a
+    dot = sum(count * b.get(category_id, 0) for category_id, count in a.items())
+    if not dot:
+        return 0.0
+    return dot / math.sqrt(sum(c * c for c in a.values()) * sum(c * c for c in b.values()))
+
+
+class FollowGraph:
+    """
+    Followees by interned user id, follower counts, and the categories each
+    author has posted in.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        # sorted interned ids each user follows
+        self._following: List[array] = []
+        self._followers = array("i")
+        self._categories: Dict[int, Counter] = {}
+        self._edges = 0
+        self._popular: List[int] = []
+        self._popular_at = 0.0
+
+    def __len__(self) -> int:
+        return self._edges
+
+    @property
+    def users(self) -> int:
+        return len(self._names)
+
+    def _intern(self, user_id: str) -> int:
+        uid = self._ids.get(user_id)
+        if uid is None:
+            uid = self._ids[user_id] = len(self._names)
+            self._names.append(user_id)
+            self._following.append(array("i"))
+            self._followers.append(0)
+        return uid
+
+    def add(self, follower_id: str, following_id: str) -> bool:
+        a, b = self._intern(follower_id), self._intern(following_id)
+        row = self._following[a]
+        if not row or row[-1] < b:
+            # loads and new accounts mostly come in id order
+            row.append(b)
+        else:
+            i = bisect_left(row, b)
+            if row[i] == b:
+                return False
+            row.insert(i, b)
+        self._followers[b] += 1
+        self._edges += 1
+        return True
+
+    def remove(self, follower_id: str, following_id: str) -> bool:
+        a, b = self._ids.get(follower_id), self._ids.get(following_id)
+        if a is None or b is None:
+            return False
+        row = self._following[a]
+        i = bisect_left(row, b)
+        if i == len(row) or row[i] != b:
+            return False
+        del row[i]
+        self._followers[b] -= 1
+        self._edges -= 1
+        return True
+
+    def add_post(self, author_id: str, category_id: Optional[str], delta: int = 1) -> None:
+        if not category_id:
+            return
+        categories = self._categories.setdefault(self._intern(author_id), Counter())
+        categories[category_id] += delta
+        if categories[category_id] <= 0:
+            del categories[category_id]
+
+    def _most_followed(self) -> List[int]:
+        now = time.monotonic()
+        if now - self._popular_at > POPULAR_TTL:
+            top = heapq.nlargest(RECOMMEND_POOL, range(len(self._followers)), key=self._followers.__getitem__)
+            self._popular = [uid for uid in top if self._followers[uid]]
+            self._popular_at = now
+        return self._popular
+
+    def suggest(
+            self, user_id: str, limit: int, affinity: Optional[Dict[str, int]] = None,
+            skip: Iterable[str] = ()) -> List[Suggestion]:
+        """
+        Up to `limit` users `user_id` does not follow yet, best first.
+        """
+        me = self._ids.get(user_id)
+        mine = self._following[me] if me is not None else array("i")
+
+        mutual: Counter = Counter()
+        for uid in mine:
+            row = self._following[uid]
+            if len(row) <= RECOMMEND_MAX_FANOUT:
+                mutual.update(row)
+
+        excluded = set(mine)
+        excluded.update(self._ids[name] for name in skip if name in self._ids)
+        if me is not None:
+            excluded.add(me)
+        for uid in excluded:
+            mutual.pop(uid, None)
+
+        followers = self._followers
+        pool = heapq.nlargest(RECOMMEND_POOL, mutual, key=lambda uid: (mutual[uid], followers[uid]))
+        if len(pool) < limit:
+            pool += [uid for uid in self._most_followed() if uid not in excluded and uid not in mutual]
+
+        scored = []
+        for uid in pool:
+            score = mutual[uid]
+            if affinity:
+                score += RECOMMEND_CATEGORY_WEIGHT * _cosine(affinity, self._categories.get(uid))
+            scored.append((score, followers[uid], uid))
+        best = heapq.nlargest(limit, scored)
+        return [(self._names[uid], mutual[uid], round(score, 4)) for score, _, uid in best]
+
+
+class FollowSuggestions:
+    """
+    The live graph plus the bookkeeping to rebuild it from the follows and
+    posts tables while follows keep arriving.
+    """
+
+    def __init__(self):
+        self.graph = FollowGraph()
+        # false until the first build finishes; requests get a 503 until then
+        self.ready = False
+        self._building: Optional[FollowGraph] = None
+
+    def _graphs(self) -> List[FollowGraph]:
+        return [self.graph] if self._building is None else [self.graph, self._building]
+
+    def follow(self, follower_id: str, following_id: str, following: bool) -> None:
+        for graph in self._graphs():
+            if following:
+                graph.add(follower_id, following_id)
+            else:
+                graph.remove(follower_id, following_id)
+
+    def post(self, author_id: str, category_id: Optional[str], delta: int) -> None:
+        for graph in self._graphs():
+            graph.add_post(author_id, category_id, delta)
+
+    async def rebuild(self) -> None:
+        """
+        Build a fresh graph from every follow and post and swap it in.
+        """
+        self._building = building = FollowGraph()
+        # follows and posts made from here on reach it live. A follow loaded
+        # after its live update is skipped by `add`; an unfollow of a row not
+        # loaded yet, or a post loaded after it was counted live, is off
+        # until the next rebuild
+        try:
+            after = None
+            while True:
+                edges = await repos.follows.edges_page(after, RECOMMEND_LOAD_BATCH)
+                for follower_id, following_id in edges:
+                    building.add(follower_id, following_id)
+                if len(edges) < RECOMMEND_LOAD_BATCH:
+                    break
+                after = edges[-1]
+                await asyncio.sleep(0)
+
+            cursor = None
+            while True:
+                rows, cursor = await repos.posts.list_page(
+                    ("id", "author_id", "category_id", "created_at"), RECOMMEND_LOAD_BATCH, cursor)
+                for i, row in enumerate(rows, 1):
+                    building.add_post(row["author_id"], row.get("category_id"))
+                    if i % LOAD_YIELD_EVERY == 0:
+                        await asyncio.sleep(0)
+                if not cursor:
+                    break
+            self.graph = building
+        finally:
+            self._building = None
+        self.ready = True
+        logger.info("follow graph built: %d users, %d follows", building.users, len(building))
+
+    async def refresh_forever(self) -> None:
+        """
+        Build the graph, then rebuild it at a fixed interval.
+        """
+        while True:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.warning("follow graph build failed: %s", e)
+                if not self.ready:
+                    # retry the first build sooner than a refresh
+                    await asyncio.sleep(5)
+                    continue
+            if RECOMMEND_REFRESH_INTERVAL <= 0:
+                return
+            await asyncio.sleep(RECOMMEND_REFRESH_INTERVAL)
+
+
+follow_suggestions = FollowSuggestions()
+
+
+async def category_affinity(user_id: str) -> Dict[str, int]:
+    """
+    How often each category shows up among the user's latest likes.
+    """
+    affinity = affinity_cache.get(user_id)
+    if affinity is None:
+        affinity = dict(await repos.likes.liked_categories(user_id, RECOMMEND_LIKES_SAMPLE))
+        affinity_cache.set(user_id, affinity)
+    return affinity
+
+
+def follow_changed(follower_id: str, following_id: str, following: bool) -> None:
+    follow_suggestions.follow(follower_id, following_id, following)
+
+
+def post_created(post: dict) -> None:
+    follow_suggestions.post(post["author_id"], post.get("category_id"), 1)
+
+
+def post_deleted(post: dict) -> None:
+    follow_suggestions.post(post["author_id"], post.get("category_id"), -1)
@@ -0,0 +1,100 @@
+import hashlib
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional, Tuple
+
+import orjson
+from fastapi import Request, Response
+
+from app.cache import make_cache
+from app.config import ETAG_CACHE_MAX_ENTRIES, ETAG_CACHE_TTL
+
+
+# conditional GETs: strong ETags plus per-route Cache-Control policies
+
+# public lists change with every like or comment: always revalidate
+FEED_CACHE_CONTROL = "public, no-cache"
+POST_CACHE_CONTROL = "public, no-cache"
+PROFILE_CACHE_CONTROL = "public, max-age=60, must-revalidate"
+CATEGORIES_CACHE_CONTROL = "public, max-age=300, must-revalidate"
+# per-user responses must never land in a shared cache
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Optional[Request], etag: str) -> bool:
+    if request is None:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # weak comparison, as If-None-Match calls for
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def json_response(body: bytes, etag: str, cache_control: str) -> Response:
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+
+# the ETag of the last body built for each response that is not cached
+# whole (single posts, profiles, timelines), so a revalidation that still
+# matches is answered before the route queries or serializes anything.
+# Dropped by tag on the writes that change the response; the TTL bounds
+# what other workers' writes can leave stale with CACHE_BACKEND=memory
+etag_cache = make_cache("etags", max_entries=ETAG_CACHE_MAX_ENTRIES, ttl=ETAG_CACHE_TTL)
+
+
+def post_tag(post_id: str) -> str:
+    return f"post:{post_id}"
+
+
+def profile_tag(user_id: str) -> str:
+    return f"profile:{user_id}"
+
+
+def timeline_tag(user_id: str) -> str:
+    return f"timeline:{user_id}"
+
+
+def invalidate_etags(*tags: str) -> None:
+    etag_cache.invalidate_tags(*tags)
+
+
+async def conditional_json(
+    request: Request,
+    key: Hashable,
+    build: Callable[[], Awaitable[Tuple[Any, Iterable[str]]]],
+    cache_control: str,
+    ttl: Optional[float] = None,
+) -> Response:
+    """
+    JSON response tagged with a hash of its body, or a bodiless 304 when
+    the client already holds that version. `build` returns the payload and
+    the tags its ETag is kept under; it only runs when the kept ETag for
+    `key` is missing or does not match.
+    """
+    etag = etag_cache.get(key)
+    if etag is not None and etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+
+    # a body built while any of its tags was invalidated is sent, not kept
+    stamp = etag_cache.stamp()
+    payload, tags = await build()
+    body = orjson.dumps(payload)
+    etag = etag_for(body)
+    etag_cache.set(key, etag, ttl=ttl, tags=tags, stamp=stamp)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    return json_response(body, etag, cache_control)
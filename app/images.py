@@ -0,0 +1,207 @@
+import asyncio
+import io
+import logging
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image, ImageOps
+
+from app.background import spawn
+from app.config import (
+    db_admin,
+    IMAGE_BUCKET,
+    IMAGE_STAGING_FOLDER,
+    IMAGE_MAX_BYTES,
+    IMAGE_CHUNK_SIZE,
+    IMAGE_VARIANTS,
+    IMAGE_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+# (magic prefix, content type, extension); webp is RIFF....WEBP, checked apart
+SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg", ".jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"GIF87a", "image/gif", ".gif"),
+    (b"GIF89a", "image/gif", ".gif"),
+]
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def sniff(head: bytes) -> Optional[Tuple[str, str]]:
+    """
+    Content type and extension from the first bytes of a file, ignoring
+    whatever the client claimed.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    for magic, content_type, ext in SIGNATURES:
+        if head.startswith(magic):
+            return content_type, ext
+    return None
+
+
+async def read_limited(file: UploadFile, max_bytes: int = IMAGE_MAX_BYTES) -> bytes:
+    """
+    The bytes of an upload, refused with a 413 past `max_bytes`. This only
+    caps the image: the request as a whole was already received (and capped
+    by BodySizeLimitMiddleware) before the handler runs.
+    """
+    chunks = []
+    total = 0
+    while True:
+        chunk = await file.read(IMAGE_CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise HTTPException(
+                status_code=413, detail=f"Image larger than {max_bytes // (1024 * 1024)} MB")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def render_variants(data: bytes, widths: Dict[str, int]) -> Dict[str, bytes]:
+    """
+    Downscaled WebP copies of an image, one per entry of `widths`. Runs in
+    the worker processes, keep it free of app state.
+    """
+    out = {}
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+
+        for name, width in widths.items():
+            variant = img
+            if img.width > width:
+                height = max(1, round(img.height * width / img.width))
+                variant = img.resize((width, height), Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            variant.save(buffer, "WEBP", quality=80, method=4)
+            out[name] = buffer.getvalue()
+    return out
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def variant_path(path: str, name: str) -> str:
+    stem = path.rsplit(".", 1)[0]
+    return f"{stem}_{name}.webp"
+
+
+async def _upload(path: str, data: bytes, content_type: str) -> None:
+    await db_admin.storage.from_(IMAGE_BUCKET).upload(
+        path=path,
+        file=data,
+        file_options={"content-type": content_type},
+    )
+
+
+async def _store_variants(path: str, data: bytes) -> None:
+    loop = asyncio.get_running_loop()
+    try:
+        variants = await loop.run_in_executor(
+            _get_pool(), render_variants, data, IMAGE_VARIANTS)
+    except Exception as e:
+        logger.warning("could not render variants for %s: %s", path, e)
+        return
+
+    await asyncio.gather(*(
+        _upload(variant_path(path, name), body, "image/webp")
+        for name, body in variants.items()
+    ))
+
+
+async def public_url(path: str) -> str:
+    return await db_admin.storage.from_(IMAGE_BUCKET).get_public_url(path)
+
+
+async def _read_image(file: UploadFile) -> Tuple[bytes, str, str]:
+    data = await read_limited(file)
+    sniffed = sniff(data[:16])
+    if sniffed is None:
+        raise HTTPException(
+            status_code=415, detail="Unsupported image format. Use JPEG, PNG, WebP or GIF.")
+    content_type, ext = sniffed
+    return data, content_type, ext
+
+
+async def describe_image(path: str) -> dict:
+    """
+    Public URLs of a stored image and its variants (computed, no request).
+    """
+    urls = await asyncio.gather(
+        public_url(path),
+        *(public_url(variant_path(path, name)) for name in IMAGE_VARIANTS),
+    )
+    return {
+        "url": urls[0],
+        "path": path,
+        "variants": dict(zip(IMAGE_VARIANTS, urls[1:])),
+    }
+
+
+async def store_image(file: UploadFile, folder: str, user_id: str) -> dict:
+    """
+    Validate and store an uploaded image, then render its variants in the
+    background. Returns the original's URL and the variant URLs, which
+    resolve once the background rendering has finished.
+    """
+    data, content_type, ext = await _read_image(file)
+
+    path = f"{folder}/{user_id}/{uuid.uuid4()}{ext}"
+    await _upload(path, data, content_type)
+    spawn(_store_variants(path, data))
+    return await describe_image(path)
+
+
+async def stage_image(file: UploadFile) -> dict:
+    """
+    Store an image under a staging key before its owner is known (signup).
+    Finish with `promote_image`, or `discard_images` on failure.
+    """
+    data, content_type, ext = await _read_image(file)
+
+    path = f"{IMAGE_STAGING_FOLDER}/{uuid.uuid4()}{ext}"
+    await _upload(path, data, content_type)
+    return {"path": path, "data": data}
+
+
+def promoted_path(staged: dict, folder: str, user_id: str) -> str:
+    name = staged["path"].rsplit("/", 1)[-1]
+    return f"{folder}/{user_id}/{name}"
+
+
+async def promote_image(staged: dict, folder: str, user_id: str) -> dict:
+    """
+    Move a staged image to its final key and start rendering its variants.
+    """
+    path = promoted_path(staged, folder, user_id)
+    await db_admin.storage.from_(IMAGE_BUCKET).move(staged["path"], path)
+    spawn(_store_variants(path, staged["data"]))
+    return await describe_image(path)
+
+
+async def discard_images(*paths: str) -> None:
+    try:
+        await db_admin.storage.from_(IMAGE_BUCKET).remove(list(paths))
+    except Exception as e:
+        logger.warning("could not remove images %s: %s", paths, e)
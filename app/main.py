@@ -1,6 +1,17 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
-from app.config import db
+from app.body_limit import BodySizeLimitMiddleware
+from app.config import close_clients, COUNTER_RECONCILE_INTERVAL, MAX_REQUEST_BYTES, UPSTREAM_CALL_WARN_THRESHOLD, WRITE_BEHIND
+from app.counters import reconcile_forever
+from app.follow_graph import follow_suggestions
+from app.images import shutdown_pool
+from app.metrics import MetricsMiddleware
+from app.repositories import repos
+from app.search import post_search
+from app.trending import post_trending
+from app.write_behind import write_behind
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.routes import auth
@@ -12,8 +23,40 @@ from app.routes import bookmarks
 from app.routes import categories
 from app.routes import profiles
 from app.routes import signs
+from app.routes import viewer
+from app.routes import timeline
+from app.routes import metrics
+from app.routes import events
 
-app = FastAPI(title="Blogging API", default_response_class=ORJSONResponse)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reconciler = None
+    if COUNTER_RECONCILE_INTERVAL > 0:
+        reconciler = asyncio.create_task(reconcile_forever())
+
+    search_loader = asyncio.create_task(post_search.refresh_forever())
+    trending_loader = asyncio.create_task(post_trending.refresh_forever())
+    graph_loader = asyncio.create_task(follow_suggestions.refresh_forever())
+
+    if WRITE_BEHIND:
+        # replays toggles journaled by workers that died before flushing
+        write_behind.start()
+
+    yield
+
+    search_loader.cancel()
+    trending_loader.cancel()
+    graph_loader.cancel()
+    await write_behind.stop()
+    if reconciler:
+        reconciler.cancel()
+    shutdown_pool()
+    await close_clients()
+    await repos.close()
+
+
+app = FastAPI(title="Blogging API", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",  # Vite
@@ -22,6 +65,8 @@ origins = [
     "https://your-frontend-domain.com",  # production domain
 ]
 
+# innermost, so its 413s still get CORS headers
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "https://wblog-fe.vercel.app", "https://wblog-5kd4xpgt5-vishwagovula07-gmailcoms-projects.vercel.app"],  # list of allowed origins
@@ -29,6 +74,7 @@ app.add_middleware(
     allow_methods=["*"],    # or specify ["GET", "POST"]
     allow_headers=["*"],    # or specify ["Authorization", "Content-Type"]
 )
+app.add_middleware(MetricsMiddleware, upstream_call_threshold=UPSTREAM_CALL_WARN_THRESHOLD)
 
 app.include_router(auth.router)
 app.include_router(posts.router)
@@ -39,7 +85,11 @@ app.include_router(bookmarks.router)
 app.include_router(categories.router)
 app.include_router(profiles.router)
 app.include_router(signs.router)
+app.include_router(viewer.router)
+app.include_router(timeline.router)
+app.include_router(metrics.router)
+app.include_router(events.router)
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Blog API is running!"}
@@ -0,0 +1,173 @@
+import logging
+import time
+from contextvars import Context, ContextVar, copy_context
+from typing import Dict, Optional
+
+import httpx
+from prometheus_client import Histogram, generate_latest
+
+logger = logging.getLogger(__name__)
+
+# Per-request upstream accounting.
+#
+# Every Supabase sub-client sends through `InstrumentedTransport`, which adds
+# each call to the stats of the request being served (a contextvar set by
+# `MetricsMiddleware`). When the request ends the totals go to Prometheus,
+# labelled by route template, so N+1 patterns show up as call counts.
+
+SERVICES = {
+    "/rest/": "postgrest",
+    "/auth/": "auth",
+    "/storage/": "storage",
+}
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Total request latency",
+    ["method", "route", "status"],
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Response body size",
+    ["method", "route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+UPSTREAM_CALLS = Histogram(
+    "upstream_calls_per_request",
+    "Upstream Supabase calls made while serving one request",
+    ["route", "service"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+UPSTREAM_TIME = Histogram(
+    "upstream_seconds_per_request",
+    "Time spent waiting on upstream Supabase calls during one request",
+    ["route", "service"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_call_duration_seconds",
+    "Latency of single upstream Supabase calls",
+    ["service"],
+)
+
+
+class RequestStats:
+    __slots__ = ("calls", "seconds")
+
+    def __init__(self):
+        self.calls: Dict[str, int] = {service: 0 for service in SERVICES.values()}
+        self.seconds: Dict[str, float] = {service: 0.0 for service in SERVICES.values()}
+
+    def record(self, service: str, seconds: float) -> None:
+        self.calls[service] = self.calls.get(service, 0) + 1
+        self.seconds[service] = self.seconds.get(service, 0.0) + seconds
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("upstream_stats", default=None)
+
+
+def detached_context() -> Context:
+    """
+    A copy of the current context outside any request's stats, for work
+    that outlives the request (app.background.spawn).
+    """
+    context = copy_context()
+    context.run(_current.set, None)
+    return context
+
+
+def service_of(url: httpx.URL) -> str:
+    for prefix, service in SERVICES.items():
+        if url.path.startswith(prefix):
+            return service
+    return "other"
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the shared upstream transport and times every call.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        service = service_of(request.url)
+        start = time.perf_counter()
+        try:
+            return await self.transport.handle_async_request(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            UPSTREAM_LATENCY.labels(service).observe(elapsed)
+            stats = _current.get()
+            if stats is not None:
+                stats.record(service, elapsed)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def route_of(scope) -> str:
+    # the matched route's template, so /posts/{post_id} is one series
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, response size and upstream calls
+    per route; requests over `upstream_call_threshold` calls are logged.
+    """
+
+    def __init__(self, app, upstream_call_threshold: int = 0):
+        self.app = app
+        self.upstream_call_threshold = upstream_call_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self._observe(scope, stats, status, size, time.perf_counter() - start)
+
+    def _observe(self, scope, stats: RequestStats, status: int, size: int, elapsed: float) -> None:
+        method = scope["method"]
+        route = route_of(scope)
+
+        REQUEST_LATENCY.labels(method, route, str(status)).observe(elapsed)
+        RESPONSE_SIZE.labels(method, route).observe(size)
+        for service, calls in stats.calls.items():
+            UPSTREAM_CALLS.labels(route, service).observe(calls)
+            UPSTREAM_TIME.labels(route, service).observe(stats.seconds[service])
+
+        if self.upstream_call_threshold and stats.total_calls > self.upstream_call_threshold:
+            logger.warning(
+                "%s %s made %d upstream calls %s in %.3fs",
+                method, route, stats.total_calls, stats.calls, elapsed,
+            )
+
+
+def render() -> bytes:
+    return generate_latest()
+
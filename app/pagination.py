@@ -0,0 +1,64 @@
+import base64
+from typing import List, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException
+
+from app.config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+
+# keyset (cursor) pagination over (created_at, <tie column>), newest first
+
+
+def page_size(limit: Optional[int]) -> int:
+    """
+    Clamp a requested page size to the server-side maximum.
+    """
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(created_at: str, key: str) -> str:
+    raw = orjson.dumps([created_at, key])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, key = orjson.loads(base64.urlsafe_b64decode(padded))
+        return str(created_at), str(key)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query, limit: int, cursor: Optional[str] = None, key: str = "id"):
+    """
+    Order a PostgREST query newest-first and seek past `cursor`.
+
+    One extra row is requested so `next_page` can tell whether another page
+    exists without a count query.
+    """
+    query = query.order("created_at", desc=True).order(key, desc=True)
+
+    if cursor:
+        created_at, last_key = decode_cursor(cursor)
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",{key}.lt."{last_key}")'
+        )
+
+    return query.limit(limit + 1)
+
+
+def next_page(rows: List[dict], limit: int, key: str = "id") -> Tuple[List[dict], Optional[str]]:
+    """
+    Trim the look-ahead row and build the cursor for the following page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last["created_at"], last[key])
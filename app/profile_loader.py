@@ -0,0 +1,129 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.cache import make_cache
+from app.config import PROFILE_CACHE_TTL, PROFILE_CACHE_MAX_ENTRIES, PROFILE_SUMMARY_CACHE_TTL
+from app.http_cache import invalidate_etags, profile_tag
+from app.repositories import repos
+
+# normalized list responses: `?shape=normalized` drops the profile embedded
+# in every row and returns each distinct profile once, in a top-level
+# `profiles` map keyed by user id
+
+SHAPES = ("embedded", "normalized")
+
+# id -> {"username", "image_url"} (None for an id with no profile); short
+# lived, since profile edits on other workers only show up after expiry
+profile_cache = make_cache("profiles", max_entries=PROFILE_CACHE_MAX_ENTRIES, ttl=PROFILE_CACHE_TTL)
+
+# public part of GET /profiles/{id}/summary, tagged per profile so a write
+# to the profile or its posts drops every variant of it
+summary_cache = make_cache("summaries", max_entries=PROFILE_CACHE_MAX_ENTRIES, ttl=PROFILE_SUMMARY_CACHE_TTL)
+
+_UNKNOWN = object()
+
+
+def normalized(shape: Optional[str]) -> bool:
+    if shape is None or shape == "embedded":
+        return False
+    if shape == "normalized":
+        return True
+    raise HTTPException(
+        status_code=400, detail=f"Unknown shape: {shape}, use {' or '.join(SHAPES)}")
+
+
+def without_profiles(names: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Post field names minus the profile embed, keeping `author_id` so the
+    map can be joined back.
+    """
+    names = tuple(n for n in names if n != "profiles")
+    if "*" in names or "author_id" in names:
+        return names
+    return names + ("author_id",)
+
+
+class ProfileLoader:
+    """
+    Request-scoped batch loader: every id asked for during one request is
+    fetched at most once, in as few queries as there are `load` calls that
+    miss the shared cache.
+    """
+
+    def __init__(self):
+        self._loaded: Dict[str, Optional[dict]] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def load(self, user_ids: Iterable[str]) -> Dict[str, dict]:
+        """
+        The profiles among `user_ids` that exist, by id.
+        """
+        wanted = {uid for uid in user_ids if uid}
+        missing: List[str] = []
+        waiting: List[asyncio.Future] = []
+
+        for uid in wanted:
+            if uid in self._pending:
+                waiting.append(self._pending[uid])
+                continue
+            if uid in self._loaded:
+                continue
+            cached = profile_cache.get(uid, _UNKNOWN)
+            if cached is _UNKNOWN:
+                missing.append(uid)
+            else:
+                self._loaded[uid] = cached
+
+        if missing:
+            batch = asyncio.ensure_future(self._fetch(missing))
+            for uid in missing:
+                self._pending[uid] = batch
+            waiting.append(batch)
+
+        if waiting:
+            await asyncio.gather(*set(waiting))
+
+        return {uid: self._loaded[uid] for uid in wanted if self._loaded.get(uid) is not None}
+
+    async def _fetch(self, user_ids: List[str]) -> None:
+        try:
+            rows = await repos.profiles.get_many(user_ids)
+            found = {row["id"]: {"username": row["username"], "image_url": row["image_url"]} for row in rows}
+            for uid in user_ids:
+                profile = found.get(uid)
+                self._loaded[uid] = profile
+                profile_cache.set(uid, profile)
+        finally:
+            for uid in user_ids:
+                self._pending.pop(uid, None)
+
+
+def profile_loader() -> ProfileLoader:
+    """
+    Dependency: a fresh loader per request.
+    """
+    return ProfileLoader()
+
+
+def summary_tag(user_id: str) -> str:
+    return f"summary:{user_id}"
+
+
+def forget_profile(user_id: str) -> None:
+    profile_cache.delete(user_id)
+    invalidate_etags(profile_tag(user_id))
+    forget_summary(user_id)
+
+
+def forget_summary(user_id: str) -> None:
+    summary_cache.invalidate_tags(summary_tag(user_id))
+    invalidate_etags(summary_tag(user_id))
+
+
+async def profile_map(loader: ProfileLoader, rows: Iterable[dict], key: str = "author_id") -> Dict[str, dict]:
+    """
+    Profiles of the users `rows` point at through `key`.
+    """
+    return await loader.load(row.get(key) for row in rows)
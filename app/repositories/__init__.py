@@ -0,0 +1,16 @@
+from app.config import DATA_BACKEND, SQLITE_PATH
+from app.repositories.base import Repositories
+
+
+def _build() -> Repositories:
+    if DATA_BACKEND == "sqlite":
+        from app.repositories.sqlite import SqliteRepositories
+        return SqliteRepositories(SQLITE_PATH)
+    if DATA_BACKEND != "supabase":
+        raise RuntimeError(f"Unknown DATA_BACKEND {DATA_BACKEND!r}, use 'supabase' or 'sqlite'")
+    from app.repositories.supabase import SupabaseRepositories
+    return SupabaseRepositories()
+
+
+# the data backend every router and background job reads and writes through
+repos = _build()
@@ -0,0 +1,324 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from app.pagination import next_page
+
+# A page of rows, newest first, and the cursor of the next one (see
+# app/pagination.py). Every list method takes `limit` already clamped.
+Page = Tuple[List[dict], Optional[str]]
+
+# (post_id, user_id) for likes and bookmarks, (follower_id, following_id)
+# for follows
+Pair = Tuple[str, str]
+
+POST_COUNTERS = ("likes_count", "comments_count", "bookmarks_count")
+PROFILE_COUNTERS = ("followers_count", "following_count", "posts_count")
+
+
+def missing_or_forbidden(exists: bool, missing: str, detail: str):
+    """
+    A conditional (owner-filtered) write matched nothing: a 404 when the
+    row is gone, a 403 when someone else owns it.
+    """
+    if not exists:
+        raise HTTPException(status_code=404, detail=missing)
+    raise HTTPException(status_code=403, detail=detail)
+
+
+class PostRepository(ABC):
+    @abstractmethod
+    async def list_rows(
+        self,
+        fields: Tuple[str, ...],
+        limit: int,
+        cursor: Optional[str] = None,
+        author_id: Optional[str] = None,
+        category_id: Optional[str] = None,
+        author_ids: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """
+        Up to `limit + 1` posts newest first, projected to `fields` (see
+        app/fields.py); the extra row tells `next_page` another page exists.
+        """
+
+    async def list_page(self, fields: Tuple[str, ...], limit: int, cursor: Optional[str] = None, **filters) -> Page:
+        return next_page(await self.list_rows(fields, limit, cursor, **filters), limit)
+
+    @abstractmethod
+    async def get(self, post_id: str, fields: Tuple[str, ...]) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def by_ids(self, post_ids: List[str], fields: Tuple[str, ...]) -> List[dict]:
+        """
+        The posts among `post_ids` that exist, projected to `fields`, in
+        no particular order.
+        """
+
+    @abstractmethod
+    async def exists(self, post_id: str) -> bool: ...
+
+    @abstractmethod
+    async def create(self, data: dict) -> dict: ...
+
+    @abstractmethod
+    async def update(
+            self, post_id: str, author_id: str, data: dict,
+            previous: Tuple[str, ...] = ()) -> Tuple[dict, dict]:
+        """
+        Update a post owned by `author_id`; 404/403 when that matches nothing.
+        Returns the updated row and the values the `previous` columns had
+        before the update.
+        """
+
+    @abstractmethod
+    async def delete(self, post_id: str, author_id: str) -> dict:
+        """
+        Delete a post owned by `author_id`, returning the deleted row.
+        """
+
+    @abstractmethod
+    async def authors(self, post_ids: List[str]) -> Dict[str, str]:
+        """
+        post id -> author id for the posts that exist.
+        """
+
+    @abstractmethod
+    async def counter(self, post_id: str, column: str) -> int: ...
+
+    @abstractmethod
+    async def recent_ids(self, author_id: str, limit: int) -> List[dict]:
+        """
+        `id` and `created_at` of an author's newest posts.
+        """
+
+    @abstractmethod
+    async def adjust_counter(self, post_id: str, column: str, delta: int) -> None: ...
+
+
+class CommentRepository(ABC):
+    @abstractmethod
+    async def list_page(self, post_id: str, limit: int, cursor: Optional[str] = None, embed_profiles: bool = True) -> Page:
+        """
+        Comments with their author's profile embedded, unless the caller
+        resolves profiles itself.
+        """
+
+    @abstractmethod
+    async def create(self, post_id: str, author_id: str, content: str) -> List[dict]: ...
+
+    @abstractmethod
+    async def update(self, comment_id: str, author_id: str, content: str) -> List[dict]: ...
+
+    @abstractmethod
+    async def delete(self, comment_id: str, author_id: str) -> dict: ...
+
+    @abstractmethod
+    async def created_page(self, since: str, until: str, limit: int, cursor: Optional[str] = None) -> Page:
+        """
+        Rows of `id`, `post_id` and `created_at` for comments created in
+        [since, until), newest first.
+        """
+
+
+class LikeRepository(ABC):
+    @abstractmethod
+    async def list_page(self, post_id: str, limit: int, cursor: Optional[str] = None) -> Page: ...
+
+    @abstractmethod
+    async def created_page(self, since: str, until: str, limit: int, cursor: Optional[str] = None) -> Page: ...
+
+    @abstractmethod
+    async def set(self, post_id: str, user_id: str, liked: bool) -> bool:
+        """
+        Insert or delete the like; True when a row actually changed.
+        """
+
+    @abstractmethod
+    async def set_many(self, adds: List[Pair], removes: List[Pair]) -> Tuple[List[Pair], List[Pair]]:
+        """
+        `set` for many (post_id, user_id) pairs in one statement each way;
+        returns the pairs actually inserted and deleted.
+        """
+
+    @abstractmethod
+    async def exists(self, post_id: str, user_id: str) -> bool: ...
+
+    @abstractmethod
+    async def existing(self, pairs: List[Pair]) -> Set[Pair]:
+        """
+        Which of the (post_id, user_id) pairs have a row.
+        """
+
+    @abstractmethod
+    async def among(self, user_id: str, post_ids: List[str]) -> Set[str]:
+        """
+        Which of `post_ids` the user has liked.
+        """
+
+    @abstractmethod
+    async def liked_categories(self, user_id: str, limit: int) -> Dict[str, int]:
+        """
+        Category ids of the user's `limit` latest likes, with how many.
+        """
+
+
+class BookmarkRepository(ABC):
+    @abstractmethod
+    async def list_for_user(self, user_id: str, fields: Tuple[str, ...]) -> List[dict]: ...
+
+    @abstractmethod
+    async def set(self, post_id: str, user_id: str, bookmarked: bool) -> bool: ...
+
+    @abstractmethod
+    async def set_many(self, adds: List[Pair], removes: List[Pair]) -> Tuple[List[Pair], List[Pair]]: ...
+
+    @abstractmethod
+    async def exists(self, post_id: str, user_id: str) -> bool: ...
+
+    @abstractmethod
+    async def existing(self, pairs: List[Pair]) -> Set[Pair]: ...
+
+    @abstractmethod
+    async def among(self, user_id: str, post_ids: List[str]) -> Set[str]: ...
+
+
+class FollowRepository(ABC):
+    @abstractmethod
+    async def set(self, follower_id: str, following_id: str, following: bool) -> bool: ...
+
+    @abstractmethod
+    async def set_many(self, adds: List[Pair], removes: List[Pair]) -> Tuple[List[Pair], List[Pair]]:
+        """
+        Bulk `set` of (follower_id, following_id) pairs.
+        """
+
+    @abstractmethod
+    async def exists(self, follower_id: str, following_id: str) -> bool: ...
+
+    @abstractmethod
+    async def existing(self, pairs: List[Pair]) -> Set[Pair]: ...
+
+    @abstractmethod
+    async def followers_page(
+            self, user_id: str, limit: int, cursor: Optional[str] = None, embed_profiles: bool = True) -> Page:
+        """
+        Rows of `follower_id`, `created_at` and (when embedded) the
+        follower's profile.
+        """
+
+    @abstractmethod
+    async def following_page(
+            self, user_id: str, limit: int, cursor: Optional[str] = None, embed_profiles: bool = True) -> Page: ...
+
+    @abstractmethod
+    async def among(self, follower_id: str, user_ids: Iterable[str]) -> Set[str]:
+        """
+        Which of `user_ids` the follower follows.
+        """
+
+    @abstractmethod
+    async def follower_ids(self, user_id: str, after: Optional[str], limit: int) -> List[str]:
+        """
+        Follower ids in id order, past `after`, for batched fan-out.
+        """
+
+    @abstractmethod
+    async def popular_following(self, follower_id: str, min_followers: int) -> List[str]:
+        """
+        Followed users with more than `min_followers` followers.
+        """
+
+    @abstractmethod
+    async def edges_page(self, after: Optional[Pair], limit: int) -> List[Pair]:
+        """
+        Up to `limit` (follower_id, following_id) pairs in that order, past
+        `after`, for loading the whole graph.
+        """
+
+
+class CategoryRepository(ABC):
+    @abstractmethod
+    async def list(self) -> List[dict]: ...
+
+    @abstractmethod
+    async def create(self, name: str) -> List[dict]: ...
+
+    @abstractmethod
+    async def update(self, category_id: str, name: str) -> List[dict]:
+        """
+        Empty when the category does not exist.
+        """
+
+    @abstractmethod
+    async def delete(self, category_id: str) -> List[dict]: ...
+
+
+class ProfileRepository(ABC):
+    @abstractmethod
+    async def get(self, user_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def get_many(self, user_ids: List[str]) -> List[dict]:
+        """
+        `id`, `username` and `image_url` of the profiles among `user_ids`.
+        """
+
+    @abstractmethod
+    async def username_taken(self, username: str) -> bool: ...
+
+    @abstractmethod
+    async def create(self, data: dict) -> dict: ...
+
+    @abstractmethod
+    async def update(self, user_id: str, data: dict) -> List[dict]: ...
+
+    @abstractmethod
+    async def counter(self, user_id: str, column: str) -> int: ...
+
+    @abstractmethod
+    async def adjust_counter(self, user_id: str, column: str, delta: int) -> None: ...
+
+
+class TimelineRepository(ABC):
+    @abstractmethod
+    async def insert(self, entries: List[dict]) -> None:
+        """
+        Add (user_id, post_id, author_id, created_at) entries, skipping
+        ones already present.
+        """
+
+    @abstractmethod
+    async def remove_author(self, user_id: str, author_id: str) -> None: ...
+
+    @abstractmethod
+    async def rows(self, user_id: str, fields: Tuple[str, ...], limit: int, cursor: Optional[str] = None) -> List[dict]:
+        """
+        Up to `limit + 1` timeline posts projected to `fields`, each
+        carrying its entry's `created_at`.
+        """
+
+
+class Repositories(ABC):
+    """
+    One backend's repositories, shared by every router.
+    """
+
+    posts: PostRepository
+    comments: CommentRepository
+    likes: LikeRepository
+    bookmarks: BookmarkRepository
+    follows: FollowRepository
+    categories: CategoryRepository
+    profiles: ProfileRepository
+    timelines: TimelineRepository
+
+    @abstractmethod
+    async def reconcile_counters(self) -> None:
+        """
+        Recompute every denormalized counter from the source tables.
+        """
+
+    async def close(self) -> None:
+        pass
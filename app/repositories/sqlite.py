@@ -0,0 +1,696 @@
+import asyncio
+import json
+import sqlite3
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from app.pagination import decode_cursor, next_page
+from app.repositories.base import (
+    POST_COUNTERS,
+    PROFILE_COUNTERS,
+    BookmarkRepository,
+    CategoryRepository,
+    CommentRepository,
+    FollowRepository,
+    LikeRepository,
+    PostRepository,
+    ProfileRepository,
+    Repositories,
+    TimelineRepository,
+    missing_or_forbidden,
+)
+
+# Embedded SQLite backend for single-node deployments: same rows and shapes
+# as the Supabase backend, no network hop. Request queries are indexed point
+# and short range lookups, so they run inline on the event loop over one
+# shared connection. Bulk scans (index rebuild loads, counter recounts) take
+# long enough to stall every request, so they go to a second, read-only
+# connection owned by one worker thread; WAL lets it read while the main
+# connection writes.
+
+SCHEMA = """
+create table if not exists categories (
+    id text primary key,
+    name text not null,
+    created_at text not null
+);
+
+create table if not exists profiles (
+    id text primary key,
+    username text unique,
+    bio text,
+    image_url text,
+    image_variants text,
+    gender text,
+    followers_count integer not null default 0,
+    following_count integer not null default 0,
+    posts_count integer not null default 0,
+    created_at text not null
+);
+
+create table if not exists posts (
+    id text primary key,
+    title text not null,
+    content text,
+    excerpt text,
+    reading_time integer not null default 0,
+    cover_image_url text,
+    cover_image_variants text,
+    author_id text not null references profiles (id) on delete cascade,
+    category_id text references categories (id) on delete set null,
+    likes_count integer not null default 0,
+    comments_count integer not null default 0,
+    bookmarks_count integer not null default 0,
+    created_at text not null
+);
+create index if not exists posts_created_idx on posts (created_at desc, id desc);
+create index if not exists posts_author_created_idx on posts (author_id, created_at desc, id desc);
+create index if not exists posts_category_created_idx on posts (category_id, created_at desc, id desc);
+
+create table if not exists comments (
+    id text primary key,
+    post_id text not null references posts (id) on delete cascade,
+    author_id text not null references profiles (id) on delete cascade,
+    content text not null,
+    created_at text not null
+);
+create index if not exists comments_post_created_idx on comments (post_id, created_at desc, id desc);
+
+create table if not exists likes (
+    id text primary key,
+    post_id text not null references posts (id) on delete cascade,
+    author_id text not null references profiles (id) on delete cascade,
+    created_at text not null,
+    unique (post_id, author_id)
+);
+create index if not exists likes_post_created_idx on likes (post_id, created_at desc, id desc);
+create index if not exists likes_author_idx on likes (author_id, post_id);
+
+create table if not exists bookmarks (
+    id text primary key,
+    post_id text not null references posts (id) on delete cascade,
+    user_id text not null references profiles (id) on delete cascade,
+    created_at text not null,
+    unique (post_id, user_id)
+);
+create index if not exists bookmarks_user_idx on bookmarks (user_id, post_id);
+
+create table if not exists follows (
+    follower_id text not null references profiles (id) on delete cascade,
+    following_id text not null references profiles (id) on delete cascade,
+    created_at text not null,
+    primary key (follower_id, following_id)
+);
+create index if not exists follows_following_created_idx on follows (following_id, created_at desc, follower_id desc);
+create index if not exists follows_follower_created_idx on follows (follower_id, created_at desc, following_id desc);
+
+create table if not exists timelines (
+    user_id text not null,
+    post_id text not null references posts (id) on delete cascade,
+    author_id text not null,
+    created_at text not null,
+    primary key (user_id, post_id)
+);
+create index if not exists timelines_user_created_idx on timelines (user_id, created_at desc, post_id desc);
+create index if not exists timelines_user_author_idx on timelines (user_id, author_id);
+"""
+
+COLUMNS = {
+    "categories": {"id", "name", "created_at"},
+    "profiles": {
+        "id", "username", "bio", "image_url", "image_variants", "gender",
+        "followers_count", "following_count", "posts_count", "created_at",
+    },
+    "posts": {
+        "id", "title", "content", "excerpt", "reading_time",
+        "cover_image_url", "cover_image_variants", "author_id", "category_id",
+        "likes_count", "comments_count", "bookmarks_count", "created_at",
+    },
+    "comments": {"id", "post_id", "author_id", "content", "created_at"},
+}
+JSON_COLUMNS = {"image_variants", "cover_image_variants"}
+
+# denormalized counters and what they count, per row `t`
+RECOUNTS = {
+    "posts": {
+        "likes_count": "select count(*) from likes where post_id = t.id",
+        "comments_count": "select count(*) from comments where post_id = t.id",
+        "bookmarks_count": "select count(*) from bookmarks where post_id = t.id",
+    },
+    "profiles": {
+        "followers_count": "select count(*) from follows where following_id = t.id",
+        "following_count": "select count(*) from follows where follower_id = t.id",
+        "posts_count": "select count(*) from posts where author_id = t.id",
+    },
+}
+
+# post embeds: (join, columns) in the shape PostgREST returns them
+EMBEDS = {
+    "profiles": (
+        "left join profiles pr on pr.id = p.author_id",
+        ("id", "username", "image_url"),
+    ),
+    "categories": (
+        "left join categories c on c.id = p.category_id",
+        ("id", "name"),
+    ),
+}
+EMBED_ALIAS = {"profiles": "pr", "categories": "c"}
+
+
+def now() -> str:
+    # fixed-width so text order is time order
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+
+def new_id() -> str:
+    return str(uuid.uuid4())
+
+
+def _encode(table: str, data: dict) -> dict:
+    unknown = set(data) - COLUMNS[table]
+    if unknown:
+        raise ValueError(f"unknown {table} columns: {', '.join(sorted(unknown))}")
+    return {k: json.dumps(v) if k in JSON_COLUMNS and v is not None else v for k, v in data.items()}
+
+
+def _decode(row: sqlite3.Row) -> dict:
+    out = {}
+    for key in row.keys():
+        value = row[key]
+        if key in JSON_COLUMNS and value is not None:
+            value = json.loads(value)
+        out[key] = value
+    return out
+
+
+def _seek(where: List[str], params: list, cursor: Optional[str], alias: str, key: str) -> None:
+    if cursor:
+        created_at, last = decode_cursor(cursor)
+        where.append(f"({alias}.created_at < ? or ({alias}.created_at = ? and {alias}.{key} < ?))")
+        params.extend([created_at, created_at, last])
+
+
+def _post_projection(fields: Tuple[str, ...]) -> Tuple[str, str]:
+    """
+    select list and joins for validated post field names.
+    """
+    columns, joins = [], []
+    for name in fields:
+        if name == "*":
+            columns.append("p.*")
+        elif name in EMBEDS:
+            join, embed_columns = EMBEDS[name]
+            alias = EMBED_ALIAS[name]
+            joins.append(join)
+            columns.extend(f"{alias}.{c} as _{name}__{c}" for c in embed_columns)
+        else:
+            columns.append(f"p.{name}")
+    return ", ".join(columns), " ".join(joins)
+
+
+def _shape_post(row: sqlite3.Row) -> dict:
+    out, embeds = {}, {}
+    for key, value in _decode(row).items():
+        if key.startswith("_") and "__" in key:
+            name, column = key[1:].split("__", 1)
+            embeds.setdefault(name, {})[column] = value
+        else:
+            out[key] = value
+    for name, values in embeds.items():
+        # a dangling reference embeds as null, like PostgREST
+        found = values.pop("id", None) is not None
+        out[name] = values if found else None
+    return out
+
+
+class _Reader:
+    """
+    A read-only connection and the one thread that uses it.
+    """
+
+    def __init__(self, path: str, conn: sqlite3.Connection):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-reader")
+        if path == ":memory:":
+            # a second connection would open a different, empty database
+            self.conn = conn
+            return
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("pragma query_only = on")
+
+    def _all(self, sql: str, params) -> List[sqlite3.Row]:
+        return self.conn.execute(sql, params).fetchall()
+
+    async def all(self, sql: str, params=()) -> List[sqlite3.Row]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._all, sql, params)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.conn.close()
+
+
+class _Store:
+    def __init__(self, conn: sqlite3.Connection, reader: _Reader):
+        self.conn = conn
+        self.reader = reader
+
+    def all(self, sql: str, params=()) -> List[sqlite3.Row]:
+        return self.conn.execute(sql, params).fetchall()
+
+    def one(self, sql: str, params=()) -> Optional[sqlite3.Row]:
+        return self.conn.execute(sql, params).fetchone()
+
+    def run(self, sql: str, params=()) -> int:
+        return self.conn.execute(sql, params).rowcount
+
+    def insert_row(self, table: str, data: dict) -> dict:
+        data = _encode(table, data)
+        names = ", ".join(data)
+        marks = ", ".join("?" for _ in data)
+        row = self.one(f"insert into {table} ({names}) values ({marks}) returning *", list(data.values()))
+        return _decode(row)
+
+    def update_where(self, table: str, data: dict, where: str, params: list) -> List[dict]:
+        data = _encode(table, data)
+        assignments = ", ".join(f"{k} = ?" for k in data)
+        rows = self.all(
+            f"update {table} set {assignments} where {where} returning *", [*data.values(), *params])
+        return [_decode(row) for row in rows]
+
+    def delete_where(self, table: str, where: str, params: list) -> List[dict]:
+        return [_decode(row) for row in self.all(f"delete from {table} where {where} returning *", params)]
+
+
+def _marks(values) -> str:
+    return ", ".join("?" for _ in values)
+
+
+class SqlitePosts(_Store, PostRepository):
+    async def list_rows(self, fields, limit, cursor=None, author_id=None, category_id=None, author_ids=None):
+        columns, joins = _post_projection(fields)
+        where, params = [], []
+        if author_id:
+            where.append("p.author_id = ?")
+            params.append(author_id)
+        if category_id:
+            where.append("p.category_id = ?")
+            params.append(category_id)
+        if author_ids is not None:
+            where.append(f"p.author_id in ({_marks(author_ids)})")
+            params.extend(author_ids)
+        _seek(where, params, cursor, "p", "id")
+
+        sql = f"select {columns} from posts p {joins}"
+        if where:
+            sql += " where " + " and ".join(where)
+        sql += " order by p.created_at desc, p.id desc limit ?"
+        # pages of up to a few thousand rows when an index loads
+        rows = await self.reader.all(sql, [*params, limit + 1])
+        return [_shape_post(row) for row in rows]
+
+    async def get(self, post_id, fields):
+        columns, joins = _post_projection(fields)
+        row = self.one(f"select {columns} from posts p {joins} where p.id = ?", [post_id])
+        return _shape_post(row) if row else None
+
+    async def by_ids(self, post_ids, fields):
+        columns, joins = _post_projection(fields)
+        rows = self.all(
+            f"select {columns} from posts p {joins} where p.id in ({_marks(post_ids)})", post_ids)
+        return [_shape_post(row) for row in rows]
+
+    async def exists(self, post_id):
+        return self.one("select 1 from posts where id = ?", [post_id]) is not None
+
+    async def create(self, data):
+        return self.insert_row("posts", {"id": new_id(), "created_at": now(), **data})
+
+    async def update(self, post_id, author_id, data, previous=()):
+        before = {}
+        if previous:
+            # no await in between: nothing else writes the row meanwhile
+            row = self.one(
+                f"select {', '.join(previous)} from posts where id = ? and author_id = ?", [post_id, author_id])
+            before = dict(row) if row else {}
+        rows = self.update_where("posts", data, "id = ? and author_id = ?", [post_id, author_id])
+        if not rows:
+            missing_or_forbidden(await self.exists(post_id), "Post not found", "Not allowed to edit this post")
+        return rows[0], before
+
+    async def delete(self, post_id, author_id):
+        rows = self.delete_where("posts", "id = ? and author_id = ?", [post_id, author_id])
+        if not rows:
+            missing_or_forbidden(await self.exists(post_id), "Post not found", "Not allowed to delete this post")
+        return rows[0]
+
+    async def authors(self, post_ids):
+        rows = self.all(f"select id, author_id from posts where id in ({_marks(post_ids)})", post_ids)
+        return {row["id"]: row["author_id"] for row in rows}
+
+    async def counter(self, post_id, column):
+        if column not in POST_COUNTERS:
+            raise ValueError(f"not a post counter: {column}")
+        row = self.one(f"select {column} from posts where id = ?", [post_id])
+        return row[0] if row else 0
+
+    async def recent_ids(self, author_id, limit):
+        rows = self.all(
+            "select id, created_at from posts where author_id = ? order by created_at desc, id desc limit ?",
+            [author_id, limit])
+        return [dict(row) for row in rows]
+
+    async def adjust_counter(self, post_id, column, delta):
+        if column not in POST_COUNTERS:
+            raise ValueError(f"not a post counter: {column}")
+        self.run(f"update posts set {column} = max({column} + ?, 0) where id = ?", [delta, post_id])
+
+
+class SqliteComments(_Store, CommentRepository):
+    async def _exists(self, comment_id: str) -> bool:
+        return self.one("select 1 from comments where id = ?", [comment_id]) is not None
+
+    async def list_page(self, post_id, limit, cursor=None, embed_profiles=True):
+        where, params = ["cm.post_id = ?"], [post_id]
+        _seek(where, params, cursor, "cm", "id")
+        columns, joins = "cm.*", ""
+        if embed_profiles:
+            columns += (", pr.id as _profiles__id, pr.username as _profiles__username,"
+                        " pr.image_url as _profiles__image_url")
+            joins = "left join profiles pr on pr.id = cm.author_id"
+        rows = self.all(
+            f"select {columns} from comments cm {joins}"
+            f" where {' and '.join(where)} order by cm.created_at desc, cm.id desc limit ?",
+            [*params, limit + 1])
+        return next_page([_shape_post(row) for row in rows], limit)
+
+    async def created_page(self, since, until, limit, cursor=None):
+        where, params = ["cm.created_at >= ?", "cm.created_at < ?"], [since, until]
+        _seek(where, params, cursor, "cm", "id")
+        rows = await self.reader.all(
+            f"select cm.id, cm.post_id, cm.created_at from comments cm where {' and '.join(where)}"
+            " order by cm.created_at desc, cm.id desc limit ?",
+            [*params, limit + 1])
+        return next_page([dict(row) for row in rows], limit)
+
+    async def create(self, post_id, author_id, content):
+        return [self.insert_row("comments", {
+            "id": new_id(), "post_id": post_id, "author_id": author_id,
+            "content": content, "created_at": now(),
+        })]
+
+    async def update(self, comment_id, author_id, content):
+        rows = self.update_where("comments", {"content": content},
+                             "id = ? and author_id = ?", [comment_id, author_id])
+        if not rows:
+            missing_or_forbidden(await self._exists(comment_id), "Comment not found", "Not your comment")
+        return rows
+
+    async def delete(self, comment_id, author_id):
+        rows = self.delete_where("comments", "id = ? and author_id = ?", [comment_id, author_id])
+        if not rows:
+            missing_or_forbidden(await self._exists(comment_id), "Comment not found", "Not your comment")
+        return rows[0]
+
+
+class _Engagement(_Store):
+    table = ""
+    user_column = ""
+
+    async def set(self, post_id, user_id, on):
+        if on:
+            return self.run(
+                f"insert or ignore into {self.table} (id, post_id, {self.user_column}, created_at)"
+                " values (?, ?, ?, ?)",
+                [new_id(), post_id, user_id, now()]) > 0
+        return self.run(
+            f"delete from {self.table} where post_id = ? and {self.user_column} = ?",
+            [post_id, user_id]) > 0
+
+    async def set_many(self, adds, removes):
+        added = [pair for pair in adds if await self.set(*pair, True)]
+        removed = [pair for pair in removes if await self.set(*pair, False)]
+        return added, removed
+
+    async def exists(self, post_id, user_id):
+        return self.one(
+            f"select 1 from {self.table} where post_id = ? and {self.user_column} = ?",
+            [post_id, user_id]) is not None
+
+    async def existing(self, pairs):
+        return {pair for pair in pairs if await self.exists(*pair)}
+
+    async def among(self, user_id, post_ids):
+        rows = self.all(
+            f"select post_id from {self.table}"
+            f" where {self.user_column} = ? and post_id in ({_marks(post_ids)})",
+            [user_id, *post_ids])
+        return {row["post_id"] for row in rows}
+
+
+class SqliteLikes(_Engagement, LikeRepository):
+    table = "likes"
+    user_column = "author_id"
+
+    async def list_page(self, post_id, limit, cursor=None):
+        where, params = ["l.post_id = ?"], [post_id]
+        _seek(where, params, cursor, "l", "id")
+        rows = self.all(
+            f"select l.id, l.author_id, l.created_at from likes l where {' and '.join(where)}"
+            " order by l.created_at desc, l.id desc limit ?",
+            [*params, limit + 1])
+        return next_page([dict(row) for row in rows], limit)
+
+    async def created_page(self, since, until, limit, cursor=None):
+        where, params = ["l.created_at >= ?", "l.created_at < ?"], [since, until]
+        _seek(where, params, cursor, "l", "id")
+        rows = await self.reader.all(
+            f"select l.id, l.post_id, l.created_at from likes l where {' and '.join(where)}"
+            " order by l.created_at desc, l.id desc limit ?",
+            [*params, limit + 1])
+        return next_page([dict(row) for row in rows], limit)
+
+    async def liked_categories(self, user_id, limit):
+        rows = self.all(
+            "select p.category_id from likes l join posts p on p.id = l.post_id"
+            " where l.author_id = ? order by l.created_at desc limit ?",
+            [user_id, limit])
+        return Counter(row["category_id"] for row in rows if row["category_id"])
+
+
+class SqliteBookmarks(_Engagement, BookmarkRepository):
+    table = "bookmarks"
+    user_column = "user_id"
+
+    async def list_for_user(self, user_id, fields):
+        columns, joins = _post_projection(fields)
+        rows = self.all(
+            f"select b.id as _bookmark_id, b.post_id as _bookmark_post_id, {columns}"
+            f" from bookmarks b join posts p on p.id = b.post_id {joins}"
+            " where b.user_id = ? order by b.created_at",
+            [user_id])
+        out = []
+        for row in rows:
+            post = _shape_post(row)
+            out.append({
+                "id": post.pop("_bookmark_id"),
+                "post_id": post.pop("_bookmark_post_id"),
+                "posts": post,
+            })
+        return out
+
+
+class SqliteFollows(_Store, FollowRepository):
+    async def set(self, follower_id, following_id, following):
+        if following:
+            return self.run(
+                "insert or ignore into follows (follower_id, following_id, created_at) values (?, ?, ?)",
+                [follower_id, following_id, now()]) > 0
+        return self.run(
+            "delete from follows where follower_id = ? and following_id = ?",
+            [follower_id, following_id]) > 0
+
+    async def set_many(self, adds, removes):
+        added = [pair for pair in adds if await self.set(*pair, True)]
+        removed = [pair for pair in removes if await self.set(*pair, False)]
+        return added, removed
+
+    async def exists(self, follower_id, following_id):
+        return self.one(
+            "select 1 from follows where follower_id = ? and following_id = ?",
+            [follower_id, following_id]) is not None
+
+    async def existing(self, pairs):
+        return {pair for pair in pairs if await self.exists(*pair)}
+
+    def _page(self, who: str, other: str, user_id: str, limit: int, cursor: Optional[str], embed_profiles: bool):
+        where, params = [f"f.{other} = ?"], [user_id]
+        _seek(where, params, cursor, "f", who)
+        columns, joins = f"f.{who}, f.created_at", ""
+        if embed_profiles:
+            columns += (", pr.id as _profiles__id,"
+                        " pr.username as _profiles__username, pr.image_url as _profiles__image_url")
+            joins = f"left join profiles pr on pr.id = f.{who}"
+        rows = self.all(
+            f"select {columns} from follows f {joins}"
+            f" where {' and '.join(where)} order by f.created_at desc, f.{who} desc limit ?",
+            [*params, limit + 1])
+        return next_page([_shape_post(row) for row in rows], limit, key=who)
+
+    async def followers_page(self, user_id, limit, cursor=None, embed_profiles=True):
+        return self._page("follower_id", "following_id", user_id, limit, cursor, embed_profiles)
+
+    async def following_page(self, user_id, limit, cursor=None, embed_profiles=True):
+        return self._page("following_id", "follower_id", user_id, limit, cursor, embed_profiles)
+
+    async def among(self, follower_id, user_ids):
+        user_ids = list(user_ids)
+        rows = self.all(
+            f"select following_id from follows where follower_id = ? and following_id in ({_marks(user_ids)})",
+            [follower_id, *user_ids])
+        return {row["following_id"] for row in rows}
+
+    async def follower_ids(self, user_id, after, limit):
+        rows = self.all(
+            "select follower_id from follows where following_id = ? and follower_id > ?"
+            " order by follower_id limit ?",
+            [user_id, after or "", limit])
+        return [row["follower_id"] for row in rows]
+
+    async def popular_following(self, follower_id, min_followers):
+        rows = self.all(
+            "select f.following_id from follows f join profiles pr on pr.id = f.following_id"
+            " where f.follower_id = ? and pr.followers_count > ?",
+            [follower_id, min_followers])
+        return [row["following_id"] for row in rows]
+
+    async def edges_page(self, after, limit):
+        follower_id, following_id = after or ("", "")
+        rows = await self.reader.all(
+            "select follower_id, following_id from follows where (follower_id, following_id) > (?, ?)"
+            " order by follower_id, following_id limit ?",
+            [follower_id, following_id, limit])
+        return [(row["follower_id"], row["following_id"]) for row in rows]
+
+
+class SqliteCategories(_Store, CategoryRepository):
+    async def list(self):
+        return [dict(row) for row in self.all("select * from categories order by created_at")]
+
+    async def create(self, name):
+        return [self.insert_row("categories", {"id": new_id(), "name": name, "created_at": now()})]
+
+    async def update(self, category_id, name):
+        return self.update_where("categories", {"name": name}, "id = ?", [category_id])
+
+    async def delete(self, category_id):
+        return self.delete_where("categories", "id = ?", [category_id])
+
+
+class SqliteProfiles(_Store, ProfileRepository):
+    async def get(self, user_id):
+        row = self.one("select * from profiles where id = ?", [user_id])
+        return _decode(row) if row else None
+
+    async def get_many(self, user_ids):
+        rows = self.all(
+            f"select id, username, image_url from profiles where id in ({_marks(user_ids)})", user_ids)
+        return [dict(row) for row in rows]
+
+    async def username_taken(self, username):
+        return self.one("select 1 from profiles where username = ?", [username]) is not None
+
+    async def create(self, data):
+        return self.insert_row("profiles", {"created_at": now(), **data})
+
+    async def update(self, user_id, data):
+        return self.update_where("profiles", data, "id = ?", [user_id])
+
+    async def counter(self, user_id, column):
+        if column not in PROFILE_COUNTERS:
+            raise ValueError(f"not a profile counter: {column}")
+        row = self.one(f"select {column} from profiles where id = ?", [user_id])
+        return row[0] if row else 0
+
+    async def adjust_counter(self, user_id, column, delta):
+        if column not in PROFILE_COUNTERS:
+            raise ValueError(f"not a profile counter: {column}")
+        self.run(f"update profiles set {column} = max({column} + ?, 0) where id = ?", [delta, user_id])
+
+
+class SqliteTimelines(_Store, TimelineRepository):
+    async def insert(self, entries):
+        self.conn.executemany(
+            "insert or ignore into timelines (user_id, post_id, author_id, created_at)"
+            " values (:user_id, :post_id, :author_id, :created_at)",
+            entries)
+
+    async def remove_author(self, user_id, author_id):
+        self.run("delete from timelines where user_id = ? and author_id = ?", [user_id, author_id])
+
+    async def rows(self, user_id, fields, limit, cursor=None):
+        columns, joins = _post_projection(fields)
+        where, params = ["t.user_id = ?"], [user_id]
+        _seek(where, params, cursor, "t", "post_id")
+        rows = self.all(
+            f"select {columns}, t.created_at as _entry_created_at"
+            f" from timelines t join posts p on p.id = t.post_id {joins}"
+            f" where {' and '.join(where)} order by t.created_at desc, t.post_id desc limit ?",
+            [*params, limit + 1])
+
+        out = []
+        for row in rows:
+            post = _shape_post(row)
+            post["created_at"] = post.pop("_entry_created_at")
+            out.append(post)
+        return out
+
+
+class SqliteRepositories(Repositories):
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("pragma journal_mode = wal")
+        self.conn.execute("pragma synchronous = normal")
+        self.conn.execute("pragma foreign_keys = on")
+        self.conn.executescript(SCHEMA)
+        self.reader = _Reader(path, self.conn)
+
+        self.posts = SqlitePosts(self.conn, self.reader)
+        self.comments = SqliteComments(self.conn, self.reader)
+        self.likes = SqliteLikes(self.conn, self.reader)
+        self.bookmarks = SqliteBookmarks(self.conn, self.reader)
+        self.follows = SqliteFollows(self.conn, self.reader)
+        self.categories = SqliteCategories(self.conn, self.reader)
+        self.profiles = SqliteProfiles(self.conn, self.reader)
+        self.timelines = SqliteTimelines(self.conn, self.reader)
+
+    async def reconcile_counters(self):
+        # the recount scans every engagement table, so it runs on the reader.
+        # Only drifted rows are written back, and only if no toggle moved
+        # their counters in between; the next run catches those
+        for table, recounts in RECOUNTS.items():
+            columns = list(recounts)
+            rows = await self.reader.all(
+                f"select * from (select id, {', '.join(columns)}, "
+                + ", ".join(f"({sql}) as _{column}" for column, sql in recounts.items())
+                + f" from {table} t) where " + " or ".join(f"{c} != _{c}" for c in columns))
+            if not rows:
+                continue
+            self.conn.execute("begin")
+            try:
+                self.conn.executemany(
+                    f"update {table} set {', '.join(f'{c} = ?' for c in columns)}"
+                    f" where id = ? and {' and '.join(f'{c} = ?' for c in columns)}",
+                    [[*(row[f"_{c}"] for c in columns), row["id"], *(row[c] for c in columns)] for row in rows])
+                self.conn.execute("commit")
+            except BaseException:
+                self.conn.execute("rollback")
+                raise
+
+    async def close(self):
+        self.reader.close()
+        self.conn.close()
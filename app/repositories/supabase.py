@@ -0,0 +1,448 @@
+from collections import Counter
+from typing import List, Optional, Set, Tuple
+
+from supabase import AsyncClient
+
+from app.config import db, db_admin, TIMELINE_FANOUT_BATCH
+from app.fields import post_select
+from app.pagination import paginate, next_page
+from app.repositories.base import (
+    BookmarkRepository,
+    CategoryRepository,
+    CommentRepository,
+    FollowRepository,
+    LikeRepository,
+    Page,
+    Pair,
+    PostRepository,
+    ProfileRepository,
+    Repositories,
+    TimelineRepository,
+    missing_or_forbidden,
+)
+
+# Supabase (PostgREST) backend. Request-path queries go through `db` as the
+# routers always did; fan-out, counters and other background work through
+# `db_admin`.
+
+PROFILE_EMBED = "profiles(username, image_url)"
+
+# (a, b) pairs matched per `or` filter, keeping bulk deletes and lookups
+# well inside URL length limits
+PAIR_FILTER_CHUNK = 50
+
+
+def _pair_filter(left: str, right: str, pairs: List[Pair]) -> str:
+    return ",".join(f"and({left}.eq.{a},{right}.eq.{b})" for a, b in pairs)
+
+
+async def _set_pairs(
+        client: AsyncClient, table: str, left: str, right: str,
+        adds: List[Pair], removes: List[Pair]) -> Tuple[List[Pair], List[Pair]]:
+    added, removed = [], []
+    if adds:
+        response = await client.table(table).upsert(
+            [{left: a, right: b} for a, b in adds],
+            on_conflict=f"{left},{right}",
+            ignore_duplicates=True,
+        ).execute()
+        added = [(row[left], row[right]) for row in response.data]
+    for start in range(0, len(removes), PAIR_FILTER_CHUNK):
+        response = await client.table(table).delete().or_(
+            _pair_filter(left, right, removes[start:start + PAIR_FILTER_CHUNK])).execute()
+        removed.extend((row[left], row[right]) for row in response.data)
+    return added, removed
+
+
+async def _existing_pairs(client: AsyncClient, table: str, left: str, right: str, pairs: List[Pair]) -> Set[Pair]:
+    found = set()
+    for start in range(0, len(pairs), PAIR_FILTER_CHUNK):
+        response = await client.table(table).select(f"{left}, {right}").or_(
+            _pair_filter(left, right, pairs[start:start + PAIR_FILTER_CHUNK])).execute()
+        found.update((row[left], row[right]) for row in response.data)
+    return found
+
+
+class SupabasePosts(PostRepository):
+    def __init__(self, client: AsyncClient, admin: AsyncClient):
+        self.db = client
+        self.admin = admin
+
+    async def list_rows(self, fields, limit, cursor=None, author_id=None, category_id=None, author_ids=None):
+        query = self.db.table("posts").select(post_select(fields))
+        if author_id:
+            query = query.eq("author_id", author_id)
+        if category_id:
+            query = query.eq("category_id", category_id)
+        if author_ids is not None:
+            query = query.in_("author_id", author_ids)
+        response = await paginate(query, limit, cursor).execute()
+        return response.data
+
+    async def get(self, post_id, fields):
+        response = await self.db.table("posts").select(
+            post_select(fields)).eq("id", post_id).limit(1).execute()
+        return response.data[0] if response.data else None
+
+    async def by_ids(self, post_ids, fields):
+        response = await self.db.table("posts").select(
+            post_select(fields)).in_("id", post_ids).execute()
+        return response.data
+
+    async def exists(self, post_id):
+        response = await self.db.table("posts").select("id").eq("id", post_id).execute()
+        return bool(response.data)
+
+    async def create(self, data):
+        response = await self.db.table("posts").insert(data).execute()
+        return response.data[0] if response.data else None
+
+    async def update(self, post_id, author_id, data, previous=()):
+        before = {}
+        if previous:
+            # PostgREST cannot return the old row from an update
+            response = await self.db.table("posts").select(", ".join(previous)).eq(
+                "id", post_id).eq("author_id", author_id).execute()
+            before = response.data[0] if response.data else {}
+        # ownership is part of the write filter
+        response = await self.db.table("posts").update(data).eq(
+            "id", post_id).eq("author_id", author_id).execute()
+        if not response.data:
+            missing_or_forbidden(await self.exists(post_id), "Post not found", "Not allowed to edit this post")
+        return response.data[0], before
+
+    async def delete(self, post_id, author_id):
+        response = await self.db.table("posts").delete().eq(
+            "id", post_id).eq("author_id", author_id).execute()
+        if not response.data:
+            missing_or_forbidden(await self.exists(post_id), "Post not found", "Not allowed to delete this post")
+        return response.data[0]
+
+    async def authors(self, post_ids):
+        response = await self.db.table("posts").select("id, author_id").in_("id", post_ids).execute()
+        return {row["id"]: row["author_id"] for row in response.data}
+
+    async def counter(self, post_id, column):
+        response = await self.db.table("posts").select(column).eq("id", post_id).execute()
+        return response.data[0][column] if response.data else 0
+
+    async def recent_ids(self, author_id, limit):
+        response = await self.admin.table("posts").select("id, created_at").eq(
+            "author_id", author_id).order("created_at", desc=True).limit(limit).execute()
+        return response.data
+
+    async def adjust_counter(self, post_id, column, delta):
+        await self.admin.rpc("adjust_post_counter", {
+            "p_post_id": post_id, "p_column": column, "p_delta": delta}).execute()
+
+
+class SupabaseComments(CommentRepository):
+    def __init__(self, client: AsyncClient):
+        self.db = client
+
+    async def _exists(self, comment_id: str) -> bool:
+        response = await self.db.table("comments").select("id").eq("id", comment_id).execute()
+        return bool(response.data)
+
+    async def list_page(self, post_id, limit, cursor=None, embed_profiles=True):
+        select = f"*, {PROFILE_EMBED}" if embed_profiles else "*"
+        response = await paginate(
+            self.db.table("comments").select(select).eq("post_id", post_id),
+            limit,
+            cursor,
+        ).execute()
+        return next_page(response.data, limit)
+
+    async def created_page(self, since, until, limit, cursor=None):
+        response = await paginate(
+            self.db.table("comments").select("id, post_id, created_at").gte(
+                "created_at", since).lt("created_at", until),
+            limit,
+            cursor,
+        ).execute()
+        return next_page(response.data, limit)
+
+    async def create(self, post_id, author_id, content):
+        response = await self.db.table("comments").insert({
+            "post_id": post_id,
+            "author_id": author_id,
+            "content": content,
+        }).execute()
+        return response.data
+
+    async def update(self, comment_id, author_id, content):
+        response = await self.db.table("comments").update({"content": content}).eq(
+            "id", comment_id).eq("author_id", author_id).execute()
+        if not response.data:
+            missing_or_forbidden(await self._exists(comment_id), "Comment not found", "Not your comment")
+        return response.data
+
+    async def delete(self, comment_id, author_id):
+        response = await self.db.table("comments").delete().eq(
+            "id", comment_id).eq("author_id", author_id).execute()
+        if not response.data:
+            missing_or_forbidden(await self._exists(comment_id), "Comment not found", "Not your comment")
+        return response.data[0]
+
+
+class _Engagement:
+    """
+    likes and bookmarks: one row per (post, user), toggled by upsert/delete.
+    """
+
+    table = ""
+    user_column = ""
+
+    def __init__(self, client: AsyncClient):
+        self.db = client
+
+    async def set(self, post_id, user_id, on):
+        if on:
+            response = await self.db.table(self.table).upsert(
+                {"post_id": post_id, self.user_column: user_id},
+                on_conflict=f"post_id,{self.user_column}",
+                ignore_duplicates=True,
+            ).execute()
+        else:
+            response = await self.db.table(self.table).delete().eq(
+                "post_id", post_id).eq(self.user_column, user_id).execute()
+        return bool(response.data)
+
+    async def set_many(self, adds, removes):
+        return await _set_pairs(self.db, self.table, "post_id", self.user_column, adds, removes)
+
+    async def exists(self, post_id, user_id):
+        response = await self.db.table(self.table).select("id").eq(
+            "post_id", post_id).eq(self.user_column, user_id).execute()
+        return bool(response.data)
+
+    async def existing(self, pairs):
+        return await _existing_pairs(self.db, self.table, "post_id", self.user_column, pairs)
+
+    async def among(self, user_id, post_ids):
+        response = await self.db.table(self.table).select("post_id").in_(
+            "post_id", post_ids).eq(self.user_column, user_id).execute()
+        return {row["post_id"] for row in response.data}
+
+
+class SupabaseLikes(_Engagement, LikeRepository):
+    table = "likes"
+    user_column = "author_id"
+
+    async def list_page(self, post_id, limit, cursor=None):
+        response = await paginate(
+            self.db.table("likes").select("id, author_id, created_at").eq("post_id", post_id),
+            limit,
+            cursor,
+        ).execute()
+        return next_page(response.data, limit)
+
+    async def created_page(self, since, until, limit, cursor=None):
+        response = await paginate(
+            self.db.table("likes").select("id, post_id, created_at").gte(
+                "created_at", since).lt("created_at", until),
+            limit,
+            cursor,
+        ).execute()
+        return next_page(response.data, limit)
+
+    async def liked_categories(self, user_id, limit):
+        response = await self.db.table("likes").select("posts(category_id)").eq(
+            "author_id", user_id).order("created_at", desc=True).limit(limit).execute()
+        return Counter(
+            row["posts"]["category_id"] for row in response.data
+            if row.get("posts") and row["posts"].get("category_id"))
+
+
+class SupabaseBookmarks(_Engagement, BookmarkRepository):
+    table = "bookmarks"
+    user_column = "user_id"
+
+    async def list_for_user(self, user_id, fields):
+        response = await self.db.table("bookmarks").select(
+            f"id, post_id, posts({post_select(fields)})"
+        ).eq("user_id", user_id).execute()
+        return response.data
+
+
+class SupabaseFollows(FollowRepository):
+    def __init__(self, client: AsyncClient, admin: AsyncClient):
+        self.db = client
+        self.admin = admin
+
+    async def set(self, follower_id, following_id, following):
+        if following:
+            response = await self.db.table("follows").upsert(
+                {"follower_id": follower_id, "following_id": following_id},
+                on_conflict="follower_id,following_id",
+                ignore_duplicates=True,
+            ).execute()
+        else:
+            response = await self.db.table("follows").delete().eq(
+                "follower_id", follower_id).eq("following_id", following_id).execute()
+        return bool(response.data)
+
+    async def set_many(self, adds, removes):
+        return await _set_pairs(self.db, "follows", "follower_id", "following_id", adds, removes)
+
+    async def exists(self, follower_id, following_id):
+        response = await self.db.table("follows").select("follower_id").eq(
+            "follower_id", follower_id).eq("following_id", following_id).execute()
+        return bool(response.data)
+
+    async def existing(self, pairs):
+        return await _existing_pairs(self.db, "follows", "follower_id", "following_id", pairs)
+
+    async def _page(self, who: str, other: str, user_id: str, limit: int, cursor: Optional[str], embed_profiles: bool) -> Page:
+        select = f"{who}, created_at"
+        if embed_profiles:
+            select += f", profiles!follows_{who}_fkey(username, image_url)"
+        response = await paginate(
+            self.db.table("follows").select(select).eq(other, user_id),
+            limit,
+            cursor,
+            key=who,
+        ).execute()
+        return next_page(response.data, limit, key=who)
+
+    async def followers_page(self, user_id, limit, cursor=None, embed_profiles=True):
+        return await self._page("follower_id", "following_id", user_id, limit, cursor, embed_profiles)
+
+    async def following_page(self, user_id, limit, cursor=None, embed_profiles=True):
+        return await self._page("following_id", "follower_id", user_id, limit, cursor, embed_profiles)
+
+    async def among(self, follower_id, user_ids):
+        response = await self.db.table("follows").select("following_id").eq(
+            "follower_id", follower_id).in_("following_id", list(user_ids)).execute()
+        return {row["following_id"] for row in response.data}
+
+    async def follower_ids(self, user_id, after, limit):
+        query = self.admin.table("follows").select("follower_id").eq(
+            "following_id", user_id).order("follower_id").limit(limit)
+        if after:
+            query = query.gt("follower_id", after)
+        response = await query.execute()
+        return [row["follower_id"] for row in response.data]
+
+    async def popular_following(self, follower_id, min_followers):
+        response = await self.admin.table("follows").select(
+            "following_id, profiles!follows_following_id_fkey!inner(followers_count)"
+        ).eq("follower_id", follower_id).gt(
+            "profiles.followers_count", min_followers).execute()
+        return [row["following_id"] for row in response.data]
+
+    async def edges_page(self, after, limit):
+        query = self.admin.table("follows").select("follower_id, following_id").order(
+            "follower_id").order("following_id").limit(limit)
+        if after:
+            follower_id, following_id = after
+            query = query.or_(
+                f'follower_id.gt."{follower_id}",'
+                f'and(follower_id.eq."{follower_id}",following_id.gt."{following_id}")'
+            )
+        response = await query.execute()
+        return [(row["follower_id"], row["following_id"]) for row in response.data]
+
+
+class SupabaseCategories(CategoryRepository):
+    def __init__(self, client: AsyncClient):
+        self.db = client
+
+    async def list(self):
+        response = await self.db.table("categories").select("*").order("created_at").execute()
+        return response.data
+
+    async def create(self, name):
+        response = await self.db.table("categories").insert({"name": name}).execute()
+        return response.data
+
+    async def update(self, category_id, name):
+        response = await self.db.table("categories").update(
+            {"name": name}).eq("id", category_id).execute()
+        return response.data
+
+    async def delete(self, category_id):
+        response = await self.db.table("categories").delete().eq("id", category_id).execute()
+        return response.data
+
+
+class SupabaseProfiles(ProfileRepository):
+    def __init__(self, client: AsyncClient, admin: AsyncClient):
+        self.db = client
+        self.admin = admin
+
+    async def get(self, user_id):
+        response = await self.db.table("profiles").select("*").eq("id", user_id).limit(1).execute()
+        return response.data[0] if response.data else None
+
+    async def get_many(self, user_ids):
+        response = await self.db.table("profiles").select(
+            "id, username, image_url").in_("id", user_ids).execute()
+        return response.data
+
+    async def username_taken(self, username):
+        response = await self.db.table("profiles").select("id").eq("username", username).execute()
+        return bool(response.data)
+
+    async def create(self, data):
+        response = await self.db.table("profiles").insert(data).execute()
+        return response.data[0] if response.data else None
+
+    async def update(self, user_id, data):
+        response = await self.db.table("profiles").update(data).eq("id", user_id).execute()
+        return response.data
+
+    async def counter(self, user_id, column):
+        response = await self.db.table("profiles").select(column).eq("id", user_id).execute()
+        return response.data[0][column] if response.data else 0
+
+    async def adjust_counter(self, user_id, column, delta):
+        await self.admin.rpc("adjust_profile_counter", {
+            "p_profile_id": user_id, "p_column": column, "p_delta": delta}).execute()
+
+
+class SupabaseTimelines(TimelineRepository):
+    def __init__(self, admin: AsyncClient):
+        self.admin = admin
+
+    async def insert(self, entries):
+        for start in range(0, len(entries), TIMELINE_FANOUT_BATCH):
+            await self.admin.table("timelines").upsert(
+                entries[start:start + TIMELINE_FANOUT_BATCH],
+                on_conflict="user_id,post_id",
+                ignore_duplicates=True,
+                returning="minimal",
+            ).execute()
+
+    async def remove_author(self, user_id, author_id):
+        await self.admin.table("timelines").delete(returning="minimal").eq(
+            "user_id", user_id).eq("author_id", author_id).execute()
+
+    async def rows(self, user_id, fields, limit, cursor=None):
+        response = await paginate(
+            self.admin.table("timelines").select(
+                f"post_id, created_at, posts({post_select(fields)})").eq("user_id", user_id),
+            limit,
+            cursor,
+            key="post_id",
+        ).execute()
+        return [
+            {**row["posts"], "created_at": row["created_at"]}
+            for row in response.data if row.get("posts")
+        ]
+
+
+class SupabaseRepositories(Repositories):
+    def __init__(self, client: AsyncClient = db, admin: AsyncClient = db_admin):
+        self.admin = admin
+        self.posts = SupabasePosts(client, admin)
+        self.comments = SupabaseComments(client)
+        self.likes = SupabaseLikes(client)
+        self.bookmarks = SupabaseBookmarks(client)
+        self.follows = SupabaseFollows(client, admin)
+        self.categories = SupabaseCategories(client)
+        self.profiles = SupabaseProfiles(client, admin)
+        self.timelines = SupabaseTimelines(admin)
+
+    async def reconcile_counters(self):
+        await self.admin.rpc("reconcile_counters", {}).execute()
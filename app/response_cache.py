@@ -0,0 +1,118 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Iterable, Optional, Tuple
+
+import orjson
+from fastapi import Request, Response
+
+from app.cache import make_cache
+from app.config import FEED_CACHE_TTL, FEED_CACHE_MAX_ENTRIES, FEED_CACHE_MAX_BYTES
+from app.http_cache import FEED_CACHE_CONTROL, etag_for, etag_matches, invalidate_etags, json_response, not_modified
+
+
+# pre-serialized public feed responses as etag + newline + body, one bytes
+# value either cache backend stores as is; dropped by tag when a post changes
+feed_cache = make_cache(
+    "feeds",
+    max_entries=FEED_CACHE_MAX_ENTRIES,
+    max_bytes=FEED_CACHE_MAX_BYTES,
+    ttl=FEED_CACHE_TTL,
+)
+
+_inflight = {}
+
+
+def all_posts_tag() -> str:
+    return "posts"
+
+
+def category_tag(category_id: Optional[str]) -> str:
+    return f"category:{category_id}"
+
+
+def author_tag(author_id: str) -> str:
+    return f"author:{author_id}"
+
+
+def any_author_tag() -> str:
+    # carried by every author page entry
+    return "author:*"
+
+
+def any_category_tag() -> str:
+    # carried by every category feed entry
+    return "category:*"
+
+
+def categories_tag() -> str:
+    # the category list itself
+    return "categories"
+
+
+async def cached_json(
+    key: Hashable,
+    tags: Iterable[str],
+    build: Callable[[], Awaitable[dict]],
+    request: Optional[Request] = None,
+    cache_control: str = FEED_CACHE_CONTROL,
+) -> Response:
+    """
+    Serve `key` from the feed cache, building and storing it on a miss.
+    Concurrent misses for the same key share one upstream query. A client
+    that sends the current ETag gets a 304.
+    """
+    entry = feed_cache.get(key)
+    if entry is None:
+        pending = _inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(_build(key, tuple(tags), build))
+            _inflight[key] = pending
+            pending.add_done_callback(lambda _: _inflight.pop(key, None))
+        entry = await asyncio.shield(pending)
+
+    body, etag = _unpack(entry)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    return json_response(body, etag, cache_control)
+
+
+def _unpack(entry: bytes) -> Tuple[bytes, str]:
+    etag, _, body = entry.partition(b"\n")
+    return body, etag.decode()
+
+
+async def _build(key, tags, build) -> bytes:
+    # a build that raced a write (in any worker) is served but not stored
+    stamp = feed_cache.stamp()
+    body = orjson.dumps(await build())
+    entry = etag_for(body).encode() + b"\n" + body
+    feed_cache.set(key, entry, size=len(entry), tags=tags, stamp=stamp)
+    return entry
+
+
+def invalidate_posts(
+    author_id: Optional[str],
+    *category_ids: Optional[str],
+    any_category: bool = False,
+    any_author: bool = False,
+) -> None:
+    """
+    Drop the cached feeds a post write can change: the global feed, the
+    author's page and the feeds of every category involved (all of them
+    with `any_category`, every author page with `any_author`), along with
+    the ETags kept for the author's and categories' posts.
+    """
+    tags = [all_posts_tag()]
+    if author_id:
+        tags.append(author_tag(author_id))
+    tags.extend(category_tag(c) for c in category_ids if c)
+    if any_category:
+        tags.append(any_category_tag())
+    if any_author:
+        tags.append(any_author_tag())
+    feed_cache.invalidate_tags(*tags)
+    # and the kept ETags of single posts and timelines showing them
+    invalidate_etags(*tags)
+
+
+def invalidate_categories() -> None:
+    feed_cache.invalidate_tags(categories_tag())
@@ -1,22 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
-from app.dependencies import get_current_user
-from app.config import db_admin, db
+from app.dependencies import get_current_user, admin_required, user_cache
+from app.config import db_admin
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.get("/me")
-def get_me(user=Depends(get_current_user)):
+async def get_me(user=Depends(get_current_user)):
     return {"user": user}
 
 
 @router.put("/admin/{user_id}")
-def make_admin(user_id: str, user=Depends(get_current_user)):
+async def make_admin(user_id: str, user=Depends(get_current_user)):
     if not user.user_metadata.get("is_admin", False):
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    admin_response = db_admin.auth.admin.update_user_by_id(
+    admin_response = await db_admin.auth.admin.update_user_by_id(
         user_id,
         {
             "user_metadata": {
@@ -25,3 +25,8 @@ def make_admin(user_id: str, user=Depends(get_current_user)):
         }
     )
     return {"message": "User promoted to admin", "res": admin_response}
+
+
+@router.get("/cache/stats")
+async def get_auth_cache_stats(user=Depends(admin_required)):
+    return {"user_cache": user_cache.stats()}
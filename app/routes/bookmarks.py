@@ -1,6 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from collections import Counter
+from typing import List, Optional
+from fastapi import APIRouter, Depends
 from app.dependencies import get_current_user
-from app.config import db
+from app.counters import bump_post
+from app.fields import post_fields
+from app.repositories import repos
+from app.repositories.base import Pair
+from app.profile_loader import ProfileLoader, normalized, without_profiles, profile_loader, profile_map
+from app.write_behind import missing_posts, pending_state, submit_toggle, write_behind
 
 router = APIRouter()
 
@@ -9,59 +16,85 @@ router = APIRouter()
 
 
 @router.get("/bookmarks")
-def get_bookmarks(user=Depends(get_current_user)):
-    response = db.table("bookmarks").select(
-        "id, post_id, posts(id, title, content, cover_image_url, created_at, author_id, profiles(username, image_url))"
-    ).eq("user_id", user.id).execute()
-
-    return {
-        "count": len(response.data),
-        "bookmarks": response.data,
+async def get_bookmarks(
+    fields: Optional[str] = None,
+    shape: Optional[str] = None,
+    user=Depends(get_current_user),
+    loader: ProfileLoader = Depends(profile_loader),
+):
+    names = post_fields(fields)
+    normalize = normalized(shape)
+    if normalize:
+        names = without_profiles(names)
+
+    bookmarks = await repos.bookmarks.list_for_user(user.id, names)
+
+    body = {
+        "count": len(bookmarks),
+        "bookmarks": bookmarks,
         "message": "success"
     }
+    if normalize:
+        body["profiles"] = await profile_map(loader, (b["posts"] or {} for b in bookmarks))
+    return body
 
 
-# ADD a bookmark (auth required)
+# bookmark / un-bookmark in a single upstream call
 
 
-@router.post("/posts/{post_id}/bookmark")
-def add_bookmark(post_id: str, user=Depends(get_current_user)):
-    # Check if already bookmarked
-    existing = db.table("bookmarks").select(
-        "*").eq("post_id", post_id).eq("user_id", user.id).execute()
-    if existing.data:
-        raise HTTPException(status_code=400, detail="Post already bookmarked")
+async def set_bookmark(post_id: str, user_id: str, bookmarked: bool) -> None:
+    if await repos.bookmarks.set(post_id, user_id, bookmarked):
+        bump_post(post_id, "bookmarks_count", 1 if bookmarked else -1)
 
-    response = db.table("bookmarks").insert({
-        "post_id": post_id,
-        "user_id": user.id
-    }).execute()
 
-    return {"message": "Post bookmarked", "res": response.data}
+# write-behind flush: one bulk write per batch, one counter bump per post
 
 
-# REMOVE a bookmark (auth required)
+async def set_bookmarks(adds: List[Pair], removes: List[Pair]) -> None:
+    added, removed = await repos.bookmarks.set_many(adds, removes)
+    deltas = Counter(post_id for post_id, _ in added)
+    deltas.subtract(post_id for post_id, _ in removed)
+    for post_id, delta in deltas.items():
+        if delta:
+            bump_post(post_id, "bookmarks_count", delta)
 
 
-@router.delete("/posts/{post_id}/bookmark")
-def remove_bookmark(post_id: str, user=Depends(get_current_user)):
-    existing = db.table("bookmarks").select(
-        "*").eq("post_id", post_id).eq("user_id", user.id).execute()
-    if not existing.data:
-        raise HTTPException(status_code=404, detail="Bookmark not found")
+write_behind.register("bookmark", set_bookmarks, repos.bookmarks.existing, missing_posts)
+
+
+async def toggle_bookmark(post_id: str, user_id: str, bookmarked: bool) -> bool:
+    return await submit_toggle(
+        "bookmark", post_id, user_id, bookmarked,
+        lambda state: set_bookmark(post_id, user_id, state))
+
+
+# ADD a bookmark (auth required, idempotent)
 
-    db.table("bookmarks").delete().eq(
-        "post_id", post_id).eq("user_id", user.id).execute()
-    return {"message": "Bookmark removed"}
+
+@router.put("/posts/{post_id}/bookmark")
+@router.post("/posts/{post_id}/bookmark")
+async def add_bookmark(post_id: str, user=Depends(get_current_user)):
+    bookmarked = await toggle_bookmark(post_id, user.id, True)
+    return {"message": "Post bookmarked", "bookmarked": bookmarked}
+
+
+# REMOVE a bookmark (auth required, idempotent)
+
+
+@router.delete("/posts/{post_id}/bookmark")
+async def remove_bookmark(post_id: str, user=Depends(get_current_user)):
+    bookmarked = await toggle_bookmark(post_id, user.id, False)
+    return {"message": "Bookmark removed", "bookmarked": bookmarked}
 
 
 # CHECK if a post is bookmarked (auth required)
 
 @router.get("/posts/{post_id}/is-bookmarked")
-def is_bookmarked(post_id: str, user=Depends(get_current_user)):
-    response = db.table("bookmarks").select("id").eq(
-        "post_id", post_id).eq("user_id", user.id).execute()
+async def is_bookmarked(post_id: str, user=Depends(get_current_user)):
+    bookmarked = pending_state("bookmark", post_id, user.id)
+    if bookmarked is None:
+        bookmarked = await repos.bookmarks.exists(post_id, user.id)
     return {
-        "bookmarked": bool(response.data),
+        "bookmarked": bookmarked,
         "message": "success"
     }
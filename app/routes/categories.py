@@ -1,6 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.config import db
+from fastapi import APIRouter, Depends, HTTPException, Request
+from app.config import DEFAULT_PAGE_SIZE
 from app.dependencies import admin_required
+from app.pagination import page_size
+from app.fields import post_fields
+from app.profile_loader import ProfileLoader, normalized, without_profiles, profile_loader, profile_map
+from app.repositories import repos
+from app.http_cache import CATEGORIES_CACHE_CONTROL
+from app.response_cache import (
+    cached_json, invalidate_posts, invalidate_categories,
+    all_posts_tag, any_category_tag, category_tag, categories_tag,
+)
 
 router = APIRouter()
 
@@ -8,60 +17,84 @@ router = APIRouter()
 # GET all categories (public)
 
 @router.get("/categories")
-def get_categories():
-    response = db.table("categories").select("*").order("created_at").execute()
-    return {"categories": response.data}
+async def get_categories(request: Request):
+    async def build():
+        return {"categories": await repos.categories.list()}
+
+    return await cached_json(
+        ("categories",), [categories_tag()], build, request, CATEGORIES_CACHE_CONTROL)
 
 
 # CREATE category (admin only)
 
 @router.post("/categories")
-def create_category(name: str, user=Depends(admin_required)):
+async def create_category(name: str, user=Depends(admin_required)):
     # Simple check: only admins can create
     if not user.user_metadata.get("is_admin", False):
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    response = db.table("categories").insert({"name": name}).execute()
-    return {"message": "Category created", "category": response.data}
+    category = await repos.categories.create(name)
+    invalidate_categories()
+    return {"message": "Category created", "category": category}
 
 
 # UPDATE category (admin only)
 
 @router.put("/categories/{category_id}")
-def update_category(category_id: str, name: str, user=Depends(admin_required)):
+async def update_category(category_id: str, name: str, user=Depends(admin_required)):
     if not user.user_metadata.get("is_admin", False):
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    response = db.table("categories").update(
-        {"name": name}).eq("id", category_id).execute()
-    if not response.data:
+    category = await repos.categories.update(category_id, name)
+    if not category:
         raise HTTPException(status_code=404, detail="Category not found")
-    return {"message": "Category updated", "category": response.data}
+
+    # feeds embed the category name, author pages included
+    invalidate_posts(None, category_id, any_author=True)
+    invalidate_categories()
+    return {"message": "Category updated", "category": category}
 
 
 # DELETE category (admin only)
 
 @router.delete("/categories/{category_id}")
-def delete_category(category_id: str, user=Depends(admin_required)):
+async def delete_category(category_id: str, user=Depends(admin_required)):
     if not user.user_metadata.get("is_admin", False):
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    response = db.table("categories").delete().eq("id", category_id).execute()
-    if not response.data:
+    deleted = await repos.categories.delete(category_id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Category not found")
+
+    invalidate_posts(None, category_id, any_author=True)
+    invalidate_categories()
     return {"message": "Category deleted"}
 
 
 # category feed selection endpoint
 
 @router.get("/feed")
-def get_feed(category_id: str | None = None):
-    query = db.table("posts").select(
-        "*, profiles(username, image_url), categories(name)"
-    ).order("created_at", desc=True)
-
-    if category_id:
-        query = query.eq("category_id", category_id)
-
-    response = query.execute()
-    return {"posts": response.data}
+async def get_feed(
+    request: Request,
+    category_id: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    fields: str | None = None,
+    shape: str | None = None,
+    loader: ProfileLoader = Depends(profile_loader),
+):
+    limit = page_size(limit)
+    names = post_fields(fields)
+    normalize = normalized(shape)
+    if normalize:
+        names = without_profiles(names)
+
+    async def build():
+        rows, next_cursor = await repos.posts.list_page(names, limit, cursor, category_id=category_id)
+        body = {"posts": rows, "next_cursor": next_cursor}
+        if normalize:
+            body["profiles"] = await profile_map(loader, rows)
+        return body
+
+    tags = [category_tag(category_id), any_category_tag()] if category_id else [all_posts_tag()]
+    return await cached_json(("feed", category_id, names, normalize, limit, cursor), tags, build, request)
@@ -1,5 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from app.config import db
+from fastapi import APIRouter, Depends, Body
+from typing import Optional
+from app.config import DEFAULT_PAGE_SIZE
+from app.counters import bump_post
+from app.events import post_events
+from app.pagination import page_size
+from app.repositories import repos
+from app import trending
+from app.profile_loader import ProfileLoader, normalized, profile_loader, profile_map
 
 from app.dependencies import get_current_user
 
@@ -9,57 +16,54 @@ router = APIRouter()
 
 
 @router.get("/posts/{post_id}/comments")
-def get_comments(post_id: str):
-    response = db.table("comments").select(
-        "*, profiles(username, image_url)"
-    ).eq("post_id", post_id).order("created_at", desc=True).execute()
-    return {'message': "success", "res": response.data}
+async def get_comments(
+    post_id: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    shape: Optional[str] = None,
+    loader: ProfileLoader = Depends(profile_loader),
+):
+    limit = page_size(limit)
+    normalize = normalized(shape)
+    rows, next_cursor = await repos.comments.list_page(post_id, limit, cursor, embed_profiles=not normalize)
+    body = {'message': "success", "res": rows, "next_cursor": next_cursor}
+    if normalize:
+        body["profiles"] = await profile_map(loader, rows)
+    return body
 
 # ADD comment (auth)
 
 
 @router.post("/posts/{post_id}/comments")
-def add_comment(post_id: str, body: dict = Body(...), user=Depends(get_current_user)):
-    response = db.table("comments").insert({
-        "post_id": post_id,
-        "author_id": user.id,
-        "content": body["content"]
-    }).execute()
-    return {'message': "success", "res": response.data}
+async def add_comment(post_id: str, body: dict = Body(...), user=Depends(get_current_user)):
+    comment = await repos.comments.create(post_id, user.id, body["content"])
+    bump_post(post_id, "comments_count", 1)
+    trending.comment_changed(post_id, 1)
+    for row in comment:
+        post_events.publish(post_id, "comment_added", row)
+    return {'message': "success", "res": comment}
 
 # DELETE comment (auth + ownership)
 
 
 @router.delete("/posts/{comment_id}/comments")
-def delete_comment(comment_id: str, user=Depends(get_current_user)):
-    comment = db.table("comments").select(
-        "*").eq("id", comment_id).single().execute()
-    if not comment.data:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    if comment.data["author_id"] != user.id:
-        raise HTTPException(status_code=403, detail="Not your comment")
-
-    db.table("comments").delete().eq("id", comment_id).execute()
+async def delete_comment(comment_id: str, user=Depends(get_current_user)):
+    # ownership is part of the write filter
+    comment = await repos.comments.delete(comment_id, user.id)
+
+    bump_post(comment["post_id"], "comments_count", -1)
+    trending.comment_changed(comment["post_id"], -1, comment.get("created_at"))
+    post_events.publish(comment["post_id"], "comment_deleted", {"id": comment["id"]})
     return {"message": "Comment deleted"}
 
 # update comment (auth + ownership)
 
 
 @router.put("/posts/{comment_id}/comments")
-def update_comment(comment_id: str, body: dict = Body(...), user=Depends(get_current_user)):
-    # Check if comment exists
-    comment = db.table("comments").select(
-        "*").eq("id", comment_id).single().execute()
-    if not comment.data:
-        raise HTTPException(status_code=404, detail="Comment not found")
-
-    # Ensure ownership
-    if comment.data["author_id"] != user.id:
-        raise HTTPException(status_code=403, detail="Not your comment")
-
-    # Update comment
-    response = db.table("comments").update({
-        "content": body["content"]
-    }).eq("id", comment_id).execute()
-
-    return {'message': "success", "res": response.data}
+async def update_comment(comment_id: str, body: dict = Body(...), user=Depends(get_current_user)):
+    # Update comment, only if the caller wrote it
+    comment = await repos.comments.update(comment_id, user.id, body["content"])
+    for row in comment:
+        post_events.publish(row["post_id"], "comment_updated", row)
+
+    return {'message': "success", "res": comment}
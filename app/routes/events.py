@@ -0,0 +1,28 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from app.events import post_events
+
+router = APIRouter()
+
+
+# live comment and like events for one post (public), as Server-Sent Events:
+# comment_added / comment_updated / comment_deleted carry the comment, likes
+# carries a count delta. A reconnecting EventSource sends Last-Event-ID and
+# gets what it missed, or a `reset` event when it has to refetch.
+
+@router.get("/posts/{post_id}/events")
+async def post_event_stream(post_id: str, last_event_id: Optional[str] = Header(None)):
+    if post_events.full():
+        raise HTTPException(
+            status_code=503, detail="Too many live connections", headers={"Retry-After": "10"})
+
+    return StreamingResponse(
+        post_events.stream(post_id, last_event_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # keep nginx and friends from buffering the stream
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -1,85 +1,178 @@
+import asyncio
+from collections import Counter
 from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
 from app.dependencies import get_current_user
-from app.config import db
+from app.config import DEFAULT_PAGE_SIZE
+from app import follow_graph, timeline
+from app.counters import bump_profile
+from app.pagination import page_size
+from app.repositories import repos
+from app.repositories.base import Pair
+from app.profile_loader import ProfileLoader, normalized, profile_loader, profile_map
+from app.write_behind import missing_profiles, pending_state, submit_toggle, write_behind
 
 router = APIRouter()
 
 
-# FOLLOW a user (auth required)
+# follow / unfollow in a single upstream call
 
 
+async def set_follow(follower_id: str, following_id: str, following: bool) -> None:
+    if await repos.follows.set(follower_id, following_id, following):
+        delta = 1 if following else -1
+        bump_profile(follower_id, "following_count", delta)
+        bump_profile(following_id, "followers_count", delta)
+        timeline.follow_changed(follower_id, following_id, following)
+        follow_graph.follow_changed(follower_id, following_id, following)
+
+
+# write-behind flush: one bulk write per batch, one counter bump per profile
+
+
+async def set_follows(adds: List[Pair], removes: List[Pair]) -> None:
+    added, removed = await repos.follows.set_many(adds, removes)
+    following_deltas, followers_deltas = Counter(), Counter()
+    for delta, pairs in ((1, added), (-1, removed)):
+        for follower_id, following_id in pairs:
+            following_deltas[follower_id] += delta
+            followers_deltas[following_id] += delta
+            timeline.follow_changed(follower_id, following_id, delta > 0)
+            follow_graph.follow_changed(follower_id, following_id, delta > 0)
+    for column, deltas in (("following_count", following_deltas), ("followers_count", followers_deltas)):
+        for profile_id, delta in deltas.items():
+            if delta:
+                bump_profile(profile_id, column, delta)
+
+
+write_behind.register("follow", set_follows, repos.follows.existing, missing_profiles)
+
+
+async def toggle_follow(follower_id: str, following_id: str, following: bool) -> bool:
+    return await submit_toggle(
+        "follow", follower_id, following_id, following,
+        lambda state: set_follow(follower_id, following_id, state))
+
+
+# FOLLOW a user (auth required, idempotent)
+
+
+@router.put("/users/{user_id}/follow")
 @router.post("/users/{user_id}/follow")
-def follow_user(user_id: str, user=Depends(get_current_user)):
+async def follow_user(user_id: str, user=Depends(get_current_user)):
     if user.id == user_id:
         raise HTTPException(
             status_code=400, detail="You cannot follow yourself")
 
-    # Check if already following
-    existing = db.table("follows").select(
-        "*").eq("follower_id", user.id).eq("following_id", user_id).execute()
-    if existing.data:
-        raise HTTPException(
-            status_code=400, detail="Already following this user")
-    response = db.table("follows").insert({
-        "follower_id": user.id,
-        "following_id": user_id
-    }).execute()
-    return {"message": "Followed successfully", "res": response.data}
+    following = await toggle_follow(user.id, user_id, True)
+    return {"message": "Followed successfully", "is_following": following}
 
 
-# UNFOLLOW a user (auth required)
+# UNFOLLOW a user (auth required, idempotent)
 
 
 @router.delete("/users/{user_id}/follow")
-def unfollow_user(user_id: str, user=Depends(get_current_user)):
-    existing = db.table("follows").select(
-        "*").eq("follower_id", user.id).eq("following_id", user_id).execute()
-    if not existing.data:
-        raise HTTPException(status_code=404, detail="Not following this user")
-
-    db.table("follows").delete().eq("follower_id", user.id).eq(
-        "following_id", user_id).execute()
-    return {"message": "Unfollowed successfully"}
+async def unfollow_user(user_id: str, user=Depends(get_current_user)):
+    following = await toggle_follow(user.id, user_id, False)
+    return {"message": "Unfollowed successfully", "is_following": following}
 
 
 # GET followers of a user (public)
 
 
 @router.get("/users/{user_id}/followers")
-def get_followers(user_id: str):
-    response = db.table("follows").select(
-        "follower_id, profiles!follows_follower_id_fkey(username, image_url)"
-    ).eq("following_id", user_id).execute()
-    return {
-        "count": len(response.data),
-        "followers": response.data,
+async def get_followers(
+    user_id: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    shape: Optional[str] = None,
+    loader: ProfileLoader = Depends(profile_loader),
+):
+    limit = page_size(limit)
+    normalize = normalized(shape)
+    count, (rows, next_cursor) = await asyncio.gather(
+        repos.profiles.counter(user_id, "followers_count"),
+        repos.follows.followers_page(user_id, limit, cursor, embed_profiles=not normalize),
+    )
+
+    body = {
+        "count": count,
+        "followers": rows,
+        "next_cursor": next_cursor,
         "message": "success"
     }
+    if normalize:
+        body["profiles"] = await profile_map(loader, rows, key="follower_id")
+    return body
 
 
 # GET following list of a user (public)
 
 
 @router.get("/users/{user_id}/following")
-def get_following(user_id: str):
-    response = db.table("follows").select(
-        "following_id, profiles!follows_following_id_fkey(username, image_url)"
-    ).eq("follower_id", user_id).execute()
-    return {
-        "count": len(response.data),
-        "following": response.data,
+async def get_following(
+    user_id: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    shape: Optional[str] = None,
+    loader: ProfileLoader = Depends(profile_loader),
+):
+    limit = page_size(limit)
+    normalize = normalized(shape)
+    count, (rows, next_cursor) = await asyncio.gather(
+        repos.profiles.counter(user_id, "following_count"),
+        repos.follows.following_page(user_id, limit, cursor, embed_profiles=not normalize),
+    )
+
+    body = {
+        "count": count,
+        "following": rows,
+        "next_cursor": next_cursor,
         "message": "success"
     }
+    if normalize:
+        body["profiles"] = await profile_map(loader, rows, key="following_id")
+    return body
 
 
 # CHECK if current user follows someone (auth)
 
 
 @router.get("/users/{user_id}/is-following")
-def is_following(user_id: str, user=Depends(get_current_user)):
+async def is_following(user_id: str, user=Depends(get_current_user)):
     if user.id == user_id:
         return {"is_following": False}
 
-    response = db.table("follows").select(
-        "*").eq("follower_id", user.id).eq("following_id", user_id).execute()
-    return {"is_following": bool(response.data)}
+    following = pending_state("follow", user.id, user_id)
+    if following is None:
+        following = await repos.follows.exists(user.id, user_id)
+    return {"is_following": following}
+
+
+# WHO TO FOLLOW: friends of friends, ranked by shared followees and liked categories (auth)
+
+
+@router.get("/users/suggestions")
+async def follow_suggestions(
+    limit: int = DEFAULT_PAGE_SIZE,
+    user=Depends(get_current_user),
+    loader: ProfileLoader = Depends(profile_loader),
+):
+    if not follow_graph.follow_suggestions.ready:
+        raise HTTPException(
+            status_code=503, detail="Suggestions are warming up", headers={"Retry-After": "5"})
+
+    limit = page_size(limit)
+    affinity = await follow_graph.category_affinity(user.id)
+    # write-behind follows not in the graph yet
+    ranked = [
+        row for row in follow_graph.follow_suggestions.graph.suggest(user.id, limit * 2, affinity)
+        if not pending_state("follow", user.id, row[0])
+    ]
+    profiles = await loader.load(user_id for user_id, _, _ in ranked)
+
+    res = [
+        {**profiles[user_id], "user_id": user_id, "mutual": mutual, "score": score}
+        for user_id, mutual, score in ranked if user_id in profiles
+    ]
+    return {"res": res[:limit], "message": "success"}
@@ -1,6 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from collections import Counter
+from fastapi import APIRouter, Depends
+from typing import List, Optional
 from app.dependencies import get_current_user
-from app.config import db
+from app.config import DEFAULT_PAGE_SIZE
+from app.counters import bump_post
+from app.events import post_events
+from app.pagination import page_size
+from app.repositories import repos
+from app import trending
+from app.repositories.base import Pair
+from app.write_behind import missing_posts, pending_state, submit_toggle, write_behind
 
 router = APIRouter()
 
@@ -9,55 +19,82 @@ router = APIRouter()
 
 
 @router.get("/posts/{post_id}/likes")
-def get_likes(post_id: str):
-    response = db.table("likes").select(
-        "id, author_id").eq("post_id", post_id).execute()
+async def get_likes(post_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    limit = page_size(limit)
+    count, (rows, next_cursor) = await asyncio.gather(
+        repos.posts.counter(post_id, "likes_count"),
+        repos.likes.list_page(post_id, limit, cursor),
+    )
+
     return {
-        "count": len(response.data),
-        "res": response.data,
+        "count": count,
+        "res": rows,
+        "next_cursor": next_cursor,
         'message': "success"
     }
 
 
-# ADD like (auth required)
+# like / unlike in a single upstream call; only bumps the counter when a
+# row was actually inserted or deleted
 
 
-@router.post("/posts/{post_id}/likes")
-def add_like(post_id: str, user=Depends(get_current_user)):
-    # Check if already liked
-    existing = db.table("likes").select("*").eq("post_id",
-                                                post_id).eq("author_id", user.id).execute()
-    if existing.data:
-        raise HTTPException(
-            status_code=400, detail="You already liked this post")
+async def set_like(post_id: str, user_id: str, liked: bool) -> None:
+    if await repos.likes.set(post_id, user_id, liked):
+        delta = 1 if liked else -1
+        bump_post(post_id, "likes_count", delta)
+        trending.like_changed(post_id, delta)
+        post_events.publish(post_id, "likes", {"delta": delta, "user_id": user_id})
 
-    response = db.table("likes").insert({
-        "post_id": post_id,
-        "author_id": user.id
-    }).execute()
-    return {'message': "success", "res": response.data}
 
+# write-behind flush: one bulk write per batch, one counter bump per post
 
-# REMOVE like (auth required)
 
+async def set_likes(adds: List[Pair], removes: List[Pair]) -> None:
+    added, removed = await repos.likes.set_many(adds, removes)
+    deltas = Counter()
+    for delta, pairs in ((1, added), (-1, removed)):
+        for post_id, user_id in pairs:
+            deltas[post_id] += delta
+            trending.like_changed(post_id, delta)
+            post_events.publish(post_id, "likes", {"delta": delta, "user_id": user_id})
+    for post_id, delta in deltas.items():
+        if delta:
+            bump_post(post_id, "likes_count", delta)
 
-@router.delete("/posts/{post_id}/likes")
-def remove_like(post_id: str, user=Depends(get_current_user)):
-    # Check if like exists
-    existing = db.table("likes").select("*").eq("post_id",
-                                                post_id).eq("author_id", user.id).execute()
-    if not existing.data:
-        raise HTTPException(status_code=404, detail="Like not found")
 
-    db.table("likes").delete().eq("post_id", post_id).eq(
-        "author_id", user.id).execute()
-    return {"message": "Like removed"}
+write_behind.register("like", set_likes, repos.likes.existing, missing_posts)
+
+
+async def toggle_like(post_id: str, user_id: str, liked: bool) -> bool:
+    return await submit_toggle(
+        "like", post_id, user_id, liked,
+        lambda state: set_like(post_id, user_id, state))
+
+
+# ADD like (auth required, idempotent)
+
+
+@router.put("/posts/{post_id}/likes")
+@router.post("/posts/{post_id}/likes")
+async def add_like(post_id: str, user=Depends(get_current_user)):
+    liked = await toggle_like(post_id, user.id, True)
+    return {'message': "success", "liked": liked}
+
+
+# REMOVE like (auth required, idempotent)
+
+
+@router.delete("/posts/{post_id}/likes")
+async def remove_like(post_id: str, user=Depends(get_current_user)):
+    liked = await toggle_like(post_id, user.id, False)
+    return {"message": "Like removed", "liked": liked}
 
 
 #  checking does user liked!
 
 @router.get("/posts/{post_id}/likes/check")
-def check_like(post_id: str, user=Depends(get_current_user)):
-    existing = db.table("likes").select("id").eq(
-        "post_id", post_id).eq("author_id", user.id).execute()
-    return {"liked": bool(existing.data)}
+async def check_like(post_id: str, user=Depends(get_current_user)):
+    liked = pending_state("like", post_id, user.id)
+    if liked is None:
+        liked = await repos.likes.exists(post_id, user.id)
+    return {"liked": liked}
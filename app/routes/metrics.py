@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.metrics import render
+
+router = APIRouter()
+
+
+# Prometheus scrape endpoint: latency, response size and upstream calls per route
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=render(), media_type=CONTENT_TYPE_LATEST)
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
-from typing import List, Optional
-from pydantic import BaseModel
-from app.config import db
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
+from typing import Optional
+from app.config import DEFAULT_PAGE_SIZE
 from app.dependencies import get_current_user, upload_image
-from fastapi.responses import JSONResponse
+from app.counters import bump_profile
+from app.pagination import page_size, encode_cursor, decode_cursor
+from app.fields import FULL_FIELDS, post_fields, summarize
+from app.profile_loader import ProfileLoader, forget_summary, normalized, without_profiles, profile_loader, profile_map
+from app.repositories import repos
+from app import follow_graph, timeline
+from app.search import post_search, index_post, unindex_post
+from app.trending import post_trending, post_changed, post_removed
+from app.response_cache import cached_json, invalidate_posts, all_posts_tag, any_author_tag, author_tag, category_tag
+from app.http_cache import conditional_json, post_tag, POST_CACHE_CONTROL
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
@@ -13,50 +21,205 @@ router = APIRouter(prefix="/posts", tags=["posts"])
 # PUBLIC ENDPOINTS
 
 @router.get("/")
-def get_all_posts():
+async def get_all_posts(
+    request: Request,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    shape: Optional[str] = None,
+    loader: ProfileLoader = Depends(profile_loader),
+):
     """
-    Get all posts (public).
+    Get all posts (public), newest first, one page at a time. Rows carry
+    the excerpt, not the body, unless `fields` asks for `content`.
     """
-    response = db.table("posts").select(
-        "*, categories(name), profiles(username, image_url)"
-    ).order("created_at", desc=True).execute()
-
-    return {'message': "success", "res": response.data}
+    limit = page_size(limit)
+    names = post_fields(fields)
+    normalize = normalized(shape)
+    if normalize:
+        names = without_profiles(names)
+
+    async def build():
+        rows, next_cursor = await repos.posts.list_page(names, limit, cursor)
+        body = {'message': "success", "res": rows, "next_cursor": next_cursor}
+        if normalize:
+            body["profiles"] = await profile_map(loader, rows)
+        return body
+
+    return await cached_json(
+        ("posts", names, normalize, limit, cursor), [all_posts_tag()], build, request)
     # return JSONResponse({'message': "success", "res": response.data}, status_code=status.HTTP_200_OK)
 
 
+# full-text search over titles and bodies, best match first
+@router.get("/search")
+async def search_posts(
+    request: Request,
+    q: str,
+    category_id: Optional[str] = None,
+    author_id: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    shape: Optional[str] = None,
+    loader: ProfileLoader = Depends(profile_loader),
+):
+    """
+    Search posts (public). Words match as typed, as a prefix of a longer
+    word, or with one typo; every word has to match. Rows carry a `score`.
+    """
+    if not post_search.ready:
+        raise HTTPException(
+            status_code=503, detail="Search is warming up", headers={"Retry-After": "5"})
+
+    limit = page_size(limit)
+    names = post_fields(fields)
+    normalize = normalized(shape)
+    if normalize:
+        names = without_profiles(names)
+
+    after = None
+    if cursor:
+        score, last_id = decode_cursor(cursor)
+        try:
+            after = (float(score), last_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async def build():
+        hits = post_search.index.search(
+            q, limit + 1, after, author_id=author_id, category_id=category_id)
+        more = len(hits) > limit
+        hits = hits[:limit]
+
+        rows = await repos.posts.by_ids([post_id for post_id, _ in hits], names) if hits else []
+        by_id = {row["id"]: row for row in rows}
+        # ranked order; a post deleted by another worker is just skipped
+        ranked = [{**by_id[post_id], "score": score} for post_id, score in hits if post_id in by_id]
+
+        next_cursor = None
+        if more:
+            last_id, last_score = hits[-1]
+            next_cursor = encode_cursor(repr(last_score), last_id)
+        body = {"message": "success", "res": ranked, "next_cursor": next_cursor}
+        if normalize:
+            body["profiles"] = await profile_map(loader, ranked)
+        return body
+
+    key = ("search", q.strip().lower(), category_id, author_id, names, normalize, limit, cursor)
+    return await cached_json(key, [all_posts_tag()], build, request)
+
+
+# most liked and commented lately, optionally within one category
+@router.get("/trending")
+async def trending_posts(
+    request: Request,
+    category_id: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    shape: Optional[str] = None,
+    loader: ProfileLoader = Depends(profile_loader),
+):
+    """
+    Trending posts (public), hottest first. Every like and comment counts,
+    less the older it is; rows carry the resulting `score`.
+    """
+    if not post_trending.ready:
+        raise HTTPException(
+            status_code=503, detail="Trending is warming up", headers={"Retry-After": "5"})
+
+    limit = page_size(limit)
+    names = post_fields(fields)
+    normalize = normalized(shape)
+    if normalize:
+        names = without_profiles(names)
+
+    after = None
+    if cursor:
+        rank, last_id = decode_cursor(cursor)
+        try:
+            after = (float(rank), last_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async def build():
+        index = post_trending.index
+        hits = index.top(limit + 1, category_id, after)
+        more = len(hits) > limit
+        hits = hits[:limit]
+
+        rows = await repos.posts.by_ids([post_id for post_id, _ in hits], names) if hits else []
+        by_id = {row["id"]: row for row in rows}
+        ranked = [
+            {**by_id[post_id], "score": round(index.current(rank), 4)}
+            for post_id, rank in hits if post_id in by_id
+        ]
+
+        next_cursor = None
+        if more:
+            last_id, last_rank = hits[-1]
+            next_cursor = encode_cursor(repr(last_rank), last_id)
+        body = {"message": "success", "res": ranked, "next_cursor": next_cursor}
+        if normalize:
+            body["profiles"] = await profile_map(loader, ranked)
+        return body
+
+    # the ranking moves with every like, so pages lag it by up to the cache TTL
+    key = ("trending", category_id, names, normalize, limit, cursor)
+    return await cached_json(key, [all_posts_tag()], build, request)
+
+
 @router.get("/{post_id}")
-def get_post(post_id: str):
+async def get_post(post_id: str, request: Request):
     """
     Get a single post by ID (public).
     """
-    response = db.table("posts").select(
-        "*, categories(name), profiles(username, image_url)"
-    ).eq("id", post_id).single().execute()
+    async def build():
+        post = await repos.posts.get(post_id, FULL_FIELDS)
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
+        # edits, counter bumps, and author or category renames (embedded)
+        tags = [post_tag(post_id), author_tag(post["author_id"]), category_tag(post.get("category_id"))]
+        return {'message': "success", "res": post}, tags
 
-    if not response.data:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    return {'message': "success", "res": response.data}
+    return await conditional_json(request, ("post", post_id), build, POST_CACHE_CONTROL)
 
 
 # get posts by user id
 @router.get("/all/{author_id}")
-def get_posts_by_author(author_id: str):
-    try:
-        response = (
-            db.table("posts")
-            .select("id, title, content, cover_image_url, created_at, profiles(username, image_url)")
-            .eq("author_id", author_id)
-            .order("created_at", desc=True)
-            .execute()
-        )
-
-        return {
-            "count": len(response.data),
-            "posts": response.data,
+async def get_posts_by_author(
+    author_id: str,
+    request: Request,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    shape: Optional[str] = None,
+    loader: ProfileLoader = Depends(profile_loader),
+):
+    limit = page_size(limit)
+    names = post_fields(fields)
+    normalize = normalized(shape)
+    if normalize:
+        names = without_profiles(names)
+
+    async def build():
+        rows, next_cursor = await repos.posts.list_page(names, limit, cursor, author_id=author_id)
+        body = {
+            "count": len(rows),
+            "posts": rows,
+            "next_cursor": next_cursor,
             "message": "success"
         }
+        if normalize:
+            body["profiles"] = await profile_map(loader, rows)
+        return body
+
+    try:
+        return await cached_json(
+            ("author", author_id, names, normalize, limit, cursor), [author_tag(author_id), any_author_tag()], build, request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -72,24 +235,32 @@ async def create_post(
     file: UploadFile = File(None),
     user=Depends(get_current_user),
 ):
-    cover_image_url = None
+    cover = None
     if file:
-        cover_image_url = await upload_image(file, folder=f"posts", user_id=user.id)
+        cover = await upload_image(file, folder="posts", user_id=user.id)
 
     data = {
         "title": title,
         "content": content,
-        "cover_image_url": cover_image_url,
+        **summarize(content),
+        "cover_image_url": cover["url"] if cover else None,
+        "cover_image_variants": cover["variants"] if cover else None,
         "category_id": category_id,
         "author_id": user.id,
     }
 
-    response = db.table("posts").insert(data).execute()
+    post = await repos.posts.create(data)
 
-    if not response.data:
+    if not post:
         raise HTTPException(status_code=400, detail="Post creation failed")
 
-    return {"message": "success", "res": response.data[0]}
+    invalidate_posts(user.id, category_id)
+    forget_summary(user.id)
+    index_post(post)
+    bump_profile(user.id, "posts_count", 1)
+    timeline.post_created(post)
+    follow_graph.post_created(post)
+    return {"message": "success", "res": post}
 
 
 
@@ -102,57 +273,51 @@ async def update_post(
     file: UploadFile = File(None),
     user=Depends(get_current_user),
 ):
-    # Check if post exists
-    existing = db.table("posts").select("author_id").eq(
-        "id", post_id).single().execute()
-    if not existing.data:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    # Only author can update
-    if existing.data["author_id"] != user.id:
-        raise HTTPException(
-            status_code=403, detail="Not allowed to edit this post")
-
     # Collect update data
     update_data = {}
     if title is not None:
         update_data["title"] = title
     if content is not None:
         update_data["content"] = content
+        update_data.update(summarize(content))
     if category_id is not None:
         update_data["category_id"] = category_id
 
     # Handle file upload if provided
     if file:
-        cover_image_url = await upload_image(file, folder=f"posts", user_id=user.id)
-        update_data["cover_image_url"] = cover_image_url
+        cover = await upload_image(file, folder="posts", user_id=user.id)
+        update_data["cover_image_url"] = cover["url"]
+        update_data["cover_image_variants"] = cover["variants"]
 
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    # Update DB
-    response = db.table("posts").update(
-        update_data).eq("id", post_id).execute()
-
-    if not response.data:
-        raise HTTPException(status_code=400, detail="Post update failed")
+    # Update DB, only if the caller is the author
+    moved = "category_id" in update_data
+    post, before = await repos.posts.update(
+        post_id, user.id, update_data, previous=("category_id",) if moved else ())
 
-    return {"message": "success", "res": response.data[0]}
+    invalidate_posts(user.id, post["category_id"], before.get("category_id"))
+    forget_summary(user.id)
+    index_post(post)
+    post_changed(post)
+    if moved and before.get("category_id") != post["category_id"]:
+        follow_graph.post_deleted({**post, **before})
+        follow_graph.post_created(post)
+    return {"message": "success", "res": post}
 
 
 @router.delete("/{post_id}")
-def delete_post(post_id: str, user=Depends(get_current_user)):
+async def delete_post(post_id: str, user=Depends(get_current_user)):
     """
     Delete a post (only by author).
     """
-    existing = db.table("posts").select("author_id").eq(
-        "id", post_id).single().execute()
-    if not existing.data:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    if existing.data["author_id"] != user.id:
-        raise HTTPException(
-            status_code=403, detail="Not allowed to delete this post")
-
-    db.table("posts").delete().eq("id", post_id).execute()
+    post = await repos.posts.delete(post_id, user.id)
+
+    invalidate_posts(user.id, post["category_id"])
+    forget_summary(user.id)
+    unindex_post(post_id)
+    post_removed(post_id)
+    follow_graph.post_deleted(post)
+    bump_profile(user.id, "posts_count", -1)
     return {"message": "Post deleted successfully"}
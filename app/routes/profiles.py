@@ -1,6 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Body, File, UploadFile
-from app.config import db
-from app.dependencies import get_current_user, upload_image
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Body, File, UploadFile, Request
+from app.config import PROFILE_SUMMARY_CACHE_TTL, PROFILE_SUMMARY_POSTS
+from app.dependencies import get_current_user, get_optional_user, upload_image
+from app.fields import LIST_FIELDS
+from app.http_cache import conditional_json, profile_tag, PROFILE_CACHE_CONTROL, PRIVATE_CACHE_CONTROL
+from app.pagination import page_size
+from app.repositories import repos
+from app.response_cache import invalidate_posts
+from app.profile_loader import forget_profile, summary_cache, summary_tag, without_profiles
+from app.write_behind import pending_state
 
 router = APIRouter()
 
@@ -8,29 +17,99 @@ router = APIRouter()
 # GET a user profile (public)
 
 @router.get("/profiles/{user_id}")
-def get_profile(user_id: str):
-    response = db.table("profiles").select(
-        "*").eq("id", user_id).single().execute()
-    if not response.data:
+async def get_profile(user_id: str, request: Request):
+    return await conditional_json(request, ("profile", user_id), _profile_body(user_id), PROFILE_CACHE_CONTROL)
+
+
+def _profile_body(user_id: str):
+    async def build():
+        profile = await repos.profiles.get(user_id)
+        if not profile:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return {"message": "success", "res": profile}, [profile_tag(user_id)]
+    return build
+
+
+# GET a whole profile page in one call (public, richer when signed in)
+
+
+# the author is the profile itself, so posts skip the embed
+SUMMARY_POST_FIELDS = without_profiles(LIST_FIELDS)
+
+
+async def _public_summary(user_id: str, limit: int) -> dict:
+    key = (user_id, limit)
+    summary = summary_cache.get(key)
+    if summary is not None:
+        return summary
+
+    # a summary built while its profile or posts changed is served, not stored
+    stamp = summary_cache.stamp()
+    profile, (posts, next_cursor) = await asyncio.gather(
+        repos.profiles.get(user_id),
+        repos.posts.list_page(SUMMARY_POST_FIELDS, limit, author_id=user_id),
+    )
+    if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
-    return {"message": "success", "res": response.data}
+
+    summary = {"profile": profile, "recent_posts": posts, "next_cursor": next_cursor}
+    summary_cache.set(key, summary, tags=[summary_tag(user_id)], stamp=stamp)
+    return summary
+
+
+async def _viewer_follows(viewer, user_id: str) -> Optional[bool]:
+    if viewer is None:
+        return None
+    if viewer.id == user_id:
+        return False
+    following = pending_state("follow", viewer.id, user_id)
+    if following is None:
+        following = await repos.follows.exists(viewer.id, user_id)
+    return following
+
+
+@router.get("/profiles/{user_id}/summary")
+async def get_profile_summary(
+    user_id: str,
+    request: Request,
+    posts: int = PROFILE_SUMMARY_POSTS,
+    viewer=Depends(get_optional_user),
+):
+    """
+    The profile row (with its follower, following and post counters), the
+    newest `posts` posts with a cursor to continue on /posts/all/{user_id},
+    and `is_following`: whether the signed-in viewer follows the profile,
+    null when anonymous.
+    """
+    limit = page_size(posts)
+
+    async def build():
+        summary, following = await asyncio.gather(
+            _public_summary(user_id, limit),
+            _viewer_follows(viewer, user_id),
+        )
+        # counter bumps (the viewer's follow among them) and what drops the
+        # public part; kept no longer than that part, which lags follows
+        tags = [summary_tag(user_id), profile_tag(user_id)]
+        return {"message": "success", "res": {**summary, "is_following": following}}, tags
+
+    # varies with the viewer's cookie: never stored by shared caches
+    key = ("summary", user_id, limit, viewer.id if viewer else None)
+    return await conditional_json(request, key, build, PRIVATE_CACHE_CONTROL, ttl=PROFILE_SUMMARY_CACHE_TTL)
 
 
 # GET my own profile (auth)
 
 @router.get("/profile/me")
-def get_my_profile(user=Depends(get_current_user)):
-    response = db.table("profiles").select(
-        "*").eq("id", user.id).single().execute()
-    if not response.data:
-        raise HTTPException(status_code=404, detail="Profile not found")
-    return {"message": "success", "res": response.data}
+async def get_my_profile(request: Request, user=Depends(get_current_user)):
+    # the same body as the public route, so the same kept ETag
+    return await conditional_json(request, ("profile", user.id), _profile_body(user.id), PRIVATE_CACHE_CONTROL)
 
 
 # UPDATE my profile (auth)
 
 @router.put("/profile/me")
-def update_profile(
+async def update_profile(
     body: dict = Body(...),
     user=Depends(get_current_user),
     file: UploadFile = File(...)
@@ -40,12 +119,17 @@ def update_profile(
         update_data["username"] = body["username"]
     if "bio" in body:
         update_data["bio"] = body["bio"]
-    if File:
-        update_data["image_url"] = upload_image(file, folder=f"profiles/{user.id}")
+    if file:
+        image = await upload_image(file, folder="profiles", user_id=user.id)
+        update_data["image_url"] = image["url"]
+        update_data["image_variants"] = image["variants"]
 
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    response = db.table("profiles").update(
-        update_data).eq("id", user.id).execute()
-    return {"message": "Profile updated", "res": response.data}
+    profile = await repos.profiles.update(user.id, update_data)
+    forget_profile(user.id)
+    if "username" in update_data or "image_url" in update_data:
+        # every feed the user's posts are in embeds their profile
+        invalidate_posts(user.id, any_category=True)
+    return {"message": "Profile updated", "res": profile}
@@ -1,12 +1,14 @@
 
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form, Request, Response
+import asyncio
+from fastapi import APIRouter, HTTPException, File, UploadFile, Form, Request, Response
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from datetime import date
 from supabase import AuthApiError
 from app.config import db, db_admin
-from app.dependencies import get_current_user, upload_image
+from app.dependencies import invalidate_token
+from app.repositories import repos
+from app.images import stage_image, promote_image, promoted_path, describe_image, discard_images
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -24,6 +26,28 @@ class RefreshRequest(BaseModel):
 
 
 
+def _signup_error(e: Exception) -> HTTPException:
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, AuthApiError):
+        if "User already registered" in e.message:
+            return HTTPException(
+                status_code=409, detail="Email already registered. Please login.")
+        return HTTPException(
+            status_code=500, detail=f"An unexpected error occurred: {e.message}")
+    return HTTPException(status_code=500, detail=f"Failed to create profile: {str(e)}")
+
+
+async def _rollback_signup(user_id: Optional[str], image_paths: list):
+    # CLEANUP: remove whatever the concurrent steps managed to create
+    cleanups = []
+    if user_id:
+        cleanups.append(db_admin.auth.admin.delete_user(user_id))
+    if image_paths:
+        cleanups.append(discard_images(*image_paths))
+    await asyncio.gather(*cleanups, return_exceptions=True)
+
+
 @router.post("/signup")
 async def signup(
     email: EmailStr = Form(...),
@@ -32,113 +56,113 @@ async def signup(
     gender: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None)
 ):
+    # the avatar's format is sniffed from its bytes by `stage_image`, not
+    # taken from the client's content type
+
     # 1. Check if username already exists
-    existing_username_res = db.table("profiles").select(
-        "id").eq("username", username).execute()
-    if existing_username_res.data:
+    if await repos.profiles.username_taken(username):
         raise HTTPException(
             status_code=409,  # 409 Conflict is more appropriate
             detail="Username already taken. Please choose another."
         )
 
-    # 2. Register user in Supabase Auth
-    new_user = None
-    try:
-        response = db.auth.sign_up({
+    # 2. Register the user in Supabase Auth while the avatar is uploaded
+    #    under a staging key, since the user id is not known yet
+    response, staged = await asyncio.gather(
+        db.auth.sign_up({
             "email": email,
             "password": password
-        })
+        }),
+        stage_image(file) if file else asyncio.sleep(0),
+        return_exceptions=True,
+    )
+    staged_paths = [staged["path"]] if isinstance(staged, dict) else []
+
+    # only a user handed back with a session was created by this request;
+    # without one it may be an existing, unconfirmed account
+    new_user = None
+    session = None
+    if not isinstance(response, BaseException) and response.user and response.session:
         new_user = response.user
         session = response.session
 
-        if not new_user or not session:
-            raise HTTPException(
-                status_code=500, detail="Signup failed to create user or session.")
-
-    except AuthApiError as e:
-        if "User already registered" in e.message:
-            raise HTTPException(
-                status_code=409, detail="Email already registered. Please login.")
-        raise HTTPException(
-            status_code=500, detail=f"An unexpected error occurred: {e.message}")
-
-    # 3. Handle Profile Creation and Image Upload
-    image_url = None
+    error = None
+    if isinstance(response, BaseException):
+        error = _signup_error(response)
+    elif not new_user:
+        error = HTTPException(
+            status_code=500, detail="Signup failed to create user or session.")
+    elif isinstance(staged, BaseException):
+        error = _signup_error(staged)
+
+    if error:
+        await _rollback_signup(new_user.id if new_user else None, staged_paths)
+        raise error
+
+    # 3. Promote the avatar to its final key while the profile is inserted
+    image = None
     try:
-        # Upload image if provided
-        if file:
-            # Check for valid image content type
-            if not file.content_type.startswith("image/"):
-                raise HTTPException(
-                    status_code=400, detail="Invalid file type. Please upload an image.")
-
-            # The folder is now just "profiles" and the filename is unique
-            image_url = await upload_image(
-                file, folder="profiles", user_id=new_user.id)
+        writes = []
+        if staged:
+            image = await describe_image(
+                promoted_path(staged, folder="profiles", user_id=new_user.id))
+            writes.append(promote_image(staged, folder="profiles", user_id=new_user.id))
 
         # Insert profile into the "profiles" table
-        db.table("profiles").insert({
+        writes.append(repos.profiles.create({
             "id": new_user.id,
             "username": username,
-            "image_url": image_url,
+            "image_url": image["url"] if image else None,
+            "image_variants": image["variants"] if image else None,
             "gender": gender,
-        }).execute()
-
-        access_token = response.session.access_token
-        refresh_token = response.session.refresh_token
-        user = response.session.user
-
-        # Build response
-        resp = JSONResponse({
-            "access_token": session.access_token,
-            "refresh_token": session.refresh_token,
-            "user": {
-                "id": user.id,
-                "email": user.email,
-                "username": user.user_metadata.get("username"),
-                "gender": user.user_metadata.get("gender"),
-            }
-        })
-
-        # Attach cookies
-        resp.set_cookie(
-            key="access_token",
-            value=access_token,
-            httponly=True,
-            secure=True,      # keep True in production (use HTTPS)
-            samesite="Lax"    # or "None" if cross-site frontend/backend
-        )
-        resp.set_cookie(
-            key="refresh_token",
-            value=refresh_token,
-            httponly=True,
-            secure=True,
-            samesite="Lax"
-        )
-
-        return resp
+        }))
+        await asyncio.gather(*writes)
 
     except Exception as e:
-        # CLEANUP: If profile creation or image upload fails, delete the created user
-        if new_user:
-            db_admin.auth.admin.delete_user(new_user.id)
+        await _rollback_signup(
+            new_user.id, staged_paths + ([image["path"]] if image else []))
+        raise HTTPException(status_code=500, detail=_signup_error(e).detail)
 
-        # Re-raise the exception or raise a new one
-        detail = f"Failed to create profile: {str(e)}"
-        if isinstance(e, HTTPException):
-            detail = e.detail  # Preserve original error message if it's an HTTPException
+    access_token = session.access_token
+    refresh_token = session.refresh_token
+    user = session.user
 
-        raise HTTPException(
-            status_code=500,
-            detail=detail
-        )
+    # Build response
+    resp = JSONResponse({
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "user": {
+            "id": user.id,
+            "email": user.email,
+            "username": user.user_metadata.get("username"),
+            "gender": user.user_metadata.get("gender"),
+        }
+    })
+
+    # Attach cookies
+    resp.set_cookie(
+        key="access_token",
+        value=access_token,
+        httponly=True,
+        secure=True,      # keep True in production (use HTTPS)
+        samesite="Lax"    # or "None" if cross-site frontend/backend
+    )
+    resp.set_cookie(
+        key="refresh_token",
+        value=refresh_token,
+        httponly=True,
+        secure=True,
+        samesite="Lax"
+    )
+
+    return resp
 
 # LOGIN
 
 
 @router.post("/login")
-def login(data: LoginRequest):
-    response = db.auth.sign_in_with_password({
+async def login(data: LoginRequest):
+    response = await db.auth.sign_in_with_password({
         "email": data.email,
         "password": data.password
     })
@@ -183,17 +207,20 @@ def login(data: LoginRequest):
 
 
 @router.post("/refresh")
-def refresh_token(request: Request, response: Response):
+async def refresh_token(request: Request, response: Response):
     refresh_token = request.cookies.get("refresh_token")
     if not refresh_token:
         raise HTTPException(status_code=401, detail="No refresh token cookie")
 
-    session_response = db.auth.refresh_session(refresh_token)
+    session_response = await db.auth.refresh_session(refresh_token)
     if not session_response.session:
         raise HTTPException(status_code=400, detail="Invalid refresh token")
 
     session = session_response.session
 
+    # the old access token is being replaced, stop serving it from cache
+    invalidate_token(request.cookies.get("access_token"))
+
     # set new cookies
     response.set_cookie(
         key="access_token",
@@ -218,5 +245,23 @@ def refresh_token(request: Request, response: Response):
             "email": session.user.email
         }
     }
-    
-    
+
+
+# LOGOUT
+
+
+@router.post("/logout")
+async def logout(request: Request, response: Response):
+    access_token = request.cookies.get("access_token")
+    invalidate_token(access_token)
+
+    if access_token:
+        try:
+            await db_admin.auth.admin.sign_out(access_token, scope="local")
+        except AuthApiError:
+            # already expired or revoked, nothing left to end
+            pass
+
+    response.delete_cookie("access_token")
+    response.delete_cookie("refresh_token")
+    return {"message": "Logged out"}
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, Request
+from typing import Optional
+from app.config import DEFAULT_PAGE_SIZE
+from app.dependencies import get_current_user
+from app.pagination import page_size
+from app.timeline import read_timeline
+from app.fields import post_fields
+from app.profile_loader import ProfileLoader, normalized, without_profiles, profile_loader, profile_map
+from app.http_cache import conditional_json, timeline_tag, PRIVATE_CACHE_CONTROL
+from app.response_cache import all_posts_tag
+
+router = APIRouter()
+
+
+# GET posts from followed authors (auth required)
+
+
+@router.get("/timeline")
+async def get_timeline(
+    request: Request,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    shape: Optional[str] = None,
+    user=Depends(get_current_user),
+    loader: ProfileLoader = Depends(profile_loader),
+):
+    """
+    Posts from followed authors, newest first. Rows carry the excerpt, not
+    the body, unless `fields` asks for `content`.
+    """
+    limit = page_size(limit)
+    names = post_fields(fields)
+    normalize = normalized(shape)
+    if normalize:
+        names = without_profiles(names)
+
+    async def build():
+        rows, next_cursor = await read_timeline(user.id, limit, cursor, names)
+        body = {"posts": rows, "next_cursor": next_cursor, "message": "success"}
+        if normalize:
+            body["profiles"] = await profile_map(loader, rows)
+        # any post write (high-fanout authors are merged in at read time),
+        # and the user's own follows; counters lag like the feeds do
+        return body, [all_posts_tag(), timeline_tag(user.id)]
+
+    key = ("timeline", user.id, limit, cursor, names, normalize)
+    return await conditional_json(request, key, build, PRIVATE_CACHE_CONTROL)
@@ -0,0 +1,65 @@
+import asyncio
+from typing import List, Optional, Set
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from app.config import MAX_PAGE_SIZE
+from app.dependencies import get_current_user
+from app.repositories import repos
+from app.write_behind import pending_state
+
+router = APIRouter(tags=["viewer"])
+
+
+class ViewerStateRequest(BaseModel):
+    post_ids: List[str]
+
+
+def _overlay(ids: Set[str], target: str, pending: Optional[bool]) -> None:
+    if pending is True:
+        ids.add(target)
+    elif pending is False:
+        ids.discard(target)
+
+
+# liked / bookmarked / author-followed flags for a whole feed page (auth)
+
+
+@router.post("/posts/viewer-state")
+async def get_viewer_state(body: ViewerStateRequest, user=Depends(get_current_user)):
+    post_ids = list(dict.fromkeys(body.post_ids))
+    if len(post_ids) > MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"At most {MAX_PAGE_SIZE} posts per request")
+    if not post_ids:
+        return {"res": {}, "message": "success"}
+
+    liked, bookmarked, authors = await asyncio.gather(
+        repos.likes.among(user.id, post_ids),
+        repos.bookmarks.among(user.id, post_ids),
+        repos.posts.authors(post_ids),
+    )
+
+    author_ids = list(set(authors.values()) - {user.id})
+
+    followed = set()
+    if author_ids:
+        followed = await repos.follows.among(user.id, author_ids)
+
+    # toggles still on their way upstream win over what the database says
+    for post_id in post_ids:
+        _overlay(liked, post_id, pending_state("like", post_id, user.id))
+        _overlay(bookmarked, post_id, pending_state("bookmark", post_id, user.id))
+    for author_id in author_ids:
+        _overlay(followed, author_id, pending_state("follow", user.id, author_id))
+
+    return {
+        "res": {
+            post_id: {
+                "liked": post_id in liked,
+                "bookmarked": post_id in bookmarked,
+                "following_author": authors.get(post_id) in followed,
+            }
+            for post_id in post_ids
+        },
+        "message": "success"
+    }
@@ -0,0 +1,315 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.config import (
+    SEARCH_LOAD_BATCH,
+    SEARCH_MAX_EXPANSIONS,
+    SEARCH_MAX_TERMS,
+    SEARCH_REFRESH_INTERVAL,
+    SEARCH_TITLE_WEIGHT,
+)
+from app.repositories import repos
+
+logger = logging.getLogger(__name__)
+
+# in-process full-text index over post titles and bodies, ranked with BM25.
+# The post routes keep it current; a periodic rebuild picks up writes made
+# by other workers.
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# a query word also matches longer words it starts, and words one edit away,
+# at a discount against an exact match
+PREFIX_WEIGHT = 0.75
+TYPO_WEIGHT = 0.5
+TYPO_MIN_LENGTH = 4
+
+# the columns the index is built from
+INDEX_FIELDS = ("id", "title", "content", "author_id", "category_id", "created_at")
+
+# posts indexed between yields to the event loop during a build
+INDEX_YIELD_EVERY = 50
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Lowercased, accent-folded words of at least two characters.
+    """
+    if not text:
+        return []
+    folded = text.lower()
+    if not folded.isascii():
+        folded = unicodedata.normalize("NFKD", folded)
+        folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return [w for w in _WORD.findall(folded) if len(w) > 1]
+
+
+def _deletes(term: str) -> Set[str]:
+    # every way to drop one character; two words one edit apart share one
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class _Doc:
+    __slots__ = ("terms", "length", "author_id", "category_id")
+
+    def __init__(self, terms: Dict[str, int], length: int, author_id: Optional[str], category_id: Optional[str]):
+        self.terms = terms
+        self.length = length
+        self.author_id = author_id
+        self.category_id = category_id
+
+
+class SearchIndex:
+    """
+    Inverted index: term -> {post id: weighted term frequency}, plus a
+    sorted vocabulary for prefix lookups and a one-deletion map for typos.
+    Not thread-safe; it is only touched from the event loop.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._docs: Dict[str, _Doc] = {}
+        self._vocab: List[str] = []
+        self._typos: Dict[str, Set[str]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, post_id: str) -> bool:
+        return post_id in self._docs
+
+    def add(self, post: dict) -> None:
+        """
+        Index a post row, replacing any earlier version of it.
+        """
+        post_id = post["id"]
+        self.remove(post_id)
+
+        terms = Counter(tokenize(post.get("content")))
+        for term in tokenize(post.get("title")):
+            terms[term] += SEARCH_TITLE_WEIGHT
+
+        length = sum(terms.values())
+        self._docs[post_id] = _Doc(terms, length, post.get("author_id"), post.get("category_id"))
+        self._total_length += length
+
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._add_term(term)
+            postings[post_id] = tf
+
+    def remove(self, post_id: str) -> None:
+        doc = self._docs.pop(post_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc.length
+        for term in doc.terms:
+            postings = self._postings[term]
+            del postings[post_id]
+            if not postings:
+                del self._postings[term]
+                self._drop_term(term)
+
+    def _add_term(self, term: str) -> None:
+        bisect.insort(self._vocab, term)
+        if len(term) >= TYPO_MIN_LENGTH:
+            for variant in _deletes(term) | {term}:
+                self._typos.setdefault(variant, set()).add(term)
+
+    def _drop_term(self, term: str) -> None:
+        del self._vocab[bisect.bisect_left(self._vocab, term)]
+        if len(term) >= TYPO_MIN_LENGTH:
+            for variant in _deletes(term) | {term}:
+                terms = self._typos[variant]
+                terms.discard(term)
+                if not terms:
+                    del self._typos[variant]
+
+    def _expand(self, word: str) -> Dict[str, float]:
+        """
+        Indexed terms a query word matches, with their weights.
+        """
+        matches: Dict[str, float] = {}
+        if word in self._postings:
+            matches[word] = 1.0
+
+        start = bisect.bisect_left(self._vocab, word)
+        for term in self._vocab[start:start + SEARCH_MAX_EXPANSIONS + 1]:
+            if not term.startswith(word):
+                break
+            matches.setdefault(term, PREFIX_WEIGHT)
+
+        if len(word) >= TYPO_MIN_LENGTH:
+            for variant in _deletes(word) | {word}:
+                for term in self._typos.get(variant, ()):
+                    matches.setdefault(term, TYPO_WEIGHT)
+
+        if len(matches) > SEARCH_MAX_EXPANSIONS:
+            # keep the best weights, then the rarest terms
+            best = sorted(matches.items(), key=lambda m: (-m[1], len(self._postings[m[0]])))
+            matches = dict(best[:SEARCH_MAX_EXPANSIONS])
+        return matches
+
+    def _scores(self, word: str, allowed: Optional[Set[str]]) -> Dict[str, float]:
+        """
+        BM25 contribution of one query word per post; a post matching
+        several expansions of the word counts its best one.
+        """
+        n = len(self._docs)
+        average = self._total_length / n if n else 1.0
+        scores: Dict[str, float] = {}
+        for term, weight in self._expand(word).items():
+            postings = self._postings[term]
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for post_id, tf in postings.items():
+                if allowed is not None and post_id not in allowed:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._docs[post_id].length / average)
+                score = weight * idf * tf * (BM25_K1 + 1) / (tf + norm)
+                if score > scores.get(post_id, 0.0):
+                    scores[post_id] = score
+        return scores
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        after: Optional[Tuple[float, str]] = None,
+        author_id: Optional[str] = None,
+        category_id: Optional[str] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Up to `limit` (post id, score) pairs, best first, for posts matching
+        every query word. `after` is the last (score, id) of the previous page.
+        """
+        words = list(dict.fromkeys(tokenize(query)))[:SEARCH_MAX_TERMS]
+        if not words:
+            return []
+
+        # rarest word first: every later word only scores the survivors
+        words.sort(key=lambda w: len(self._postings.get(w, ())))
+        totals: Optional[Dict[str, float]] = None
+        for word in words:
+            allowed = set(totals) if totals is not None else None
+            scores = self._scores(word, allowed)
+            if totals is None:
+                totals = {
+                    post_id: score for post_id, score in scores.items()
+                    if self._matches_filters(post_id, author_id, category_id)
+                }
+            else:
+                totals = {post_id: totals[post_id] + score for post_id, score in scores.items()}
+            if not totals:
+                return []
+
+        ranked = ((round(score, 6), post_id) for post_id, score in totals.items())
+        if after is not None:
+            last_score, last_id = after
+            ranked = (
+                (score, post_id) for score, post_id in ranked
+                if score < last_score or (score == last_score and post_id > last_id)
+            )
+        best = heapq.nsmallest(limit, ranked, key=lambda r: (-r[0], r[1]))
+        return [(post_id, score) for score, post_id in best]
+
+    def _matches_filters(self, post_id: str, author_id: Optional[str], category_id: Optional[str]) -> bool:
+        doc = self._docs[post_id]
+        if author_id and doc.author_id != author_id:
+            return False
+        if category_id and doc.category_id != category_id:
+            return False
+        return True
+
+
+class PostSearch:
+    """
+    The live index plus the bookkeeping to (re)build it from the posts
+    table while writes keep landing.
+    """
+
+    def __init__(self):
+        self.index = SearchIndex()
+        # false until the first build finishes; searches get a 503 until then
+        self.ready = False
+        self._building: Optional[SearchIndex] = None
+        # posts written while a build pages through the table; the build
+        # must not overwrite them with the older row it read
+        self._touched: Set[str] = set()
+
+    def add(self, post: dict) -> None:
+        self.index.add(post)
+        if self._building is not None:
+            self._building.add(post)
+            self._touched.add(post["id"])
+
+    def remove(self, post_id: str) -> None:
+        self.index.remove(post_id)
+        if self._building is not None:
+            self._building.remove(post_id)
+            self._touched.add(post_id)
+
+    async def rebuild(self) -> None:
+        """
+        Build a fresh index from every post and swap it in.
+        """
+        self._building = SearchIndex()
+        self._touched = set()
+        try:
+            cursor = None
+            while True:
+                rows, cursor = await repos.posts.list_page(INDEX_FIELDS, SEARCH_LOAD_BATCH, cursor)
+                for i, row in enumerate(rows, 1):
+                    if row["id"] not in self._touched:
+                        self._building.add(row)
+                    if i % INDEX_YIELD_EVERY == 0:
+                        # indexing is CPU work on the event loop; let requests run
+                        await asyncio.sleep(0)
+                if not cursor:
+                    break
+            self.index = self._building
+        finally:
+            self._building = None
+            self._touched = set()
+        self.ready = True
+        logger.info("search index built: %d posts", len(self.index))
+
+    async def refresh_forever(self) -> None:
+        """
+        Build the index, then rebuild it at a fixed interval.
+        """
+        while True:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.warning("search index build failed: %s", e)
+                if not self.ready:
+                    # retry the first build sooner than a refresh
+                    await asyncio.sleep(5)
+                    continue
+            if SEARCH_REFRESH_INTERVAL <= 0:
+                return
+            await asyncio.sleep(SEARCH_REFRESH_INTERVAL)
+
+
+post_search = PostSearch()
+
+
+def index_post(post: dict) -> None:
+    post_search.add(post)
+
+
+def unindex_post(post_id: str) -> None:
+    post_search.remove(post_id)
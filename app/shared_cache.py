@@ -0,0 +1,398 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import stat
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Hashable, Iterable, List, Optional, Tuple
+
+import orjson
+
+# A TTLCache look-alike whose entries live in a memory-mapped file, so every
+# worker process on the node shares them. Layout:
+#
+#   header  magic, layout version, index slots, arena size, arena head,
+#           invalidation count, clear epoch
+#   tags    TAG_SLOTS version counters; a tag hashes to one of them
+#   index   buckets of BUCKET_SLOTS (key hash, arena position, length,
+#           epoch, expires_at)
+#   arena   a ring of records: tag versions, key, value
+#
+# The arena is written like a log: a record stays readable until the head
+# has moved a full arena past it, which is the eviction policy. Invalidating
+# a tag bumps its shared counter, so entries stored under the old version
+# stop matching in every process at once; nothing has to be broadcast.
+# A file lock serializes processes, a thread lock the threads of one.
+#
+# The files live in a directory only the service user can enter, and are
+# refused unless they are regular files of that user with mode 0600: the
+# auth caches are kept here, and another local user able to write them
+# could forge or revoke sessions. Values are raw bytes or JSON, never
+# pickles, so reading an entry never runs code.
+
+MAGIC = 0x57424C43  # "WBLC"
+LAYOUT = 2
+
+_HEADER = struct.Struct("<IIIxxxxQQQQ")
+HEADER_BYTES = 64
+TAG_SLOTS = 4096
+_TAG = struct.Struct("<Q")
+BUCKET_SLOTS = 8
+_SLOT = struct.Struct("<QQIId")
+_RECORD = struct.Struct("<IHBx")
+_RECORD_TAG = struct.Struct("<HQ")
+
+# value encodings: raw bytes are stored as-is, anything else as JSON
+_RAW = 0
+_JSON = 1
+
+# a single record may take at most this share of the arena
+MAX_RECORD_SHARE = 4
+
+
+def default_dir() -> str:
+    # tmpfs when there is one: the file is only ever a shared-memory handle
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def _private_dir(path: str) -> None:
+    """
+    Create `path` with mode 0700, or check that the existing one is a real
+    directory of ours that nobody else can enter.
+    """
+    try:
+        os.mkdir(path, 0o700)
+        os.chmod(path, 0o700)  # whatever the umask took away
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) != 0o700:
+        raise PermissionError(f"{path} must be a directory owned by uid {os.getuid()} with mode 0700")
+
+
+def _open_private(path: str) -> int:
+    """
+    Open (creating it 0600 if missing) a cache file that must be a regular
+    file of ours with mode 0600; symlinks are never followed.
+    """
+    flags = os.O_RDWR | os.O_NOFOLLOW | os.O_CLOEXEC
+    try:
+        fd = os.open(path, flags | os.O_CREAT | os.O_EXCL, 0o600)
+        os.fchmod(fd, 0o600)
+        return fd
+    except FileExistsError:
+        fd = os.open(path, flags)
+    st = os.fstat(fd)
+    if not stat.S_ISREG(st.st_mode) or st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) != 0o600:
+        os.close(fd)
+        raise PermissionError(f"{path} must be a regular file owned by uid {os.getuid()} with mode 0600")
+    return fd
+
+
+def _hash(data: bytes) -> int:
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little") or 1
+
+
+def _key_bytes(key: Hashable) -> bytes:
+    # keys are tuples of str/int/None; repr is stable for those across processes
+    return repr(key).encode()
+
+
+class SharedCache:
+    """
+    Shared-memory cache with the TTLCache interface. Values are `bytes`,
+    stored as they are, or anything orjson can serialize, which comes back
+    as its JSON form (tuples as lists, models as whatever was dumped).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 1024,
+        max_bytes: Optional[int] = None,
+        ttl: float = 60,
+        directory: Optional[str] = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.directory = os.path.join(directory or default_dir(), f"wblog-{os.getuid()}")
+        self.path = os.path.join(self.directory, f"{name}.cache")
+
+        buckets = 1
+        while buckets * BUCKET_SLOTS < max_entries * 2:
+            buckets *= 2
+        self.buckets = buckets
+        self.index_slots = buckets * BUCKET_SLOTS
+        self.arena_size = max_bytes or 8 * 1024 * 1024
+
+        self._tags_at = HEADER_BYTES
+        self._index_at = self._tags_at + TAG_SLOTS * _TAG.size
+        self._arena_at = self._index_at + self.index_slots * _SLOT.size
+        self.file_size = self._arena_at + self.arena_size
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map: Optional[mmap.mmap] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # mapping
+
+    def _attach(self) -> mmap.mmap:
+        # a forked child must not share the parent's descriptor: flock
+        # locks belong to the open file, so both would hold "the" lock
+        if self._pid == os.getpid():
+            return self._map
+
+        _private_dir(self.directory)
+        fd = _open_private(self.path)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size != self.file_size or not self._valid_header(fd):
+                # first process up, or a different layout/size: start empty
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.file_size)
+                header = _HEADER.pack(MAGIC, LAYOUT, self.index_slots, self.arena_size, 0, 0, 1)
+                os.pwrite(fd, header, 0)
+            self._map = mmap.mmap(fd, self.file_size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._pid = os.getpid()
+        return self._map
+
+    def _valid_header(self, fd: int) -> bool:
+        raw = os.pread(fd, _HEADER.size, 0)
+        if len(raw) < _HEADER.size:
+            return False
+        magic, layout, slots, arena, *_ = _HEADER.unpack(raw)
+        return (magic, layout, slots, arena) == (MAGIC, LAYOUT, self.index_slots, self.arena_size)
+
+    def _locked(self, exclusive: bool):
+        return _FileLock(self, exclusive)
+
+    def _header(self, m: mmap.mmap) -> Tuple[int, int, int]:
+        _, _, _, _, head, invalidations, epoch = _HEADER.unpack_from(m, 0)
+        return head, invalidations, epoch
+
+    def _set_header(self, m: mmap.mmap, head: int, invalidations: int, epoch: int) -> None:
+        _HEADER.pack_into(m, 0, MAGIC, LAYOUT, self.index_slots, self.arena_size, head, invalidations, epoch)
+
+    def _tag_slot(self, tag: str) -> int:
+        return _hash(tag.encode()) % TAG_SLOTS
+
+    def _tag_version(self, m: mmap.mmap, slot: int) -> int:
+        return _TAG.unpack_from(m, self._tags_at + slot * _TAG.size)[0]
+
+    def _slot_at(self, bucket: int, i: int) -> int:
+        return self._index_at + (bucket * BUCKET_SLOTS + i) * _SLOT.size
+
+    # lookups
+
+    def _find(self, m: mmap.mmap, key: bytes, key_hash: int) -> Optional[int]:
+        """
+        Offset of the index slot holding `key`, live or not.
+        """
+        bucket = key_hash % self.buckets
+        for i in range(BUCKET_SLOTS):
+            at = self._slot_at(bucket, i)
+            slot_hash, pos, length, _, _ = _SLOT.unpack_from(m, at)
+            if slot_hash == key_hash and self._record_key(m, pos, length) == key:
+                return at
+        return None
+
+    def _record_key(self, m: mmap.mmap, pos: int, length: int) -> Optional[bytes]:
+        head, _, _ = self._header(m)
+        if head - pos > self.arena_size:
+            return None
+        at = self._arena_at + pos % self.arena_size
+        key_len, n_tags, _ = _RECORD.unpack_from(m, at)
+        start = at + _RECORD.size + n_tags * _RECORD_TAG.size
+        return m[start:start + key_len]
+
+    def _live(self, m: mmap.mmap, at: int) -> Optional[Tuple[int, int]]:
+        """
+        (arena offset, length) of the record behind an index slot, if it
+        is unexpired, not overwritten, not cleared and no tag moved on.
+        """
+        slot_hash, pos, length, epoch, expires_at = _SLOT.unpack_from(m, at)
+        head, _, current_epoch = self._header(m)
+        if not slot_hash or epoch != current_epoch & 0xFFFFFFFF:
+            return None
+        if expires_at <= time.time() or head - pos > self.arena_size:
+            return None
+        record = self._arena_at + pos % self.arena_size
+        _, n_tags, _ = _RECORD.unpack_from(m, record)
+        for i in range(n_tags):
+            tag_slot, version = _RECORD_TAG.unpack_from(m, record + _RECORD.size + i * _RECORD_TAG.size)
+            if self._tag_version(m, tag_slot) != version:
+                return None
+        return record, length
+
+    # TTLCache interface
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        raw_key = _key_bytes(key)
+        key_hash = _hash(raw_key)
+        with self._locked(exclusive=False) as m:
+            at = self._find(m, raw_key, key_hash)
+            live = self._live(m, at) if at is not None else None
+            if live is None:
+                self.misses += 1
+                return default
+            record, length = live
+            key_len, n_tags, encoding = _RECORD.unpack_from(m, record)
+            start = record + _RECORD.size + n_tags * _RECORD_TAG.size + key_len
+            # the one copy: the slot may be reused by another worker as
+            # soon as the lock is released
+            data = m[start:record + length]
+        self.hits += 1
+        return data if encoding == _RAW else orjson.loads(data)
+
+    def stamp(self) -> int:
+        """
+        The invalidation count; pass it to `set` to skip storing a value
+        built while any tag was invalidated.
+        """
+        with self._locked(exclusive=False) as m:
+            return self._header(m)[1]
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        expires_at: Optional[float] = None,
+        size: int = 0,
+        tags: Iterable[str] = (),
+        stamp: Optional[int] = None,
+    ) -> None:
+        deadline = time.time() + (self.ttl if ttl is None else ttl)
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        if deadline <= time.time():
+            return
+
+        if isinstance(value, bytes):
+            encoding, data = _RAW, value
+        else:
+            encoding, data = _JSON, orjson.dumps(value)
+
+        raw_key = _key_bytes(key)
+        key_hash = _hash(raw_key)
+        tag_slots = sorted({self._tag_slot(tag) for tag in tags})
+        length = _RECORD.size + len(tag_slots) * _RECORD_TAG.size + len(raw_key) + len(data)
+        if length > self.arena_size // MAX_RECORD_SHARE:
+            return
+
+        with self._locked(exclusive=True) as m:
+            head, invalidations, epoch = self._header(m)
+            if stamp is not None and stamp != invalidations:
+                return
+
+            # records never wrap: skip to the start of the ring instead
+            offset = head % self.arena_size
+            if offset + length > self.arena_size:
+                head += self.arena_size - offset
+                offset = 0
+
+            at = self._arena_at + offset
+            _RECORD.pack_into(m, at, len(raw_key), len(tag_slots), encoding)
+            at += _RECORD.size
+            for tag_slot in tag_slots:
+                _RECORD_TAG.pack_into(m, at, tag_slot, self._tag_version(m, tag_slot))
+                at += _RECORD_TAG.size
+            m[at:at + len(raw_key)] = raw_key
+            at += len(raw_key)
+            m[at:at + len(data)] = data
+
+            slot = self._find(m, raw_key, key_hash)
+            if slot is None:
+                slot = self._victim(m, key_hash)
+            _SLOT.pack_into(m, slot, key_hash, head, length, epoch & 0xFFFFFFFF, deadline)
+            self._set_header(m, head + length, invalidations, epoch)
+
+    def _victim(self, m: mmap.mmap, key_hash: int) -> int:
+        # a free or dead slot in the key's bucket, else its oldest record
+        bucket = key_hash % self.buckets
+        oldest, oldest_pos = None, None
+        for i in range(BUCKET_SLOTS):
+            at = self._slot_at(bucket, i)
+            if self._live(m, at) is None:
+                return at
+            pos = _SLOT.unpack_from(m, at)[1]
+            if oldest is None or pos < oldest_pos:
+                oldest, oldest_pos = at, pos
+        self.evictions += 1
+        return oldest
+
+    def delete(self, key: Hashable) -> None:
+        raw_key = _key_bytes(key)
+        with self._locked(exclusive=True) as m:
+            at = self._find(m, raw_key, _hash(raw_key))
+            if at is not None:
+                _SLOT.pack_into(m, at, 0, 0, 0, 0, 0.0)
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """
+        Retire every entry stored under any of `tags`, in every process.
+        Entries are not counted; they simply stop matching.
+        """
+        with self._locked(exclusive=True) as m:
+            for tag_slot in {self._tag_slot(tag) for tag in tags}:
+                at = self._tags_at + tag_slot * _TAG.size
+                _TAG.pack_into(m, at, _TAG.unpack_from(m, at)[0] + 1)
+            head, invalidations, epoch = self._header(m)
+            self._set_header(m, head, invalidations + 1, epoch)
+        return 0
+
+    def clear(self) -> None:
+        with self._locked(exclusive=True) as m:
+            head, invalidations, epoch = self._header(m)
+            self._set_header(m, head, invalidations + 1, epoch + 1)
+
+    def stats(self) -> dict:
+        with self._locked(exclusive=False) as m:
+            slots = [
+                self._live(m, self._slot_at(bucket, i))
+                for bucket in range(self.buckets) for i in range(BUCKET_SLOTS)
+            ]
+        live: List[Tuple[int, int]] = [entry for entry in slots if entry is not None]
+        return {
+            "entries": len(live),
+            "bytes": sum(length for _, length in live),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "backend": "shared",
+            "path": self.path,
+        }
+
+
+class _FileLock:
+    def __init__(self, cache: SharedCache, exclusive: bool):
+        self.cache = cache
+        self.mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+
+    def __enter__(self) -> mmap.mmap:
+        self.cache._lock.acquire()
+        try:
+            m = self.cache._attach()
+            fcntl.flock(self.cache._fd, self.mode)
+        except BaseException:
+            self.cache._lock.release()
+            raise
+        return m
+
+    def __exit__(self, *exc) -> None:
+        try:
+            fcntl.flock(self.cache._fd, fcntl.LOCK_UN)
+        finally:
+            self.cache._lock.release()
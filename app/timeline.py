@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from app.background import spawn
+from app.config import (
+    TIMELINE_FANOUT_LIMIT,
+    TIMELINE_FANOUT_BATCH,
+    TIMELINE_BACKFILL,
+)
+from app.fields import LIST_FIELDS
+from app.http_cache import invalidate_etags, timeline_tag
+from app.pagination import next_page
+from app.repositories import repos
+from app.response_cache import all_posts_tag
+
+logger = logging.getLogger(__name__)
+
+# Materialized "following" timelines.
+#
+# Posts are written into `timelines` for every follower when they are
+# created (fan-out on write). Authors with more than TIMELINE_FANOUT_LIMIT
+# followers are skipped and merged into their followers' timelines at read
+# time instead (fan-out on read), so one post never costs millions of rows.
+
+async def _is_high_fanout(author_id: str) -> bool:
+    return await repos.profiles.counter(author_id, "followers_count") > TIMELINE_FANOUT_LIMIT
+
+
+async def _fan_out(post: dict) -> None:
+    author_id = post["author_id"]
+    entry = {"post_id": post["id"], "author_id": author_id, "created_at": post["created_at"]}
+
+    # the author always sees their own post
+    await repos.timelines.insert([{**entry, "user_id": author_id}])
+    if await _is_high_fanout(author_id):
+        return
+
+    last_follower = None
+    while True:
+        followers = await repos.follows.follower_ids(author_id, last_follower, TIMELINE_FANOUT_BATCH)
+        if not followers:
+            return
+
+        await repos.timelines.insert([{**entry, "user_id": follower} for follower in followers])
+        if len(followers) < TIMELINE_FANOUT_BATCH:
+            return
+        last_follower = followers[-1]
+
+
+async def _backfill(user_id: str, author_id: str) -> None:
+    if await _is_high_fanout(author_id):
+        return
+
+    posts = await repos.posts.recent_ids(author_id, TIMELINE_BACKFILL)
+    await repos.timelines.insert([
+        {"user_id": user_id, "post_id": row["id"], "author_id": author_id, "created_at": row["created_at"]}
+        for row in posts
+    ])
+
+
+async def _trim(user_id: str, author_id: str) -> None:
+    await repos.timelines.remove_author(user_id, author_id)
+
+
+async def _then_invalidate(write, tag: str) -> None:
+    # an ETag kept while the write was landing no longer matches the rows
+    try:
+        await write
+    finally:
+        invalidate_etags(tag)
+
+
+def post_created(post: dict) -> None:
+    # timeline ETags are kept under the all-posts tag as well
+    spawn(_then_invalidate(_fan_out(post), all_posts_tag()))
+
+
+def follow_changed(user_id: str, author_id: str, following: bool) -> None:
+    write = _backfill(user_id, author_id) if following else _trim(user_id, author_id)
+    spawn(_then_invalidate(write, timeline_tag(user_id)))
+
+
+async def read_timeline(
+        user_id: str, limit: int, cursor: Optional[str],
+        fields: Tuple[str, ...] = LIST_FIELDS) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of `user_id`'s timeline, newest first: the materialized
+    entries merged with recent posts of followed high-fanout authors.
+    """
+    rows, authors = await asyncio.gather(
+        repos.timelines.rows(user_id, fields, limit, cursor),
+        repos.follows.popular_following(user_id, TIMELINE_FANOUT_LIMIT),
+    )
+
+    if authors:
+        pulled = await repos.posts.list_rows(fields, limit, cursor, author_ids=authors)
+        seen = {row["id"] for row in rows}
+        rows.extend(row for row in pulled if row["id"] not in seen)
+        rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+
+    return next_page(rows, limit)
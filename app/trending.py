@@ -0,0 +1,279 @@
+import asyncio
+import bisect
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.background import spawn
+from app.config import (
+    TRENDING_COMMENT_WEIGHT,
+    TRENDING_HALF_LIFE,
+    TRENDING_LOAD_BATCH,
+    TRENDING_REFRESH_INTERVAL,
+    TRENDING_WINDOW,
+)
+from app.repositories import repos
+
+logger = logging.getLogger(__name__)
+
+# in-process trending ranking. Every like or comment adds to its post a
+# weight that halves every TRENDING_HALF_LIFE seconds. Scores are kept in
+# forward-decay form, log(sum of weight * 2^(t / half life)): an event only
+# ever touches its own post and the order of the others never has to be
+# recomputed as time passes. The logarithm keeps that sum from overflowing.
+#
+# Likes and comments made through this worker update it as they happen; a
+# periodic rebuild from the likes and comments tables picks up the rest.
+
+LIKE_WEIGHT = 1.0
+
+# post ids looked up per category query
+CATEGORY_LOOKUP_CHUNK = 200
+
+# (-log score, post_id): ascending order is best first, ties by id
+Entry = Tuple[float, str]
+
+
+def _timestamp(created_at: str) -> float:
+    return datetime.fromisoformat(created_at.replace("Z", "+00:00")).timestamp()
+
+
+def _iso(timestamp: float) -> str:
+    # the fixed-width form the sqlite backend stores, which PostgREST parses too
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+
+class TrendingIndex:
+    """
+    Log scores by post plus one sorted ranking overall and one per
+    category, so the top K of either is a slice.
+    """
+
+    def __init__(self, half_life: float):
+        self.rate = math.log(2) / half_life
+        self._scores: Dict[str, float] = {}
+        # category of every scored post whose category is known (may be None)
+        self._categories: Dict[str, Optional[str]] = {}
+        self._ranked: Dict[Optional[str], List[Entry]] = {None: []}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, post_id: str) -> bool:
+        return post_id in self._scores
+
+    def add(self, post_id: str, weight: float, at: float) -> None:
+        """
+        Count an event of `weight` made at unix time `at`; a negative weight
+        takes one back, and the score never drops below zero.
+        """
+        point = math.log(abs(weight)) + self.rate * at
+        old = self._scores.get(post_id)
+        if weight > 0:
+            new = point if old is None else max(old, point) + math.log1p(math.exp(-abs(old - point)))
+        elif old is None or point >= old:
+            new = None
+        else:
+            new = old + math.log1p(-math.exp(point - old))
+
+        self._unrank(post_id)
+        if new is None:
+            self._scores.pop(post_id, None)
+            self._categories.pop(post_id, None)
+        else:
+            self._scores[post_id] = new
+            self._rank(post_id)
+
+    def remove(self, post_id: str) -> None:
+        self._unrank(post_id)
+        self._scores.pop(post_id, None)
+        self._categories.pop(post_id, None)
+
+    def has_category(self, post_id: str) -> bool:
+        return post_id in self._categories
+
+    def uncategorized(self) -> List[str]:
+        return [post_id for post_id in self._scores if post_id not in self._categories]
+
+    def category(self, post_id: str) -> Optional[str]:
+        return self._categories.get(post_id)
+
+    def set_category(self, post_id: str, category_id: Optional[str]) -> None:
+        if post_id not in self._scores:
+            return
+        self._unrank(post_id)
+        self._categories[post_id] = category_id
+        self._rank(post_id)
+
+    def _scopes(self, post_id: str) -> Tuple[Optional[str], ...]:
+        category_id = self._categories.get(post_id)
+        return (None,) if category_id is None else (None, category_id)
+
+    def _rank(self, post_id: str) -> None:
+        entry = (-self._scores[post_id], post_id)
+        for scope in self._scopes(post_id):
+            bisect.insort(self._ranked.setdefault(scope, []), entry)
+
+    def _unrank(self, post_id: str) -> None:
+        score = self._scores.get(post_id)
+        if score is None:
+            return
+        entry = (-score, post_id)
+        for scope in self._scopes(post_id):
+            ranked = self._ranked[scope]
+            del ranked[bisect.bisect_left(ranked, entry)]
+            if not ranked and scope is not None:
+                del self._ranked[scope]
+
+    def top(
+            self, limit: int, category_id: Optional[str] = None,
+            after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, float]]:
+        """
+        Up to `limit` (post_id, log score) pairs, best first, past the
+        (log score, post_id) of `after`.
+        """
+        ranked = self._ranked.get(category_id, [])
+        start = bisect.bisect_right(ranked, (-after[0], after[1])) if after else 0
+        return [(post_id, -negated) for negated, post_id in ranked[start:start + limit]]
+
+    def current(self, log_score: float, now: Optional[float] = None) -> float:
+        """
+        A log score as the decayed weight it adds up to at `now`.
+        """
+        now = time.time() if now is None else now
+        return math.exp(log_score - self.rate * now)
+
+
+class PostTrending:
+    """
+    The live ranking plus the bookkeeping to rebuild it from the likes and
+    comments tables while events keep arriving.
+    """
+
+    def __init__(self):
+        self.index = TrendingIndex(TRENDING_HALF_LIFE)
+        # false until the first build finishes; requests get a 503 until then
+        self.ready = False
+        self._building: Optional[TrendingIndex] = None
+        self._resolving: Set[str] = set()
+
+    def _indexes(self) -> List[TrendingIndex]:
+        return [self.index] if self._building is None else [self.index, self._building]
+
+    def record(self, post_id: str, weight: float, at: Optional[float] = None) -> None:
+        at = time.time() if at is None else at
+        for index in self._indexes():
+            index.add(post_id, weight, at)
+        if any(post_id in index and not index.has_category(post_id) for index in self._indexes()):
+            self._resolve_soon(post_id)
+
+    def categorize(self, post_id: str, category_id: Optional[str]) -> None:
+        for index in self._indexes():
+            index.set_category(post_id, category_id)
+
+    def remove(self, post_id: str) -> None:
+        for index in self._indexes():
+            index.remove(post_id)
+
+    def _resolve_soon(self, post_id: str) -> None:
+        if post_id not in self._resolving:
+            self._resolving.add(post_id)
+            spawn(self._resolve([post_id]))
+
+    async def _resolve(self, post_ids: List[str], into: Optional[TrendingIndex] = None) -> None:
+        """
+        Look up the categories of `post_ids`; posts gone since drop out.
+        """
+        try:
+            for start in range(0, len(post_ids), CATEGORY_LOOKUP_CHUNK):
+                chunk = post_ids[start:start + CATEGORY_LOOKUP_CHUNK]
+                rows = await repos.posts.by_ids(chunk, ("id", "category_id"))
+                found = {row["id"]: row["category_id"] for row in rows}
+                for index in [into] if into else self._indexes():
+                    for post_id in chunk:
+                        if post_id in found:
+                            index.set_category(post_id, found[post_id])
+                        else:
+                            index.remove(post_id)
+        finally:
+            self._resolving.difference_update(post_ids)
+
+    async def rebuild(self) -> None:
+        """
+        Build a fresh ranking from recent likes and comments and swap it in.
+        """
+        started = time.time()
+        since, until = _iso(started - TRENDING_WINDOW), _iso(started)
+        # events from here on reach the new ranking live, not through the load
+        self._building = building = TrendingIndex(TRENDING_HALF_LIFE)
+        try:
+            for created_page, weight in (
+                    (repos.likes.created_page, LIKE_WEIGHT),
+                    (repos.comments.created_page, TRENDING_COMMENT_WEIGHT)):
+                cursor = None
+                while True:
+                    rows, cursor = await created_page(since, until, TRENDING_LOAD_BATCH, cursor)
+                    for row in rows:
+                        building.add(row["post_id"], weight, _timestamp(row["created_at"]))
+                    if not cursor:
+                        break
+
+            unknown = []
+            for post_id in building.uncategorized():
+                if self.index.has_category(post_id):
+                    building.set_category(post_id, self.index.category(post_id))
+                else:
+                    unknown.append(post_id)
+            await self._resolve(unknown, into=building)
+            self.index = building
+        finally:
+            self._building = None
+        self.ready = True
+        logger.info("trending ranking built: %d posts", len(self.index))
+
+    async def refresh_forever(self) -> None:
+        """
+        Build the ranking, then rebuild it at a fixed interval.
+        """
+        while True:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.warning("trending ranking build failed: %s", e)
+                if not self.ready:
+                    # retry the first build sooner than a refresh
+                    await asyncio.sleep(5)
+                    continue
+            if TRENDING_REFRESH_INTERVAL <= 0:
+                return
+            await asyncio.sleep(TRENDING_REFRESH_INTERVAL)
+
+
+post_trending = PostTrending()
+
+
+def like_changed(post_id: str, delta: int) -> None:
+    """
+    An unlike takes back what a like made now would add: a like/unlike pair
+    cancels out, an older like is over-corrected until the next rebuild.
+    """
+    post_trending.record(post_id, LIKE_WEIGHT * delta)
+
+
+def comment_changed(post_id: str, delta: int, created_at: Optional[str] = None) -> None:
+    """
+    A deleted comment takes back exactly what it added, given its
+    `created_at`.
+    """
+    at = _timestamp(created_at) if created_at else None
+    post_trending.record(post_id, TRENDING_COMMENT_WEIGHT * delta, at)
+
+
+def post_changed(post: dict) -> None:
+    post_trending.categorize(post["id"], post.get("category_id"))
+
+
+def post_removed(post_id: str) -> None:
+    post_trending.remove(post_id)
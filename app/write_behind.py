@@ -0,0 +1,375 @@
+import asyncio
+import fcntl
+import glob
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import orjson
+
+from app.coalesce import toggles
+from app.config import (
+    WRITE_BEHIND,
+    WRITE_BEHIND_DIR,
+    WRITE_BEHIND_INTERVAL,
+    WRITE_BEHIND_BATCH,
+)
+from app.metrics import detached_context
+from app.repositories import repos
+from app.repositories.base import Pair
+
+logger = logging.getLogger(__name__)
+
+# Write-behind for engagement toggles (likes, bookmarks, follows).
+#
+# A toggle is validated by its route, appended to a local journal and
+# acknowledged once the journal is fsynced; journal writes are group
+# committed, so one fsync covers every toggle that arrived meanwhile.
+# Pending toggles are kept per (kind, a, b) as (first, last) wanted state
+# and flushed upstream as one bulk insert and one bulk delete per kind.
+# A pair toggled back and forth is checked against the stored row first and
+# dropped when it would end where it started (like then unlike).
+#
+# The journal is a sequence of segments per process, each flocked by its
+# writer. A segment is deleted once everything in it reached the database;
+# segments left unlocked by a dead worker are replayed by the next one to
+# start. Replays are safe because every write is a set-to-state.
+#
+# Adds are acknowledged without looking the post or profile up: a toggle of
+# one that does not exist (or is deleted before the flush) is rejected by
+# the database and dropped then.
+#
+# The pending state is per process, and so is the read-your-writes overlay
+# built on it (`pending_state`): with several workers, a read served by
+# another worker shows the stored state until the flush lands. Run one
+# worker per node where that matters.
+
+Apply = Callable[[List[Pair], List[Pair]], Awaitable[None]]
+Existing = Callable[[List[Pair]], Awaitable[Set[Pair]]]
+Missing = Callable[[List[Pair]], Awaitable[Set[Pair]]]
+Key = Tuple[str, str, str]
+
+# seconds to wait after a failed flush, doubling up to the cap
+RETRY_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+
+
+class WriteBehindQueue:
+    def __init__(self, directory: str, interval: float, batch_rows: int):
+        self.directory = directory
+        self.interval = interval
+        self.batch_rows = batch_rows
+        self._handlers: Dict[str, Tuple[Apply, Existing, Missing]] = {}
+        # (kind, a, b) -> (first, last) wanted state since the last flush
+        self._pending: Dict[Key, Tuple[bool, bool]] = {}
+        self._flushing: Dict[Key, Tuple[bool, bool]] = {}
+        self._lines: List[bytes] = []
+        self._waiters: List[asyncio.Future] = []
+        # journal segments whose toggles are pending: (fd, path)
+        self._segments: List[Tuple[int, str]] = []
+        self._active: Optional[Tuple[int, str]] = None
+        self._serial = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._syncing: Optional[asyncio.Lock] = None
+
+    def register(self, kind: str, apply: Apply, existing: Existing, missing: Missing) -> None:
+        """
+        `apply(adds, removes)` writes a batch of pairs and runs its side
+        effects; `existing(pairs)` says which pairs have a row, and
+        `missing(pairs)` which ones point at a post or profile that is gone.
+        """
+        self._handlers[kind] = (apply, existing, missing)
+
+    def pending(self, kind: str, a: str, b: str) -> Optional[bool]:
+        """
+        The state a toggle not yet in the database will leave the pair in,
+        None when there is none.
+        """
+        key = (kind, a, b)
+        state = self._pending.get(key) or self._flushing.get(key)
+        return state[1] if state else None
+
+    async def submit(self, kind: str, a: str, b: str, wanted: bool) -> bool:
+        """
+        Journal the toggle; returns `wanted` once it is durable.
+        """
+        self.start()
+        self._record((kind, a, b), wanted)
+        waiter = asyncio.get_running_loop().create_future()
+        self._lines.append(orjson.dumps([kind, a, b, wanted]) + b"\n")
+        self._waiters.append(waiter)
+        self._wake.set()
+        await waiter
+        return wanted
+
+    def _record(self, key: Key, wanted: bool) -> None:
+        state = self._pending.get(key)
+        self._pending[key] = (state[0] if state else wanted, wanted)
+        if len(self._pending) >= self.batch_rows:
+            self._full.set()
+
+    # lifecycle
+
+    def start(self) -> None:
+        """
+        Replay orphaned journal segments and start the journal and flush
+        loops on the running event loop; a no-op once running there.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._full = asyncio.Event()
+        self._syncing = asyncio.Lock()
+        if self._active is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._recover()
+            self._active = self._open_segment()
+
+        # owned by no request, like other background work
+        self._tasks = [
+            loop.create_task(self._sync_forever(), context=detached_context()),
+            loop.create_task(self._flush_forever(), context=detached_context()),
+        ]
+
+    async def stop(self) -> None:
+        """
+        Stop the loops after journaling and trying to flush what is left;
+        whatever still fails stays in the journal for the next start.
+        """
+        if self._loop is None:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._loop, self._tasks = None, []
+        await self._sync()
+        if await self._flush():
+            # nothing was journaled since the flush rotated it
+            os.unlink(self._active[1])
+        for fd, _ in self._segments + [self._active]:
+            os.close(fd)
+        self._segments, self._active = [], None
+
+    def _recover(self) -> None:
+        for path in sorted(glob.glob(os.path.join(self.directory, "engagement-*.log"))):
+            fd = os.open(path, os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # a live worker's segment
+                os.close(fd)
+                continue
+
+            replayed = 0
+            with os.fdopen(os.dup(fd), "rb") as journal:
+                for line in journal:
+                    try:
+                        kind, a, b, wanted = orjson.loads(line)
+                    except ValueError:
+                        # torn last line of a crashed writer: never acknowledged
+                        continue
+                    self._record((kind, a, b), wanted)
+                    replayed += 1
+            self._segments.append((fd, path))
+            logger.info("write-behind: replaying %d toggles from %s", replayed, path)
+
+    def _open_segment(self) -> Tuple[int, str]:
+        self._serial += 1
+        path = os.path.join(self.directory, f"engagement-{os.getpid()}-{self._serial}.log")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd, path
+
+    # journal
+
+    async def _sync_forever(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            await self._sync()
+
+    async def _sync(self) -> None:
+        async with self._syncing:
+            if not self._lines:
+                return
+            lines, self._lines = self._lines, []
+            waiters, self._waiters = self._waiters, []
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, _append, self._active[0], b"".join(lines))
+            except Exception as e:
+                logger.error("write-behind: journal write failed: %s", e)
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                return
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    # flush
+
+    async def _flush_forever(self) -> None:
+        delay = RETRY_DELAY
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+
+            if await self._flush():
+                delay = RETRY_DELAY
+            else:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    async def _flush(self) -> bool:
+        """
+        Send every pending toggle upstream; False when it has to be retried.
+        """
+        if not self._pending and not self._segments:
+            return True
+
+        # the pending toggles and the segments journaling them change hands
+        # together, so a segment is only deleted once all of it is applied
+        async with self._syncing:
+            batch, self._pending = self._pending, {}
+            self._segments.append(self._active)
+            self._active = self._open_segment()
+        segments, self._segments = self._segments, []
+        self._flushing = batch
+
+        try:
+            by_kind: Dict[str, Dict[Pair, Tuple[bool, bool]]] = {}
+            for (kind, a, b), state in batch.items():
+                by_kind.setdefault(kind, {})[(a, b)] = state
+            for kind, states in by_kind.items():
+                await self._apply(kind, states)
+        except Exception as e:
+            logger.warning("write-behind: flush of %d toggles failed: %s", len(batch), e)
+            self._requeue(batch, segments)
+            return False
+        except asyncio.CancelledError:
+            self._requeue(batch, segments)
+            raise
+        finally:
+            self._flushing = {}
+
+        for fd, path in segments:
+            os.unlink(path)
+            os.close(fd)
+        return True
+
+    def _requeue(self, batch: Dict[Key, Tuple[bool, bool]], segments: List[Tuple[int, str]]) -> None:
+        # newer toggles of the same pair keep their last state
+        for key, (first, last) in batch.items():
+            newer = self._pending.get(key)
+            self._pending[key] = (first, newer[1] if newer else last)
+        self._segments = segments + self._segments
+
+    async def _apply(self, kind: str, states: Dict[Pair, Tuple[bool, bool]]) -> None:
+        apply, existing, missing = self._handlers[kind]
+
+        # toggled both ways: only written when it ends up changing the row
+        flipped = [pair for pair, (first, last) in states.items() if first != last]
+        if flipped:
+            stored = await existing(flipped)
+            for pair in flipped:
+                if (pair in stored) == states[pair][1]:
+                    del states[pair]
+
+        adds = [pair for pair, (_, last) in states.items() if last]
+        removes = [pair for pair, (_, last) in states.items() if not last]
+        for start in range(0, max(len(adds), len(removes)), self.batch_rows):
+            chunk = adds[start:start + self.batch_rows], removes[start:start + self.batch_rows]
+            try:
+                await apply(*chunk)
+            except Exception:
+                await self._apply_one_by_one(kind, apply, missing, *chunk)
+
+    async def _apply_one_by_one(
+            self, kind: str, apply: Apply, missing: Missing, adds: List[Pair], removes: List[Pair]) -> None:
+        """
+        Isolate the rows the database rejects (say, a like of a post deleted
+        since) so they do not hold back the rest of the batch forever.
+        """
+        singles = [([pair], []) for pair in adds] + [([], [pair]) for pair in removes]
+        rejected, error = [], None
+        for single in singles:
+            try:
+                await apply(*single)
+            except Exception as e:
+                rejected.append(single)
+                error = e
+        if not rejected:
+            return
+        if len(rejected) == len(singles):
+            # nothing got through: unless every row points at a post or
+            # profile that is gone, upstream is down and the batch is retried.
+            # The lookup fails too while it is down
+            gone = await missing([single_adds[0] for single_adds, _ in rejected if single_adds])
+            if any(not single_adds or single_adds[0] not in gone for single_adds, _ in rejected):
+                raise error
+        for single_adds, single_removes in rejected:
+            logger.error("write-behind: dropping rejected %s %s: %s", kind, (single_adds or single_removes)[0], error)
+
+
+def _append(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+    os.fdatasync(fd)
+
+
+write_behind = WriteBehindQueue(WRITE_BEHIND_DIR, WRITE_BEHIND_INTERVAL, WRITE_BEHIND_BATCH)
+
+
+async def submit_toggle(
+        kind: str, a: str, b: str, wanted: bool,
+        apply: Callable[[bool], Awaitable[None]]) -> bool:
+    """
+    Ask for the (a, b) pair of `kind` to end up in state `wanted`: through
+    the write-behind journal when enabled, else written before returning.
+    """
+    if WRITE_BEHIND:
+        return await write_behind.submit(kind, a, b, wanted)
+    return await toggles.submit((kind, a, b), wanted, apply)
+
+
+def pending_state(kind: str, a: str, b: str) -> Optional[bool]:
+    """
+    Read-your-writes overlay: the state of a toggle still on its way
+    upstream, None when the database is current.
+    """
+    if not WRITE_BEHIND:
+        return None
+    return write_behind.pending(kind, a, b)
+
+
+async def missing_posts(pairs: List[Pair]) -> Set[Pair]:
+    """
+    The (post_id, user_id) pairs whose post does not exist.
+    """
+    if not pairs:
+        return set()
+    found = await repos.posts.by_ids(list({post_id for post_id, _ in pairs}), ("id",))
+    ids = {row["id"] for row in found}
+    return {pair for pair in pairs if pair[0] not in ids}
+
+
+async def missing_profiles(pairs: List[Pair]) -> Set[Pair]:
+    """
+    The (follower_id, following_id) pairs whose followed profile does not
+    exist.
+    """
+    if not pairs:
+        return set()
+    found = await repos.profiles.get_many(list({following_id for _, following_id in pairs}))
+    ids = {row["id"] for row in found}
+    return {pair for pair in pairs if pair[1] not in ids}
@@ -0,0 +1,457 @@
+"""
+In-memory stand-in for the parts of Supabase the API talks to: PostgREST
+(select with embeds, filters, order/limit, upsert, update, delete, the
+counter rpcs), GoTrue (signup, password/refresh grants, user, logout,
+admin) and storage (upload, move, remove, public objects).
+
+Only the query shapes used under app/ are supported. Run it on its own
+with `uvicorn bench.fake_supabase:app`.
+"""
+import os
+import re
+import time
+from functools import lru_cache
+import uuid
+from datetime import datetime, timezone, timedelta
+
+import jwt
+import orjson
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+# the API verifies tokens locally, so it must be started with the same JWT_SECRET
+SECRET = os.getenv("JWT_SECRET", "bench-secret")
+
+# (table, embedded name) -> (local column, remote table, remote column)
+RELATIONS = {
+    ("posts", "profiles"): ("author_id", "profiles", "id"),
+    ("posts", "categories"): ("category_id", "categories", "id"),
+    ("comments", "profiles"): ("author_id", "profiles", "id"),
+    ("likes", "posts"): ("post_id", "posts", "id"),
+    ("bookmarks", "posts"): ("post_id", "posts", "id"),
+    ("follows", "profiles!follows_follower_id_fkey"): ("follower_id", "profiles", "id"),
+    ("follows", "profiles!follows_following_id_fkey"): ("following_id", "profiles", "id"),
+    ("timelines", "posts"): ("post_id", "posts", "id"),
+}
+KEYLESS = {"follows", "timelines"}
+
+
+def index_key(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+class Store:
+    def __init__(self):
+        self.tables = {}
+        self.users = {}
+        self.objects = {}
+        self.rpcs = {}
+        self.clock = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        # (table, column) -> (version, {value: [rows]}), rebuilt lazily
+        # after the table is written
+        self.indexes = {}
+        self.versions = {}
+
+    def touch(self, table=None):
+        for name in [table] if table else list(self.tables):
+            self.versions[name] = self.versions.get(name, 0) + 1
+
+    def rows_where(self, table, column, value):
+        version, index = self.indexes.get((table, column), (None, None))
+        if version != self.versions.get(table, 0):
+            index = {}
+            for row in self.table(table):
+                index.setdefault(index_key(row.get(column)), []).append(row)
+            self.indexes[(table, column)] = (self.versions.get(table, 0), index)
+        return index.get(index_key(value), [])
+
+    def lookup(self, table, column, value):
+        rows = self.rows_where(table, column, value)
+        return rows[0] if rows else None
+
+    def now(self):
+        self.clock += timedelta(milliseconds=1)
+        return self.clock.isoformat()
+
+    def table(self, name):
+        return self.tables.setdefault(name, [])
+
+
+store = Store()
+
+
+def split_top(s, sep=","):
+    out, depth, cur, quoted = [], 0, "", False
+    for ch in s:
+        if ch == '"':
+            quoted = not quoted
+        if not quoted:
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+            elif ch == sep and depth == 0:
+                out.append(cur)
+                cur = ""
+                continue
+        cur += ch
+    if cur:
+        out.append(cur)
+    return out
+
+
+def unquote(v):
+    if len(v) >= 2 and v[0] == '"' and v[-1] == '"':
+        return v[1:-1]
+    return v
+
+
+def cmp_value(a, b):
+    if a is None:
+        return None
+    if isinstance(a, bool):
+        return a, b in ("true", True)
+    if isinstance(a, (int, float)):
+        return a, float(b)
+    return str(a), str(b)
+
+
+def matches(row, col, op, val):
+    negate = False
+    if op == "not":
+        op, val = val.split(".", 1)
+        negate = True
+    a = row.get(col)
+    if op == "is":
+        res = (a is None) if val == "null" else (a == (val == "true"))
+    elif op == "in":
+        res = str(a) in in_values(val)
+    else:
+        val = unquote(val)
+        pair = cmp_value(a, val)
+        if pair is None:
+            res = False
+        else:
+            x, y = pair
+            res = {
+                "eq": lambda: x == y, "neq": lambda: x != y,
+                "lt": lambda: x < y, "lte": lambda: x <= y,
+                "gt": lambda: x > y, "gte": lambda: x >= y,
+                "like": lambda: re.fullmatch(y.replace("%", ".*").replace("*", ".*"), x) is not None,
+                "ilike": lambda: re.fullmatch(y.replace("%", ".*").replace("*", ".*"), x, re.I) is not None,
+            }[op]()
+    return not res if negate else res
+
+
+def eval_logic(row, expr, mode):
+    parts = split_top(expr)
+    results = []
+    for p in parts:
+        m = re.match(r"^(and|or)\((.*)\)$", p)
+        if m:
+            results.append(eval_logic(row, m.group(2), m.group(1)))
+        else:
+            col, op, val = p.split(".", 2)
+            results.append(matches(row, col, op, val))
+    return all(results) if mode == "and" else any(results)
+
+
+def embedded(table, row, name, select=""):
+    hinted = re.search(name + r"(![\w]+)?(?:!inner)?\(", select or "")
+    want = name + (hinted.group(1) if hinted and hinted.group(1) and hinted.group(1) != "!inner" else "")
+    for (t, rel), (local, remote, remote_col) in RELATIONS.items():
+        if t == table and (rel == want or (rel.split("!")[0] == name and want == name)):
+            return store.lookup(remote, remote_col, row.get(local)) or {}
+    return {}
+
+
+@lru_cache(maxsize=1024)
+def in_values(val):
+    return frozenset(unquote(v) for v in split_top(val.strip("()")))
+
+
+def apply_filters(rows, params, table=None):
+    items = params.multi_items()
+    if table is not None:
+        # start from the index of the first equality filter, not a full scan
+        for key, value in items:
+            if "." not in key and key not in ("or", "and") and value.startswith("eq."):
+                rows = store.rows_where(table, key, unquote(value[3:]))
+                break
+
+    for key, value in items:
+        if key in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+            continue
+        if "." in key and not key.endswith(("or", "and")):
+            rel, col = key.split(".", 1)
+            op, _, val = value.partition(".")
+            rows = [r for r in rows if matches(embedded(table, r, rel, params.get("select")), col, op, val)]
+            continue
+        if key in ("or", "and"):
+            rows = [r for r in rows if eval_logic(r, value[1:-1], key)]
+            continue
+        op, _, val = value.partition(".")
+        rows = [r for r in rows if matches(r, key, op, val)]
+    return rows
+
+
+def project(table, row, select):
+    if not select or select == "*":
+        return dict(row)
+    out = {}
+    for item in split_top(select):
+        item = item.strip()
+        m = re.match(r"^(?:(\w+):)?([\w!]+)\((.*)\)$", item)
+        if m:
+            alias, rel, inner = m.groups()
+            rel = rel.replace("!inner", "")
+            local, remote, remote_col = RELATIONS[(table, rel)]
+            target = store.lookup(remote, remote_col, row.get(local))
+            out[alias or rel.split("!")[0]] = project(remote, target, inner) if target else None
+        elif item == "*":
+            out.update(row)
+        else:
+            alias, _, col = item.rpartition(":")
+            out[alias or col] = row.get(col)
+    return out
+
+
+def order_rows(rows, order):
+    for part in reversed(order.split(",")):
+        bits = part.split(".")
+        col, desc = bits[0], len(bits) > 1 and bits[1] == "desc"
+        rows = sorted(rows, key=lambda r: (r.get(col) is None, r.get(col) if r.get(col) is not None else ""), reverse=desc)
+    return rows
+
+
+def respond(request, data, status=200, count=None):
+    headers = {}
+    if count is not None:
+        headers["content-range"] = f"0-{max(len(data) - 1, 0)}/{count}"
+    if "vnd.pgrst.object" in request.headers.get("accept", ""):
+        if len(data) != 1:
+            return Response(orjson.dumps({"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned", "details": f"The result contains {len(data)} rows", "hint": None}), status_code=406, headers=headers, media_type="application/json")
+        data = data[0]
+    return Response(orjson.dumps(data), status_code=status, headers=headers, media_type="application/json")
+
+
+async def rest(request: Request):
+    name = request.path_params["table"]
+    params = request.query_params
+    prefer = request.headers.get("prefer", "")
+    rows = store.table(name)
+
+    if request.method in ("GET", "HEAD"):
+        result = apply_filters(rows, params, name)
+        if "order" in params:
+            result = order_rows(result, params["order"])
+        total = len(result)
+        offset = int(params.get("offset", 0))
+        if "limit" in params:
+            result = result[offset:offset + int(params["limit"])]
+        data = [project(name, r, params.get("select")) for r in result]
+        return respond(request, [] if request.method == "HEAD" else data, count=total if "count=" in prefer else None)
+
+    if request.method == "POST":
+        body = orjson.loads(await request.body())
+        body = body if isinstance(body, list) else [body]
+        conflict = params.get("on_conflict")
+        conflict_cols = conflict.split(",") if conflict else (["id"] if name not in KEYLESS else None)
+        created = []
+        for item in body:
+            existing = None
+            if conflict_cols and all(c in item for c in conflict_cols):
+                existing = next((r for r in rows if all(str(r.get(c)) == str(item[c]) for c in conflict_cols)), None)
+            if existing is not None:
+                if "ignore-duplicates" in prefer:
+                    continue
+                if "merge-duplicates" in prefer:
+                    existing.update(item)
+                    created.append(existing)
+                    continue
+                return Response(orjson.dumps({"code": "23505", "message": "duplicate key value violates unique constraint", "details": None, "hint": None}), status_code=409, media_type="application/json")
+            row = dict(item)
+            if name not in KEYLESS:
+                row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("created_at", store.now())
+            rows.append(row)
+            created.append(row)
+        store.touch(name)
+        data = [project(name, r, params.get("select")) for r in created] if "return=representation" in prefer else []
+        return respond(request, data, status=201)
+
+    if request.method == "PATCH":
+        body = orjson.loads(await request.body())
+        target = apply_filters(rows, params)
+        for r in target:
+            r.update(body)
+        store.touch(name)
+        return respond(request, [project(name, r, params.get("select")) for r in target] if "return=representation" in prefer else [])
+
+    if request.method == "DELETE":
+        target = apply_filters(rows, params)
+        ids = {id(r) for r in target}
+        store.tables[name] = [r for r in rows if id(r) not in ids]
+        store.touch(name)
+        return respond(request, [project(name, r, params.get("select")) for r in target] if "return=representation" in prefer else [])
+
+
+async def rpc(request: Request):
+    fn = store.rpcs.get(request.path_params["fn"])
+    if fn is None:
+        return Response(orjson.dumps({"code": "PGRST202", "message": "function not found", "details": None, "hint": None}), status_code=404, media_type="application/json")
+    body = await request.body()
+    return Response(orjson.dumps(fn(orjson.loads(body) if body else {})), media_type="application/json")
+
+
+# ---------------------------------------------------------------- auth
+
+
+def user_json(user):
+    return {
+        "id": user["id"], "aud": "authenticated", "role": "authenticated",
+        "email": user["email"], "app_metadata": {}, "user_metadata": user["user_metadata"],
+        "created_at": "2025-01-01T00:00:00Z",
+    }
+
+
+def issue_session(user):
+    now = int(time.time())
+    token = jwt.encode({
+        "sub": user["id"], "aud": "authenticated", "role": "authenticated",
+        "email": user["email"], "exp": now + 3600, "iat": now,
+        "user_metadata": user["user_metadata"], "app_metadata": {},
+        "session_id": str(uuid.uuid4()),
+    }, SECRET, algorithm="HS256")
+    refresh = uuid.uuid4().hex
+    user["refresh"] = refresh
+    return {
+        "access_token": token, "refresh_token": refresh, "expires_in": 3600,
+        "expires_at": now + 3600, "token_type": "bearer", "user": user_json(user),
+    }
+
+
+def create_user(email, password="password", metadata=None, user_id=None):
+    user = {"id": user_id or str(uuid.uuid4()), "email": email, "password": password, "user_metadata": metadata or {}}
+    store.users[user["id"]] = user
+    return user
+
+
+def auth_error(msg, status=400):
+    return Response(orjson.dumps({"code": status, "msg": msg, "error_code": "x", "message": msg}), status_code=status, media_type="application/json")
+
+
+async def auth(request: Request):
+    path = request.path_params["path"]
+    body = orjson.loads(await request.body() or b"{}")
+    if path == "signup":
+        if any(u["email"] == body["email"] for u in store.users.values()):
+            return auth_error("User already registered", 422)
+        return Response(orjson.dumps(issue_session(create_user(body["email"], body["password"], body.get("data")))), media_type="application/json")
+    if path == "token":
+        grant = request.query_params.get("grant_type")
+        if grant == "password":
+            user = next((u for u in store.users.values() if u["email"] == body["email"] and u["password"] == body["password"]), None)
+        else:
+            user = next((u for u in store.users.values() if u.get("refresh") == body["refresh_token"]), None)
+        if user is None:
+            return auth_error("Invalid login credentials")
+        return Response(orjson.dumps(issue_session(user)), media_type="application/json")
+    if path == "user":
+        token = request.headers.get("authorization", "").split(" ")[-1]
+        try:
+            claims = jwt.decode(token, SECRET, algorithms=["HS256"], audience="authenticated")
+        except jwt.InvalidTokenError:
+            return auth_error("invalid JWT", 401)
+        return Response(orjson.dumps(user_json(store.users[claims["sub"]])), media_type="application/json")
+    if path == "logout":
+        return Response(status_code=204)
+    if path.startswith("admin/users/"):
+        uid = path.split("/")[-1]
+        if request.method == "DELETE":
+            store.users.pop(uid, None)
+            return Response(orjson.dumps({}), media_type="application/json")
+        user = store.users[uid]
+        user["user_metadata"].update(body.get("user_metadata", {}))
+        return Response(orjson.dumps(user_json(user)), media_type="application/json")
+    return auth_error("not found", 404)
+
+
+# ---------------------------------------------------------------- storage
+
+
+async def storage(request: Request):
+    path = request.path_params["path"]
+    if request.method == "POST" and path == "object/move":
+        body = orjson.loads(await request.body())
+        src = f'{body["bucketId"]}/{body["sourceKey"]}'
+        dst = f'{body["bucketId"]}/{body["destinationKey"]}'
+        store.objects[dst] = store.objects.pop(src)
+        return Response(orjson.dumps({"message": "Successfully moved"}), media_type="application/json")
+    if request.method in ("POST", "PUT") and path.startswith("object/"):
+        key = path[len("object/"):]
+        form = await request.form()
+        upload = form.get("file")
+        data = await upload.read() if upload is not None else await request.body()
+        store.objects[key] = data
+        return Response(orjson.dumps({"Key": key, "Id": str(uuid.uuid4())}), media_type="application/json")
+    if request.method == "DELETE" and path.startswith("object/"):
+        bucket = path[len("object/"):]
+        body = orjson.loads(await request.body())
+        removed = [store.objects.pop(f"{bucket}/{p}", None) and {"name": p} for p in body["prefixes"]]
+        return Response(orjson.dumps([r for r in removed if r]), media_type="application/json")
+    if request.method == "GET" and path.startswith("object/public/"):
+        data = store.objects.get(path[len("object/public/"):])
+        if data is None:
+            return Response(status_code=404)
+        return Response(data)
+    return Response(status_code=404)
+
+
+app = Starlette(routes=[
+    Route("/rest/v1/rpc/{fn}", rpc, methods=["POST", "GET"]),
+    Route("/rest/v1/{table}", rest, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+    Route("/auth/v1/{path:path}", auth, methods=["GET", "POST", "PUT", "DELETE"]),
+    Route("/storage/v1/{path:path}", storage, methods=["GET", "POST", "PUT", "DELETE"]),
+])
+
+
+def _adjust(table, key):
+    def fn(params):
+        row = store.lookup(table, "id", params[key])
+        if row is not None:
+            row[params["p_column"]] = max(row.get(params["p_column"], 0) + params["p_delta"], 0)
+        return None
+    return fn
+
+
+def _count(table, column):
+    counts = {}
+    for row in store.table(table):
+        counts[row[column]] = counts.get(row[column], 0) + 1
+    return counts
+
+
+def _reconcile(params):
+    likes, comments, bookmarks = _count("likes", "post_id"), _count("comments", "post_id"), _count("bookmarks", "post_id")
+    for p in store.table("posts"):
+        p["likes_count"] = likes.get(p["id"], 0)
+        p["comments_count"] = comments.get(p["id"], 0)
+        p["bookmarks_count"] = bookmarks.get(p["id"], 0)
+    followers, following, posts = _count("follows", "following_id"), _count("follows", "follower_id"), _count("posts", "author_id")
+    for pr in store.table("profiles"):
+        pr["followers_count"] = followers.get(pr["id"], 0)
+        pr["following_count"] = following.get(pr["id"], 0)
+        pr["posts_count"] = posts.get(pr["id"], 0)
+    return None
+
+
+store.rpcs.update(
+    adjust_post_counter=_adjust("posts", "p_post_id"),
+    adjust_profile_counter=_adjust("profiles", "p_profile_id"),
+    reconcile_counters=_reconcile,
+)
@@ -0,0 +1,376 @@
+"""
+Load benchmark for the API.
+
+Boots `app.main:app` under uvicorn against `bench.fake_supabase` (seeded by
+`bench.seed`), drives a weighted mix of user journeys and reports throughput,
+p50/p95/p99 latency per operation and upstream Supabase calls per request
+(read from the API's own /metrics).
+
+    python -m bench.run                          # default mix, 20s
+    python -m bench.run --mix read --concurrency 64
+    python -m bench.run --save bench/baseline.json
+    python -m bench.run --compare bench/baseline.json
+
+With --compare the run exits non-zero when an operation's p95 grows past
+--tolerance or a route makes more upstream calls per request than before.
+"""
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+import httpx
+import uvicorn
+from PIL import Image
+from prometheus_client.parser import text_string_to_metric_families
+
+from bench import fake_supabase as fake
+from bench.seed import seed
+
+MIXES = {
+    "default": {"anonymous": 55, "reader": 35, "writer": 7, "signup": 3},
+    "read": {"anonymous": 60, "reader": 40},
+    "write": {"reader": 40, "writer": 45, "signup": 15},
+}
+
+
+# ---------------------------------------------------------------- servers
+
+# longer than the API's upstream keep-alive, so pooled connections are never
+# closed under it mid-request
+KEEP_ALIVE = 120
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve_fake(port: int, data: dict):
+    # seeding is deterministic, so this store matches the driver's copy; a
+    # forked child already inherited it
+    if not fake.store.tables:
+        seed(**data)
+    uvicorn.run(fake.app, host="127.0.0.1", port=port, log_level="warning", timeout_keep_alive=KEEP_ALIVE)
+
+
+def _serve_api(port: int, env: dict):
+    # app.config reads its settings at import
+    os.environ.update(env)
+    uvicorn.run("app.main:app", host="127.0.0.1", port=port, log_level="warning", timeout_keep_alive=KEEP_ALIVE)
+
+
+def start(target, *args) -> Tuple[multiprocessing.Process, str]:
+    """
+    Run a server in its own process, so neither it nor the driver skews the
+    other's timings, and wait until it answers.
+    """
+    port = free_port()
+    process = multiprocessing.Process(target=target, args=(port, *args))
+    process.start()
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if not process.is_alive():
+            raise RuntimeError(f"server for {target.__name__} exited")
+        try:
+            httpx.get(url + "/")
+            return process, url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"server for {target.__name__} did not start")
+
+
+def boot(args):
+    data = dict(users=args.users, posts=args.posts, likes=args.likes, follows=args.follows)
+    ids = seed(**data)
+    upstream, upstream_url = start(_serve_fake, data)
+    api, api_url = start(_serve_api, {
+        "SUPABASE_URL": upstream_url,
+        "SUPABASE_KEY": "bench-anon-key",
+        "SUPABASE_ROLE_KEY": "bench-service-key",
+        "JWT_SECRET": fake.SECRET,
+        "COUNTER_RECONCILE_INTERVAL": "0",
+        "UPSTREAM_CALL_WARN_THRESHOLD": "0",
+    })
+    return [api, upstream], api_url, ids
+
+
+# ---------------------------------------------------------------- recording
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def call(self, client: httpx.AsyncClient, op: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        elapsed = time.perf_counter() - start
+
+        self.latencies.setdefault(op, []).append(elapsed)
+        if response is None or response.status_code >= 400:
+            self.errors[op] = self.errors.get(op, 0) + 1
+        return response
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def summarize(recorder: Recorder, seconds: float) -> Dict[str, dict]:
+    ops = {}
+    everything = []
+    for op, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        everything.extend(values)
+        ops[op] = _stats(values, recorder.errors.get(op, 0), seconds)
+    ops["ALL"] = _stats(sorted(everything), sum(recorder.errors.values()), seconds)
+    return ops
+
+
+def _stats(values: List[float], errors: int, seconds: float) -> dict:
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+    }
+
+
+async def scrape_upstream(client: httpx.AsyncClient) -> Dict[str, List[float]]:
+    """
+    route -> [requests, upstream calls] from the API's histograms.
+    """
+    text = (await client.get("/metrics")).text
+    routes: Dict[str, List[float]] = {}
+    for family in text_string_to_metric_families(text):
+        if family.name != "upstream_calls_per_request":
+            continue
+        for sample in family.samples:
+            route = sample.labels["route"]
+            if sample.name.endswith("_count") and sample.labels["service"] == "postgrest":
+                routes.setdefault(route, [0.0, 0.0])[0] = sample.value
+            elif sample.name.endswith("_sum"):
+                routes.setdefault(route, [0.0, 0.0])[1] += sample.value
+    return routes
+
+
+def upstream_delta(before: Dict[str, List[float]], after: Dict[str, List[float]]) -> Dict[str, float]:
+    out = {}
+    for route, (requests, calls) in sorted(after.items()):
+        if route == "/metrics":
+            continue
+        old_requests, old_calls = before.get(route, [0.0, 0.0])
+        if requests > old_requests:
+            out[route] = round((calls - old_calls) / (requests - old_requests), 2)
+    return out
+
+
+# ---------------------------------------------------------------- journeys
+
+
+def _jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (1600, 900), (90, 140, 200)).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class Journeys:
+    def __init__(self, ids: dict, recorder: Recorder, rng: random.Random):
+        self.ids = ids
+        self.rec = recorder
+        self.rng = rng
+        self.image = _jpeg()
+
+    def _auth(self) -> dict:
+        # a fresh session of a random seeded user, as the login cookie
+        user = fake.store.users[self.rng.choice(self.ids["users"])]
+        return {"Cookie": f'access_token={fake.issue_session(user)["access_token"]}'}
+
+    async def anonymous(self, client: httpx.AsyncClient):
+        # land on a feed, open a post, then its author's page
+        if self.rng.random() < 0.5:
+            response = await self.rec.call(client, "feed", "GET", "/posts/", params={"limit": 20})
+            rows = response.json().get("res", []) if response is not None and response.is_success else []
+        else:
+            response = await self.rec.call(client, "category_feed", "GET", "/feed", params={
+                "category_id": self.rng.choice(self.ids["categories"]), "limit": 20})
+            rows = response.json().get("posts", []) if response is not None and response.is_success else []
+
+        post = self.rng.choice(rows) if rows else {"id": self.rng.choice(self.ids["posts"])}
+        await self.rec.call(client, "post", "GET", f"/posts/{post['id']}")
+        await self.rec.call(client, "comments", "GET", f"/posts/{post['id']}/comments")
+        if post.get("author_id"):
+            await self.rec.call(client, "author_posts", "GET", f"/posts/all/{post['author_id']}")
+
+    async def reader(self, client: httpx.AsyncClient):
+        # logged-in card rendering: timeline, per-card viewer state, then
+        # one opened post with its like/bookmark checks and maybe a like
+        auth = self._auth()
+        response = await self.rec.call(client, "timeline", "GET", "/timeline", headers=auth)
+        rows = response.json().get("posts", []) if response is not None and response.is_success else []
+        post_ids = [row["id"] for row in rows] or self.rng.sample(self.ids["posts"], 20)
+
+        await self.rec.call(client, "viewer_state", "POST", "/posts/viewer-state",
+                            json={"post_ids": post_ids}, headers=auth)
+
+        post_id = self.rng.choice(post_ids)
+        await self.rec.call(client, "like_check", "GET", f"/posts/{post_id}/likes/check", headers=auth)
+        await self.rec.call(client, "bookmark_check", "GET", f"/posts/{post_id}/is-bookmarked", headers=auth)
+        if self.rng.random() < 0.3:
+            method = self.rng.choice(["PUT", "DELETE"])
+            await self.rec.call(client, "like_toggle", method, f"/posts/{post_id}/likes", headers=auth)
+
+    async def writer(self, client: httpx.AsyncClient):
+        data = {
+            "title": f"bench post {uuid.uuid4().hex[:8]}",
+            "content": " ".join(self.rng.choice(("fast", "slow", "cache", "query")) for _ in range(400)),
+            "category_id": self.rng.choice(self.ids["categories"]),
+        }
+        await self.rec.call(client, "create_post", "POST", "/posts/", data=data,
+                            files={"file": ("cover.jpg", self.image, "image/jpeg")},
+                            headers=self._auth())
+
+    async def signup(self, client: httpx.AsyncClient):
+        name = uuid.uuid4().hex[:12]
+        await self.rec.call(client, "signup", "POST", "/auth/signup", data={
+            "email": f"{name}@bench.example.com", "password": "password", "username": name,
+        }, files={"file": ("avatar.jpg", self.image, "image/jpeg")})
+
+
+async def drive(api_url: str, ids: dict, args) -> dict:
+    mix = MIXES[args.mix]
+    names, weights = list(mix), list(mix.values())
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=30) as client:
+        async def phase(seconds: float, recorder: Recorder):
+            deadline = time.perf_counter() + seconds
+
+            async def worker(n: int):
+                journeys = Journeys(ids, recorder, random.Random(args.seed * 1000 + n))
+                while time.perf_counter() < deadline:
+                    name = journeys.rng.choices(names, weights)[0]
+                    await getattr(journeys, name)(client)
+
+            await asyncio.gather(*(worker(n) for n in range(args.concurrency)))
+
+        await phase(args.warmup, Recorder())
+
+        before = await scrape_upstream(client)
+        recorder = Recorder()
+        start = time.perf_counter()
+        await phase(args.duration, recorder)
+        elapsed = time.perf_counter() - start
+        after = await scrape_upstream(client)
+
+    return {
+        "config": {k: getattr(args, k) for k in ("mix", "concurrency", "duration", "users", "posts", "likes", "follows")},
+        "ops": summarize(recorder, elapsed),
+        "upstream_calls_per_request": upstream_delta(before, after),
+    }
+
+
+# ---------------------------------------------------------------- report
+
+
+def print_report(result: dict):
+    print(f"{'operation':<16}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for op, s in result["ops"].items():
+        print(f"{op:<16}{s['requests']:>9}{s['errors']:>8}{s['rps']:>9}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}")
+    print()
+    print(f"{'route':<36}{'upstream calls/request':>24}")
+    for route, calls in result["upstream_calls_per_request"].items():
+        print(f"{route:<36}{calls:>24}")
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    regressions = []
+    if result["config"] != baseline.get("config"):
+        print(f"note: baseline ran with {baseline.get('config')}, this run with {result['config']}")
+
+    for op, s in result["ops"].items():
+        old = baseline.get("ops", {}).get(op)
+        if not old or not old["p95_ms"]:
+            continue
+        ratio = s["p95_ms"] / old["p95_ms"]
+        marker = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{op:<16} p95 {old['p95_ms']:>8} -> {s['p95_ms']:>8} ms ({ratio - 1:+.0%}) {marker}")
+        if marker:
+            regressions.append(f"{op} p95 {ratio - 1:+.0%}")
+
+    # call counts do not depend on the machine; cached routes drift a little
+    # with the hit ratio, an added call on every other request does not
+    for route, calls in result["upstream_calls_per_request"].items():
+        old = baseline.get("upstream_calls_per_request", {}).get(route)
+        if old is not None and calls >= old + 0.5:
+            print(f"{route:<36} upstream calls/request {old} -> {calls} REGRESSION")
+            regressions.append(f"{route} upstream calls {old} -> {calls}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--likes", type=int, default=20000)
+    parser.add_argument("--follows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", metavar="PATH", help="write the result as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="baseline to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed p95 growth (0.5 = 50%%)")
+    args = parser.parse_args(argv)
+
+    processes, api_url, ids = boot(args)
+    try:
+        result = asyncio.run(drive(api_url, ids, args))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+    print_report(result)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): " + "; ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import random
+import uuid
+
+from bench import fake_supabase as fake
+
+WORDS = (
+    "python async cache latency query index feed profile image upload "
+    "token session pagination cursor counter timeline follow like bookmark "
+    "comment category search ranking payload network server client"
+).split()
+
+PASSWORD = "password"
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed(users: int = 1000, posts: int = 5000, likes: int = 20000, follows: int = 10000,
+         categories: int = 8, seed: int = 7) -> dict:
+    """
+    Fill the fake store with a deterministic data set and return the ids
+    the load mixes pick from.
+    """
+    rng = random.Random(seed)
+    store = fake.store
+
+    category_ids = []
+    for i in range(categories):
+        category_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        store.table("categories").append(
+            {"id": category_id, "name": f"category {i}", "created_at": store.now()})
+        category_ids.append(category_id)
+
+    user_ids = []
+    for i in range(users):
+        user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        fake.create_user(f"user{i}@bench.example.com", PASSWORD, user_id=user_id)
+        store.table("profiles").append({
+            "id": user_id, "username": f"user{i}", "bio": _text(rng, 8),
+            "image_url": None, "image_variants": None, "gender": None,
+            "created_at": store.now(),
+        })
+        user_ids.append(user_id)
+
+    post_ids = []
+    for _ in range(posts):
+        post_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        content = _text(rng, rng.randint(150, 1500))
+        store.table("posts").append({
+            "id": post_id, "title": _text(rng, 6), "content": content,
+            "excerpt": content[:280], "reading_time": max(1, len(content.split()) // 200),
+            "author_id": rng.choice(user_ids), "category_id": rng.choice(category_ids),
+            "cover_image_url": None, "cover_image_variants": None,
+            "created_at": store.now(),
+        })
+        post_ids.append(post_id)
+
+    pairs = set()
+    while len(pairs) < min(likes, users * posts):
+        pairs.add((rng.choice(post_ids), rng.choice(user_ids)))
+    for post_id, user_id in sorted(pairs):
+        store.table("likes").append(
+            {"id": str(uuid.UUID(int=rng.getrandbits(128))), "post_id": post_id, "author_id": user_id, "created_at": store.now()})
+
+    edges = set()
+    while len(edges) < min(follows, users * (users - 1)):
+        follower, following = rng.sample(user_ids, 2)
+        edges.add((follower, following))
+    for follower, following in sorted(edges):
+        store.table("follows").append(
+            {"follower_id": follower, "following_id": following, "created_at": store.now()})
+
+    # materialized timelines, as fan-out on write would have left them
+    by_author = {}
+    for post in store.table("posts"):
+        by_author.setdefault(post["author_id"], []).append(post)
+    for follower, following in sorted(edges) + [(u, u) for u in user_ids]:
+        for post in by_author.get(following, []):
+            store.table("timelines").append({
+                "user_id": follower, "post_id": post["id"],
+                "author_id": following, "created_at": post["created_at"],
+            })
+
+    store.rpcs["reconcile_counters"]({})
+    store.touch()
+    return {"users": user_ids, "posts": post_ids, "categories": category_ids}
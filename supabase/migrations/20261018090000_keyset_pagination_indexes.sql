@@ -0,0 +1,20 @@
+-- Indexes backing the (created_at, id) keyset pagination used by the list
+-- endpoints, so every page is an index range scan instead of a sort.
+
+create index if not exists posts_created_at_id_idx
+    on public.posts (created_at desc, id desc);
+
+create index if not exists posts_author_created_at_id_idx
+    on public.posts (author_id, created_at desc, id desc);
+
+create index if not exists posts_category_created_at_id_idx
+    on public.posts (category_id, created_at desc, id desc);
+
+create index if not exists comments_post_created_at_id_idx
+    on public.comments (post_id, created_at desc, id desc);
+
+create index if not exists follows_following_created_at_idx
+    on public.follows (following_id, created_at desc, follower_id desc);
+
+create index if not exists follows_follower_created_at_idx
+    on public.follows (follower_id, created_at desc, following_id desc);
@@ -0,0 +1,95 @@
+-- Denormalized engagement counters, maintained by the API write handlers
+-- (app/counters.py) and periodically recomputed by reconcile_counters().
+
+alter table public.posts
+    add column if not exists likes_count integer not null default 0,
+    add column if not exists comments_count integer not null default 0,
+    add column if not exists bookmarks_count integer not null default 0;
+
+alter table public.profiles
+    add column if not exists followers_count integer not null default 0,
+    add column if not exists following_count integer not null default 0,
+    add column if not exists posts_count integer not null default 0;
+
+
+create or replace function public.adjust_post_counter(p_post_id uuid, p_column text, p_delta integer)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if p_column not in ('likes_count', 'comments_count', 'bookmarks_count') then
+        raise exception 'unknown post counter %', p_column;
+    end if;
+
+    execute format('update public.posts set %I = greatest(%I + $1, 0) where id = $2', p_column, p_column)
+        using p_delta, p_post_id;
+end;
+$$;
+
+
+create or replace function public.adjust_profile_counter(p_profile_id uuid, p_column text, p_delta integer)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if p_column not in ('followers_count', 'following_count', 'posts_count') then
+        raise exception 'unknown profile counter %', p_column;
+    end if;
+
+    execute format('update public.profiles set %I = greatest(%I + $1, 0) where id = $2', p_column, p_column)
+        using p_delta, p_profile_id;
+end;
+$$;
+
+
+create or replace function public.reconcile_counters()
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    with actual as (
+        select p.id,
+               (select count(*) from public.likes l where l.post_id = p.id) as likes_count,
+               (select count(*) from public.comments c where c.post_id = p.id) as comments_count,
+               (select count(*) from public.bookmarks b where b.post_id = p.id) as bookmarks_count
+        from public.posts p
+    )
+    update public.posts p
+    set likes_count = a.likes_count,
+        comments_count = a.comments_count,
+        bookmarks_count = a.bookmarks_count
+    from actual a
+    where p.id = a.id
+      and (p.likes_count, p.comments_count, p.bookmarks_count)
+          is distinct from (a.likes_count, a.comments_count, a.bookmarks_count);
+
+    with actual as (
+        select pr.id,
+               (select count(*) from public.follows f where f.following_id = pr.id) as followers_count,
+               (select count(*) from public.follows f where f.follower_id = pr.id) as following_count,
+               (select count(*) from public.posts p where p.author_id = pr.id) as posts_count
+        from public.profiles pr
+    )
+    update public.profiles pr
+    set followers_count = a.followers_count,
+        following_count = a.following_count,
+        posts_count = a.posts_count
+    from actual a
+    where pr.id = a.id
+      and (pr.followers_count, pr.following_count, pr.posts_count)
+          is distinct from (a.followers_count, a.following_count, a.posts_count);
+$$;
+
+select public.reconcile_counters();
+
+revoke execute on function public.adjust_post_counter(uuid, text, integer) from public, anon, authenticated;
+revoke execute on function public.adjust_profile_counter(uuid, text, integer) from public, anon, authenticated;
+revoke execute on function public.reconcile_counters() from public, anon, authenticated;
+grant execute on function public.adjust_post_counter(uuid, text, integer) to service_role;
+grant execute on function public.adjust_profile_counter(uuid, text, integer) to service_role;
+grant execute on function public.reconcile_counters() to service_role;
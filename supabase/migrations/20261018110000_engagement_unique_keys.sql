@@ -0,0 +1,25 @@
+-- One row per (user, target) for likes, bookmarks and follows, so the
+-- toggles can be single conflict-aware upserts instead of check-then-insert.
+
+delete from public.likes a
+    using public.likes b
+    where a.post_id = b.post_id and a.author_id = b.author_id and a.ctid > b.ctid;
+
+delete from public.bookmarks a
+    using public.bookmarks b
+    where a.post_id = b.post_id and a.user_id = b.user_id and a.ctid > b.ctid;
+
+delete from public.follows a
+    using public.follows b
+    where a.follower_id = b.follower_id and a.following_id = b.following_id and a.ctid > b.ctid;
+
+create unique index if not exists likes_post_author_key
+    on public.likes (post_id, author_id);
+
+create unique index if not exists bookmarks_post_user_key
+    on public.bookmarks (post_id, user_id);
+
+create unique index if not exists follows_follower_following_key
+    on public.follows (follower_id, following_id);
+
+select public.reconcile_counters();
@@ -0,0 +1,31 @@
+-- Materialized home timelines, written by the API on post creation
+-- (fan-out on write) and on follow/unfollow (backfill/trim).
+
+create table if not exists public.timelines (
+    user_id uuid not null references public.profiles (id) on delete cascade,
+    post_id uuid not null references public.posts (id) on delete cascade,
+    author_id uuid not null references public.profiles (id) on delete cascade,
+    created_at timestamptz not null,
+    primary key (user_id, post_id)
+);
+
+create index if not exists timelines_user_created_at_idx
+    on public.timelines (user_id, created_at desc, post_id desc);
+
+create index if not exists timelines_user_author_idx
+    on public.timelines (user_id, author_id);
+
+-- only the service role (the API) reads and writes timelines
+alter table public.timelines enable row level security;
+
+-- backfill existing follow relationships
+insert into public.timelines (user_id, post_id, author_id, created_at)
+select f.follower_id, p.id, p.author_id, p.created_at
+from public.follows f
+join public.posts p on p.author_id = f.following_id
+on conflict do nothing;
+
+insert into public.timelines (user_id, post_id, author_id, created_at)
+select p.author_id, p.id, p.author_id, p.created_at
+from public.posts p
+on conflict do nothing;
@@ -0,0 +1,8 @@
+-- Public URLs of the resized WebP variants rendered for uploaded images,
+-- as {"thumb": "...", "medium": "..."}.
+
+alter table public.posts
+    add column if not exists cover_image_variants jsonb;
+
+alter table public.profiles
+    add column if not exists image_variants jsonb;
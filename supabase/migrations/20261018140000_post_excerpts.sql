@@ -0,0 +1,25 @@
+-- Teaser stored with every post so list endpoints never ship the full body.
+-- The API writes both columns on create/update (app/fields.py summarize);
+-- the backfill below approximates it for existing rows.
+
+alter table public.posts
+    add column if not exists excerpt text,
+    add column if not exists reading_time integer not null default 0;
+
+with cleaned as (
+    select id,
+           btrim(regexp_replace(regexp_replace(coalesce(content, ''), '<[^>]+>', ' ', 'g'), '\s+', ' ', 'g')) as body
+    from public.posts
+    where excerpt is null
+)
+update public.posts p
+set excerpt = case
+        when length(c.body) <= 280 then c.body
+        else rtrim(left(c.body, 280)) || '…'
+    end,
+    reading_time = case
+        when c.body = '' then 0
+        else greatest(1, ceil(array_length(regexp_split_to_array(c.body, ' '), 1) / 200.0))::integer
+    end
+from cleaned c
+where p.id = c.id;
@@ -0,0 +1,36 @@
+"""
+Runs the API against `bench.fake_supabase`, in process: every Supabase
+client sends its requests through `app.config.http_transport`, which is
+pointed at the fake's ASGI app here.
+"""
+import os
+
+os.environ.update(
+    SUPABASE_URL="http://fake.local",
+    SUPABASE_KEY="anon",
+    SUPABASE_ROLE_KEY="service",
+    JWT_SECRET="bench-secret",
+    DATA_BACKEND="supabase",
+)
+# CACHE_BACKEND=shared runs the same tests against the shared-memory caches
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from bench import fake_supabase as fake
+from app.config import http_transport
+from app.main import app
+
+http_transport.transport = httpx.ASGITransport(app=fake.app)
+
+
+@pytest.fixture
+def user():
+    return fake.create_user(f"{fake.uuid.uuid4().hex}@example.com")
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
@@ -0,0 +1,21 @@
+from bench import fake_supabase as fake
+from app import dependencies
+
+
+def test_token_refused_after_logout(client, user):
+    token = fake.issue_session(user)["access_token"]
+    client.cookies.set("access_token", token)
+    assert client.get("/auth/me").status_code == 200
+
+    assert client.post("/auth/logout").status_code == 200
+
+    # the fake still accepts the token, so only the denylist can refuse it
+    client.cookies.set("access_token", token)
+    assert client.get("/auth/me").status_code == 401
+
+
+def test_remote_mode_asks_supabase_auth(client, user, monkeypatch):
+    monkeypatch.setattr(dependencies, "AUTH_VERIFY_MODE", "remote")
+    client.cookies.set("access_token", fake.issue_session(user)["access_token"])
+    response = client.get("/auth/me")
+    assert response.status_code == 200
@@ -0,0 +1,39 @@
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.body_limit import BodySizeLimitMiddleware
+
+app = FastAPI()
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=1024)
+
+
+@app.post("/upload")
+async def upload(file: UploadFile = File(...)):
+    return {"size": len(await file.read())}
+
+
+client = TestClient(app)
+
+
+def test_small_body_passes():
+    response = client.post("/upload", files={"file": ("a.png", b"x" * 100)})
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+
+
+def test_large_body_refused_from_content_length():
+    response = client.post("/upload", files={"file": ("a.png", b"x" * 4096)})
+    assert response.status_code == 413
+
+
+def test_large_chunked_body_refused_while_received():
+    def chunks():
+        yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.png\"\r\n\r\n"
+        for _ in range(8):
+            yield b"x" * 512
+        yield b"\r\n--b--\r\n"
+
+    response = client.post(
+        "/upload", content=chunks(),
+        headers={"content-type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 413
@@ -0,0 +1,50 @@
+import asyncio
+from types import SimpleNamespace
+
+from bench import fake_supabase as fake
+from app.routes import profiles
+
+
+def _post(author_id, category_id):
+    post = {
+        "id": fake.uuid.uuid4().hex, "title": "t", "content": "body", "excerpt": "body",
+        "author_id": author_id, "category_id": category_id, "created_at": fake.store.now(),
+    }
+    fake.store.table("posts").append(post)
+    fake.store.touch()
+    return post
+
+
+def _login(client, user):
+    token = fake.issue_session(user)["access_token"]
+    client.cookies.set("access_token", token)
+    # admin routes read the bearer header
+    client.headers["Authorization"] = f"Bearer {token}"
+
+
+def test_category_rename_reaches_cached_author_pages(client, user):
+    category_id = fake.uuid.uuid4().hex
+    fake.store.table("categories").append({"id": category_id, "name": "old", "created_at": fake.store.now()})
+    _post(user["id"], category_id)
+    page = f"/posts/all/{user['id']}"
+    assert client.get(page).json()["posts"][0]["categories"]["name"] == "old"
+
+    admin = fake.create_user(f"{fake.uuid.uuid4().hex}@example.com", metadata={"is_admin": True})
+    _login(client, admin)
+    assert client.put(f"/categories/{category_id}", params={"name": "new"}).status_code == 200
+
+    assert client.get(page).json()["posts"][0]["categories"]["name"] == "new"
+
+
+def test_username_change_reaches_cached_feeds(client, user):
+    fake.store.table("profiles").append({"id": user["id"], "username": "before", "image_url": None})
+    _post(user["id"], None)
+    page = f"/posts/all/{user['id']}"
+    assert client.get(page).json()["posts"][0]["profiles"]["username"] == "before"
+
+    # the route takes a JSON body and a file, which no client can send in
+    # one request, so it is called directly
+    me = SimpleNamespace(id=user["id"])
+    asyncio.run(profiles.update_profile(body={"username": "after"}, user=me, file=None))
+
+    assert client.get(page).json()["posts"][0]["profiles"]["username"] == "after"
@@ -0,0 +1,34 @@
+from bench import fake_supabase as fake
+from app import follow_graph
+from app.follow_graph import FollowGraph
+
+
+def _login(client, user):
+    client.cookies.set("access_token", fake.issue_session(user)["access_token"])
+
+
+def test_suggestions_ask_to_retry_while_warming_up(client, user, monkeypatch):
+    monkeypatch.setattr(follow_graph.follow_suggestions, "ready", False)
+    _login(client, user)
+
+    response = client.get("/users/suggestions")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+
+def test_category_move_updates_author_categories(client, user, monkeypatch):
+    graph = FollowGraph()
+    monkeypatch.setattr(follow_graph.follow_suggestions, "graph", graph)
+    post = {
+        "id": fake.uuid.uuid4().hex, "title": "t", "content": "body", "author_id": user["id"],
+        "category_id": "before", "created_at": fake.store.now(),
+    }
+    fake.store.table("posts").append(post)
+    fake.store.touch()
+    follow_graph.post_created(post)
+    _login(client, user)
+
+    response = client.put(f"/posts/{post['id']}", data={"category_id": "after"})
+    assert response.status_code == 200, response.text
+
+    assert graph._categories[graph._ids[user["id"]]] == {"after": 1}
@@ -0,0 +1,46 @@
+import asyncio
+
+from bench import fake_supabase as fake
+from app import counters
+from app.http_cache import post_tag
+from app.repositories import repos
+from tests.test_feed_cache import _login, _post
+
+
+def test_matching_revalidation_skips_the_query(client, user, monkeypatch):
+    post = _post(user["id"], None)
+    etag = client.get(f"/posts/{post['id']}").headers["etag"]
+
+    async def unreachable(*args):
+        raise AssertionError("queried for a 304")
+
+    monkeypatch.setattr(repos.posts, "get", unreachable)
+    response = client.get(f"/posts/{post['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+
+def test_counter_bump_changes_the_etag(client, user):
+    post = _post(user["id"], None)
+    etag = client.get(f"/posts/{post['id']}").headers["etag"]
+
+    asyncio.run(counters._adjust(repos.posts.adjust_counter, post["id"], "likes_count", 1, post_tag(post["id"])))
+
+    response = client.get(f"/posts/{post['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["res"]["likes_count"] == 1
+
+
+def test_category_rename_changes_the_etag(client, user):
+    category_id = fake.uuid.uuid4().hex
+    fake.store.table("categories").append({"id": category_id, "name": "old", "created_at": fake.store.now()})
+    post = _post(user["id"], category_id)
+    etag = client.get(f"/posts/{post['id']}").headers["etag"]
+
+    admin = fake.create_user(f"{fake.uuid.uuid4().hex}@example.com", metadata={"is_admin": True})
+    _login(client, admin)
+    assert client.put(f"/categories/{category_id}", params={"name": "new"}).status_code == 200
+
+    response = client.get(f"/posts/{post['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["res"]["categories"]["name"] == "new"
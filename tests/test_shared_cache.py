@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from app.shared_cache import SharedCache
+
+
+def _cache(tmp_path, name="t"):
+    return SharedCache(name, max_entries=16, max_bytes=64 * 1024, directory=str(tmp_path))
+
+
+def test_values_round_trip_as_bytes_or_json(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("raw", b"\x80pickle-looking bytes")
+    cache.set("json", {"id": "u1", "tags": ("a", "b")})
+
+    assert cache.get("raw") == b"\x80pickle-looking bytes"
+    assert cache.get("json") == {"id": "u1", "tags": ["a", "b"]}
+    assert os.stat(cache.directory).st_mode & 0o777 == 0o700
+    assert os.stat(cache.path).st_mode & 0o777 == 0o600
+
+
+def test_refuses_a_planted_symlink(tmp_path):
+    cache = _cache(tmp_path)
+    os.mkdir(cache.directory, 0o700)
+    target = tmp_path / "elsewhere"
+    target.write_bytes(b"")
+    os.symlink(target, cache.path)
+
+    with pytest.raises(OSError):
+        cache.get("key")
+
+
+def test_refuses_a_file_others_can_write(tmp_path):
+    cache = _cache(tmp_path)
+    os.mkdir(cache.directory, 0o700)
+    fd = os.open(cache.path, os.O_CREAT | os.O_WRONLY, 0o666)
+    os.fchmod(fd, 0o666)
+    os.close(fd)
+
+    with pytest.raises(PermissionError):
+        cache.get("key")
+
+
+def test_refuses_a_directory_others_can_enter(tmp_path):
+    cache = _cache(tmp_path)
+    os.mkdir(cache.directory)
+    os.chmod(cache.directory, 0o755)
+
+    with pytest.raises(PermissionError):
+        cache.get("key")
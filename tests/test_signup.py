@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+from bench import fake_supabase as fake
+from app.routes import signs
+
+
+def test_taken_username_never_reaches_auth(client, user, monkeypatch):
+    fake.store.table("profiles").append({"id": user["id"], "username": "taken", "image_url": None})
+    sign_ups = []
+
+    async def sign_up(credentials):
+        sign_ups.append(credentials)
+
+    monkeypatch.setattr(signs.db.auth, "sign_up", sign_up)
+    response = client.post("/auth/signup", data={
+        "email": "new@example.com", "password": "password", "username": "taken"})
+
+    assert response.status_code == 409
+    assert sign_ups == []
+
+
+def test_signup_without_session_deletes_nobody(client, user, monkeypatch):
+    # email confirmation on: Supabase hands back the user but no session,
+    # possibly an existing unconfirmed account
+    deleted = []
+
+    async def sign_up(credentials):
+        return SimpleNamespace(user=SimpleNamespace(id=user["id"]), session=None)
+
+    async def delete_user(user_id):
+        deleted.append(user_id)
+
+    monkeypatch.setattr(signs.db.auth, "sign_up", sign_up)
+    monkeypatch.setattr(signs.db_admin.auth.admin, "delete_user", delete_user)
+    response = client.post("/auth/signup", data={
+        "email": user["email"], "password": "password", "username": "fresh"})
+
+    assert response.status_code == 500
+    assert deleted == []
+
+
+def test_avatar_format_is_sniffed_not_taken_from_the_client(client, user, monkeypatch):
+    deleted = []
+
+    async def sign_up(credentials):
+        return SimpleNamespace(user=SimpleNamespace(id=user["id"]), session=SimpleNamespace())
+
+    async def delete_user(user_id):
+        deleted.append(user_id)
+
+    monkeypatch.setattr(signs.db.auth, "sign_up", sign_up)
+    monkeypatch.setattr(signs.db_admin.auth.admin, "delete_user", delete_user)
+    response = client.post(
+        "/auth/signup",
+        data={"email": user["email"], "password": "password", "username": "sniffed"},
+        files={"file": ("avatar.png", b"not an image", "image/png")})
+
+    assert response.status_code == 415
+    assert deleted == [user["id"]]
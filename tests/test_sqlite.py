@@ -0,0 +1,29 @@
+import asyncio
+
+from app.repositories.sqlite import SqliteRepositories
+
+
+def test_reconcile_fixes_drifted_counters(tmp_path):
+    async def run():
+        repos = SqliteRepositories(str(tmp_path / "wblog.db"))
+        try:
+            author = await repos.profiles.create({"id": "a", "username": "a"})
+            fan = await repos.profiles.create({"id": "b", "username": "b"})
+            post = await repos.posts.create({"title": "t", "author_id": author["id"]})
+            repos.conn.execute(
+                "insert into likes (id, post_id, author_id, created_at) values ('l', ?, ?, '')",
+                [post["id"], fan["id"]])
+            repos.conn.execute("update profiles set followers_count = 7 where id = ?", [author["id"]])
+
+            await repos.reconcile_counters()
+
+            assert (await repos.posts.get(post["id"], ("likes_count",)))["likes_count"] == 1
+            profile = await repos.profiles.get(author["id"])
+            assert (profile["followers_count"], profile["posts_count"]) == (0, 1)
+            # the bulk reads see the main connection's writes
+            rows, _ = await repos.posts.list_page(("id",), 10)
+            assert [row["id"] for row in rows] == [post["id"]]
+        finally:
+            await repos.close()
+
+    asyncio.run(run())
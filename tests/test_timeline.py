@@ -0,0 +1,23 @@
+from bench import fake_supabase as fake
+
+
+def test_timeline_rows_carry_excerpts_unless_asked(client, user):
+    store = fake.store
+    post = {
+        "id": fake.uuid.uuid4().hex, "title": "t", "content": "the whole body",
+        "excerpt": "the whole", "author_id": user["id"], "category_id": None,
+        "created_at": store.now(),
+    }
+    store.table("posts").append(post)
+    store.table("timelines").append({
+        "user_id": user["id"], "post_id": post["id"], "author_id": user["id"],
+        "created_at": post["created_at"]})
+    store.touch()
+    client.cookies.set("access_token", fake.issue_session(user)["access_token"])
+
+    rows = client.get("/timeline").json()["posts"]
+    assert [row["id"] for row in rows] == [post["id"]]
+    assert rows[0]["excerpt"] == "the whole" and "content" not in rows[0]
+
+    rows = client.get("/timeline", params={"fields": "content"}).json()["posts"]
+    assert rows[0]["content"] == "the whole body"
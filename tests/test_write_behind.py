@@ -0,0 +1,56 @@
+import asyncio
+
+from app.write_behind import WriteBehindQueue
+
+
+def _queue(tmp_path, stored, gone):
+    queue = WriteBehindQueue(str(tmp_path), interval=3600, batch_rows=100)
+
+    async def apply(adds, removes):
+        if any(pair in gone for pair in adds):
+            raise RuntimeError("violates foreign key constraint")
+        stored.update(adds)
+        stored.difference_update(removes)
+
+    async def existing(pairs):
+        return {pair for pair in pairs if pair in stored}
+
+    async def missing(pairs):
+        return {pair for pair in pairs if pair in gone}
+
+    queue.register("like", apply, existing, missing)
+    return queue
+
+
+def test_toggle_of_a_missing_post_is_dropped_at_flush(tmp_path):
+    stored = set()
+
+    async def run():
+        queue = _queue(tmp_path, stored, gone={("deleted", "u1")})
+        # acknowledged without a lookup
+        assert await queue.submit("like", "deleted", "u1", True) is True
+        assert await queue._flush() is True
+        assert queue.pending("like", "deleted", "u1") is None
+        await queue.stop()
+
+    asyncio.run(run())
+    assert stored == set()
+
+
+def test_flush_is_retried_while_upstream_is_down(tmp_path):
+    stored = set()
+
+    async def run():
+        queue = _queue(tmp_path, stored, gone={("p1", "u1")})
+
+        async def down(pairs):
+            raise ConnectionError("upstream unreachable")
+
+        apply, existing, _ = queue._handlers["like"]
+        queue.register("like", apply, existing, down)
+        await queue.submit("like", "p1", "u1", True)
+        assert await queue._flush() is False
+        assert queue.pending("like", "p1", "u1") is True
+        await queue.stop()
+
+    asyncio.run(run())